@@ -0,0 +1,438 @@
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+"""
+Offline benchmarks of the hot paths of the solar control stack (data loading, image index, labels, MPC,
+reinforcement learning environment, replay buffer and TF train/predict steps). The benchmarks run on a small
+synthetic station tree (abb_clouddrl_synthetic) written to a temporary directory, so they do not need the
+/media/data/Daten tree.
+Benchmarks whose dependencies (cv2, cvxpy, tensorflow, ...) are not installed are reported as skipped.
+
+Results are written as json, run_benchmarks.py compares them to a stored baseline and flags regressions.
+"""
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_CLOUD_ENV_DIR = os.path.join(_REPO_ROOT, 'openai', 'baselines', 'baselines', 'deepq', 'experiments')
+
+_BENCHMARKS = []
+
+
+def register_benchmark(name, unit, repeat=True):
+    """
+    Registers fn(station) -> (count, seconds) as benchmark, the rate is count/seconds in unit
+    repeat=False runs the benchmark only once (slow benchmarks like the MPC solves)
+    """
+    def decorator(fn):
+        if any(b['name'] == name for b in _BENCHMARKS):
+            raise ValueError('Benchmark with name %s already registered!' % name)
+        _BENCHMARKS.append({'name': name, 'unit': unit, 'repeat': repeat, 'fn': fn})
+        return fn
+    return decorator
+
+
+def list_benchmarks():
+    return [b['name'] for b in _BENCHMARKS]
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Synthetic data
+
+
+def create_synthetic_station(root, nr_days=2, first_day='2015-07-16', start_time='10:00:00', day_seconds=3600,
+                             image_interval_s=7, image_size=32, nr_predictions=11, pred_interval_s=60, seed=0):
+    """
+    Writes a small synthetic station tree (see abb_clouddrl_synthetic) with one image every image_interval_s seconds
+    from start_time on, plus root/predictions/eval_predictions.csv (P0.., L0..) with noisy predictions of the next
+    nr_predictions minutes for every image that has them within the day
+
+    :return: dict with the paths and the settings
+    """
+    from ..abb_data_pipeline import abb_clouddrl_synthetic as abb_syn
+
+    end_time = (dt.datetime.strptime(start_time, '%H:%M:%S') + dt.timedelta(seconds=day_seconds - 1)).strftime(
+        '%H:%M:%S')
+    rl_pd = abb_syn.create_synthetic_station(root, first_day=first_day, nr_days=nr_days, seed=seed,
+                                             image_size=image_size, image_interval_s=image_interval_s,
+                                             start_time=start_time, end_time=end_time, daytime_threshold=0)
+
+    pred_root = os.path.join(root, 'predictions')
+    os.makedirs(pred_root, exist_ok=True)
+    days = [dt.datetime.strptime(first_day, '%Y-%m-%d') + dt.timedelta(days=i) for i in range(nr_days)]
+    int_paths = [os.path.join(root, 'data_C_int', 'C-' + day.strftime('%Y-%m-%d') + '-int.csv') for day in days]
+
+    pred_list = []
+    horizon = (nr_predictions - 1) * pred_interval_s
+    for i, path in enumerate(int_paths):
+        irr = pd.read_csv(path, header=None, index_col=0, parse_dates=True).iloc[:, 0]
+        positions = np.arange(0, len(irr.index) - horizon, image_interval_s)
+        ahead = positions[:, None] + np.arange(nr_predictions)[None, :] * pred_interval_s
+        labels = irr.values[ahead]
+        preds = labels + np.random.RandomState(seed + i).normal(0, 20.0, labels.shape)
+        pred_list.append(pd.DataFrame(np.concatenate([preds, labels], axis=1), index=irr.index[positions],
+                                      columns=['P' + str(p) for p in range(nr_predictions)] +
+                                              ['L' + str(p) for p in range(nr_predictions)]))
+    pred_df = pd.concat(pred_list)
+    pred_df.to_csv(os.path.join(pred_root, 'eval_predictions.csv'))
+
+    return {'root': root, 'img_path': os.path.join(root, 'img_C'), 'data_path': os.path.join(root, 'data_C_int'),
+            'prediction_path': pred_root, 'days': days, 'int_paths': int_paths, 'nr_images': len(rl_pd.index),
+            'nr_prediction_rows': len(pred_df.index), 'nr_predictions': nr_predictions,
+            'pred_interval_s': pred_interval_s, 'image_size': image_size}
+
+
+@contextlib.contextmanager
+def station_paths(station):
+    """Points the read pipeline of station C to the synthetic tree"""
+    from ..abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
+    from ..abb_data_pipeline.abb_clouddrl_constants import ABB_Solarstation
+
+    img_path, data_path = abb_rp.img_path_dict[ABB_Solarstation.C], abb_rp.data_path_dict[ABB_Solarstation.C]
+    abb_rp.img_path_dict[ABB_Solarstation.C] = station['img_path']
+    abb_rp.data_path_dict[ABB_Solarstation.C] = station['data_path']
+    try:
+        yield
+    finally:
+        abb_rp.img_path_dict[ABB_Solarstation.C] = img_path
+        abb_rp.data_path_dict[ABB_Solarstation.C] = data_path
+
+
+def _day_range(station):
+    return [(station['days'][0], station['days'][-1])]
+
+
+@contextlib.contextmanager
+def _quiet():
+    # the pipeline prints per sample, that would dominate the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Data pipeline and MPC
+
+
+@register_benchmark('day_loading', 'rows/s')
+def bench_day_loading(station):
+    start = time.perf_counter()
+    rows = sum(len(pd.Series.from_csv(path).index) for path in station['int_paths'])
+    return rows, time.perf_counter() - start
+
+
+@register_benchmark('image_index', 'images/s')
+def bench_image_index(station):
+    from ..abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
+
+    with station_paths(station), _quiet():
+        start = time.perf_counter()
+        nr_images = sum(len(day[0]) for day in abb_rp.read_cld_img_time_range_paths(
+            img_d_tup_l=_day_range(station), get_mpc_data=True, get_cs_data=True))
+        seconds = time.perf_counter() - start
+    return nr_images, seconds
+
+
+@register_benchmark('image_index_daytime', 'images/s')
+def bench_image_index_daytime(station):
+    from ..abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
+
+    with station_paths(station), _quiet():
+        start = time.perf_counter()
+        nr_images = sum(len(day[0]) for day in abb_rp.read_cld_img_time_range_paths(
+            img_d_tup_l=_day_range(station), automatic_daytime=True))
+        seconds = time.perf_counter() - start
+    return nr_images, seconds
+
+
+@register_benchmark('image_resize', 'images/s', repeat=False)
+def bench_image_resize(station):
+    from ..abb_data_pipeline import abb_clouddrl_image_transformation as abb_it
+
+    size = station['image_size']
+    with station_paths(station), _quiet():
+        (nr_images, _), seconds = _timed(abb_it.transform_images, [size // 2, size // 4],
+                                         img_d_tup_l=_day_range(station))
+    return nr_images, seconds
+
+
+@register_benchmark('label_generation', 'images/s', repeat=False)
+def bench_label_generation(station):
+    from ..abb_data_pipeline import abb_clouddrl_transformation_pipeline as abb_tp
+
+    with station_paths(station), _quiet():
+        _, seconds = _timed(abb_tp.abb_neural_network_labels_generator, img_d_tup_l=_day_range(station))
+    return station['nr_images'], seconds
+
+
+@register_benchmark('mpc_day', 'days/s', repeat=False)
+def bench_mpc_day(station):
+    from ..abb_mpc_controller import abb_mpc
+
+    with _quiet():
+        start = time.perf_counter()
+        for path in station['int_paths']:
+            abb_mpc.__default_mpc__(path)
+        seconds = time.perf_counter() - start
+    return len(station['int_paths']), seconds
+
+
+@register_benchmark('naive_control', 'days/s')
+def bench_naive_control(station):
+    from ..abb_data_pipeline import abb_clouddrl_transformation_pipeline as abb_tp
+
+    days = [pd.Series.from_csv(path) for path in station['int_paths']]
+    start = time.perf_counter()
+    for day in days:
+        abb_tp.naive_battery_control(day)
+    return len(days), time.perf_counter() - start
+
+
+@register_benchmark('energy_evaluation', 'rows/s')
+def bench_energy_evaluation(station):
+    from ..abb_data_pipeline import abb_clouddrl_data_store as abb_ds
+    from ..abb_data_pipeline import abb_clouddrl_energy_evaluation as abb_ee
+
+    store = abb_ds.StationDataStore(os.path.join(station['root'], 'store'))
+    for path in station['int_paths']:
+        abb_ds.import_legacy_day(store, path)
+    irr = store.read_column(abb_ds.IRR)
+    control = irr + np.random.RandomState(0).normal(0, 20.0, len(irr.index))
+    days = [(day, control[control.index.normalize() == day]) for day in store.days(abb_ds.IRR)]
+
+    start = time.perf_counter()
+    abb_ee.evaluate(days, 'model', store, {'mpc100': 'mpc@100_old'}, loss_threshold=5.0).overall()
+    return len(irr.index), time.perf_counter() - start
+
+
+@register_benchmark('mpc_prediction_row', 'rows/s', repeat=False)
+def bench_mpc_prediction_row(station):
+    from ..abb_mpc_controller import abb_mpc
+
+    day_list = [day.strftime('%Y-%m-%d') for day in station['days']]
+    with _quiet():
+        _, seconds = _timed(abb_mpc.__prediction_mpc__, prediction_path=station['prediction_path'], day_list=day_list,
+                            nr_predictions=station['nr_predictions'], pred_interval_s=station['pred_interval_s'])
+    return station['nr_prediction_rows'], seconds
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Reinforcement learning
+
+
+ENV_STEPS = 2000
+VEC_ENVS = 16
+REPLAY_SIZE = 5000
+BATCH_SIZE = 32
+TRAIN_STEPS = 50
+PREDICT_BATCHES = 50
+
+
+def _cloud_environment():
+    if _CLOUD_ENV_DIR not in sys.path:
+        sys.path.append(_CLOUD_ENV_DIR)
+    import cloud_environment
+    return cloud_environment
+
+
+def _environment_transitions(nr_transitions):
+    """Transitions (obs, action, reward, obs_tp1, done) of the synthetic CloudEnvironment with random actions"""
+    env = _cloud_environment().CloudEnvironment()
+    transitions = []
+    obs = env.reset()
+    while len(transitions) < nr_transitions:
+        action = np.random.randint(env.action_space.n)
+        new_obs, reward, done, _ = env.step(action)
+        transitions.append((obs, action, reward, new_obs, float(done)))
+        obs = env.reset() if done else new_obs
+    return env, transitions
+
+
+@register_benchmark('env_step', 'steps/s')
+def bench_env_step(station):
+    env = _cloud_environment().CloudEnvironment()
+    start = time.perf_counter()
+    env.reset()
+    for _ in range(ENV_STEPS):
+        _, _, done, _ = env.step(np.random.randint(env.action_space.n))
+        if done:
+            env.reset()
+    return ENV_STEPS, time.perf_counter() - start
+
+
+@register_benchmark('vec_env_step', 'transitions/s')
+def bench_vec_env_step(station):
+    if _CLOUD_ENV_DIR not in sys.path:
+        sys.path.append(_CLOUD_ENV_DIR)
+    from vec_cloud_environment import VecCloudEnvironment
+
+    env = VecCloudEnvironment(VEC_ENVS, seed=0)
+    start = time.perf_counter()
+    env.reset()
+    for _ in range(ENV_STEPS // VEC_ENVS):
+        env.step(np.random.randint(env.action_space.n, size=VEC_ENVS))
+    return (ENV_STEPS // VEC_ENVS) * VEC_ENVS, time.perf_counter() - start
+
+
+def _filled_replay_buffer(transitions):
+    from baselines.deepq.replay_buffer import PrioritizedReplayBuffer
+
+    replay_buffer = PrioritizedReplayBuffer(REPLAY_SIZE, alpha=0.6)
+    start = time.perf_counter()
+    for i in range(REPLAY_SIZE):
+        replay_buffer.add(*transitions[i % len(transitions)])
+    return replay_buffer, time.perf_counter() - start
+
+
+@register_benchmark('replay_insert', 'transitions/s')
+def bench_replay_insert(station):
+    _, transitions = _environment_transitions(200)
+    _, seconds = _filled_replay_buffer(transitions)
+    return REPLAY_SIZE, seconds
+
+
+@register_benchmark('replay_sample', 'batches/s')
+def bench_replay_sample(station):
+    _, transitions = _environment_transitions(200)
+    replay_buffer, _ = _filled_replay_buffer(transitions)
+    nr_batches = 200
+    start = time.perf_counter()
+    for _ in range(nr_batches):
+        *_, idxes = replay_buffer.sample(BATCH_SIZE, beta=0.4)
+        replay_buffer.update_priorities(idxes, np.random.uniform(1e-3, 1.0, size=len(idxes)))
+    return nr_batches, time.perf_counter() - start
+
+
+def _deepq_graph(env):
+    import tensorflow as tf
+    import baselines.common.tf_util as U
+    from baselines import deepq
+
+    graph = tf.Graph()
+    with graph.as_default():
+        sess = U.make_session(num_cpu=1)
+        with sess.as_default():
+            model = deepq.models.cnn_to_mlp(convs=[(32, 8, 4), (64, 4, 2), (64, 3, 1)], hiddens=[256], dueling=True,
+                                            channels=env.channels, seq_length=env.sequence_length,
+                                            img_size=env.img_size)
+            _, train, update_target, debug = deepq.build_train(
+                make_obs_ph=lambda name: U.BatchInput(env.observation_space.shape, name=name), q_func=model,
+                num_actions=env.action_space.n, optimizer=tf.train.AdamOptimizer(learning_rate=2.5e-4),
+                gamma=0.99, grad_norm_clipping=10)
+            U.initialize()
+            update_target()
+    return graph, sess, train, debug['q_values']
+
+
+def _batch(transitions, rng):
+    idxes = rng.randint(len(transitions), size=BATCH_SIZE)
+    obs_t, actions, rewards, obs_tp1, dones = zip(*[transitions[i] for i in idxes])
+    return np.array(obs_t), np.array(actions), np.array(rewards), np.array(obs_tp1), np.array(dones)
+
+
+@register_benchmark('train_step', 'steps/s')
+def bench_train_step(station):
+    env, transitions = _environment_transitions(200)
+    graph, sess, train, _ = _deepq_graph(env)
+    rng = np.random.RandomState(0)
+    batches = [_batch(transitions, rng) for _ in range(TRAIN_STEPS)]
+    weights = np.ones(BATCH_SIZE)
+    with graph.as_default(), sess.as_default():
+        train(*batches[0], weights)  # first call builds the callable
+        start = time.perf_counter()
+        for batch in batches:
+            train(*batch, weights)
+        seconds = time.perf_counter() - start
+    sess.close()
+    return TRAIN_STEPS, seconds
+
+
+@register_benchmark('predict', 'observations/s')
+def bench_predict(station):
+    env, transitions = _environment_transitions(200)
+    graph, sess, _, q_values = _deepq_graph(env)
+    rng = np.random.RandomState(0)
+    batches = [_batch(transitions, rng)[0] for _ in range(PREDICT_BATCHES)]
+    with graph.as_default(), sess.as_default():
+        q_values(batches[0])
+        start = time.perf_counter()
+        for obs in batches:
+            q_values(obs)
+        seconds = time.perf_counter() - start
+    sess.close()
+    return PREDICT_BATCHES * BATCH_SIZE, seconds
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# Running and comparing
+
+
+def run_benchmarks(station, names=None, repeat=3):
+    """
+    Runs the registered benchmarks (all if names is None) on the synthetic station, repeated benchmarks report the
+    fastest run. Missing dependencies skip a benchmark, other exceptions are reported as error.
+
+    :return: dict name -> {'status', 'unit', 'count', 'seconds', 'rate', 'message'}
+    """
+    results = {}
+    for benchmark in _BENCHMARKS:
+        if names is not None and benchmark['name'] not in names:
+            continue
+        result = {'status': 'ok', 'unit': benchmark['unit'], 'count': None, 'seconds': None, 'rate': None,
+                  'message': ''}
+        try:
+            runs = [benchmark['fn'](station) for _ in range(repeat if benchmark['repeat'] else 1)]
+            count, seconds = min(runs, key=lambda r: r[1] / max(r[0], 1))
+            result.update({'count': count, 'seconds': seconds, 'rate': count / seconds if seconds > 0 else None})
+        except ImportError as e:
+            result.update({'status': 'skipped', 'message': str(e)})
+        except Exception as e:
+            result.update({'status': 'error', 'message': ''.join(traceback.format_exception_only(type(e), e)).strip()})
+        results[benchmark['name']] = result
+        print(benchmark['name'], result['status'],
+              '{:.2f} {}'.format(result['rate'], result['unit']) if result['rate'] is not None else result['message'])
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Adds baseline_rate and regression to every result. A benchmark regressed if its rate dropped by more than
+    tolerance (fraction) compared to the baseline. Benchmarks without baseline or without rate are not flagged.
+
+    :return: names of the regressed benchmarks
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline_rate = baseline.get(name, {}).get('rate')
+        result['baseline_rate'] = baseline_rate
+        result['regression'] = bool(baseline_rate and result['rate'] is not None and
+                                    result['rate'] < baseline_rate * (1.0 - tolerance))
+        if result['regression']:
+            regressions.append(name)
+    return regressions
+
+
+def write_results(path, results, settings=None):
+    output = {'created': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'settings': settings or {}, 'benchmarks': results}
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2, sort_keys=True)
+
+
+def read_results(path):
+    """:return: benchmark results of a results file (dict name -> result), e.g. to use it as baseline"""
+    with open(path) as f:
+        return json.load(f)['benchmarks']
@@ -3,82 +3,153 @@ from pvlib.location import Location
 from pvlib import solarposition
 from pvlib import atmosphere
 from . import abb_clouddrl_constants as ac
+from . import abb_clouddrl_data_store as abb_ds
+from .abb_clouddrl_constants import ABB_Solarstation as abb_st
+import datetime as dt
+import numpy as np
 import pandas as pd
 from pytz import timezone
 import matplotlib.pyplot as plt
+from multiprocessing import Pool
 import os
 
-
-
-
-def ineichen_series(path_c=None,path_ms=None,print_to_csv=False,visualize=False):
-
-
-        cav_tz = timezone('Europe/Rome')
-        ms_tz = timezone('Europe/Zurich')
-
-        cavriglia_loc = Location(latitude=43.5354,longitude=11.4814,altitude=308,tz=cav_tz)
-        montsoleil_loc = Location(latitude=47.1642,longitude=6.9903,altitude=1278,tz=ms_tz)
-
-        print("create date_range")
-        dates_c = pd.date_range(start=ac.c_data_date_start, end=ac.c_data_date_end, freq="D")
-        dates_ms = pd.date_range(start=ac.ms_data_date_start, end=ac.ms_data_date_end, freq="D")
-
-
-        for day in dates_c:
-            try:
-                print(day.date())
-
-                cs_path = os.path.join(ac.c_int_data_path, "C-"+str(day.date())+"-int.csv")
-
-                print(cs_path)
-
-                int_data = pd.Series.from_csv(
-                    path=cs_path, sep=',', index_col=0, infer_datetime_format=True)
-
-                times = int_data.index
-
-                #times = pd.date_range(start=str(day)+" "+"05:50:00",end=str(day)+" "+"20:45:00",freq="240S")
-
-                print("time localize")
-                times_localized= times.tz_localize(cavriglia_loc.tz,ambiguous=True)
-                print("calculate athmosphere parameters and sun position")
-                ephem_data= solarposition.get_solarposition(times_localized,cavriglia_loc.latitude,cavriglia_loc.longitude)
-                am= atmosphere.relativeairmass(ephem_data['apparent_zenith'])
-                am= atmosphere.absoluteairmass(am, atmosphere.alt2pres(cavriglia_loc.altitude))
-
-                print("calculate clearsky..")
-                out_c_int = clearsky.ineichen(ephem_data['apparent_zenith'],am,3)['ghi']
-
-
-                #remove timezone info to make later processes easier, avoid automatic conversion to UTC
-
-
-                out_c_int.index = out_c_int.index.tz_localize(None)
-                out_c_int = out_c_int.astype(float)
-
-
-                #print(out_c.index)
-                print(out_c_int)
-                # print(out_c_int.loc['2015-07-15 20:29:55'])
-
-                if print_to_csv is True:
-                    name = "C-"+str(day.date()) + "-cs.csv"
-                    path = os.path.join(path_c, name)
-                    print("Write to: ", path)
-                    out_c_int.to_csv(path, sep=',', index=True)
-
-                if visualize:
-                    out_c_int.plot(x=None)
-                    plt.show()
-
-            except Exception as e:
-                print(e)
-
-
-
-
-
-
-
-
+"""
+Clear sky model (ineichen) of the solar stations, cached per (station, day, frequency) in the station data store.
+
+The clear sky irradiance of a day is computed between DAY_WINDOW (local time, the sun is below the horizon outside of it
+and the window avoids the daylight saving time switches at 02:00/03:00) at the given frequency and stored as float32
+column cs (1s) or cs@<seconds>s (coarser). Only days missing in the cache are computed, in parallel. A coarse cache
+(f.e. 60s) is interpolated linearly to the requested time steps, the error is well below 1 W/m2 for 60s.
+"""
+
+LOCATIONS = {abb_st.C: Location(latitude=43.5354, longitude=11.4814, altitude=308, tz=timezone('Europe/Rome')),
+             abb_st.MS: Location(latitude=47.1642, longitude=6.9903, altitude=1278, tz=timezone('Europe/Zurich'))}
+
+DATE_RANGES = {abb_st.C: (ac.c_data_date_start, ac.c_data_date_end),
+               abb_st.MS: (ac.ms_data_date_start, ac.ms_data_date_end)}
+
+DAY_WINDOW = ('04:00:00', '22:00:00')
+
+
+def _seconds(freq):
+    return int(pd.Timedelta(freq).total_seconds())
+
+
+def cache_column(freq='1s'):
+    """Store column of the clear sky model computed at freq: cs for 1s (same as the imported -cs.csv files)"""
+    seconds = _seconds(freq)
+    if seconds == 1:
+        return abb_ds.CLEAR_SKY
+    return abb_ds.column_name(abb_ds.CLEAR_SKY, str(seconds) + 's')
+
+
+def ineichen_day(day, solar_station=abb_st.C, freq='1s'):
+    """
+    Computes the clear sky irradiance (ghi) of one day
+    :return: pd.Series (float32) with a timezone naive local time index between DAY_WINDOW, step freq
+    """
+    loc = LOCATIONS[solar_station]
+    day = pd.Timestamp(day).normalize()
+    times = pd.date_range(start=day + pd.Timedelta(DAY_WINDOW[0]), end=day + pd.Timedelta(DAY_WINDOW[1]),
+                          freq=dt.timedelta(seconds=_seconds(freq)))
+
+    times_localized = times.tz_localize(loc.tz, ambiguous=True)
+    ephem_data = solarposition.get_solarposition(times_localized, loc.latitude, loc.longitude)
+    am = atmosphere.relativeairmass(ephem_data['apparent_zenith'])
+    am = atmosphere.absoluteairmass(am, atmosphere.alt2pres(loc.altitude))
+    out = clearsky.ineichen(ephem_data['apparent_zenith'], am, 3)['ghi']
+
+    # remove timezone info to make later processes easier, avoid automatic conversion to UTC
+    return pd.Series(out.values.astype(np.float32), index=times)
+
+
+def _cache_day(args):
+    store_root, solar_station, day, freq = args
+    cs = ineichen_day(day, solar_station, freq)
+    abb_ds.StationDataStore(store_root, solar_station).write_day(cache_column(freq), cs, overwrite=True,
+                                                                 dtype=np.float32)
+    return day
+
+
+def update_clear_sky_cache(solar_station=abb_st.C, start=None, end=None, freq='1s', store=None, processes=None):
+    """
+    Computes the clear sky model of all days of the range which are not yet in the cache
+    :param start, end: day range, default: date range of the station data (abb constants)
+    :param processes: worker processes, default: number of cpus, 1: sequential
+    :return: list of computed days
+    """
+    store = abb_ds.StationDataStore(solar_station=solar_station) if store is None else store
+    start = DATE_RANGES[solar_station][0] if start is None else start
+    end = DATE_RANGES[solar_station][1] if end is None else end
+    column = cache_column(freq)
+
+    missing = [day for day in pd.date_range(start=pd.Timestamp(start).normalize(), end=pd.Timestamp(end).normalize(),
+                                            freq="D") if not store.has_day(column, day)]
+    tasks = [(store.root, solar_station, day, freq) for day in missing]
+    if processes == 1 or len(tasks) <= 1:
+        return [_cache_day(t) for t in tasks]
+    with Pool(processes) as pool:
+        return pool.map(_cache_day, tasks)
+
+
+def clear_sky(day, solar_station=abb_st.C, freq='1s', index=None, store=None):
+    """
+    Clear sky irradiance of a day from the cache (computed if missing)
+    :param freq: resolution of the cache, coarse caches are interpolated to index (or to 1s steps if index is None)
+    :param index: DatetimeIndex of the day (f.e. of the irradiance) the model is interpolated to, None: cached steps
+        (1s cache) or 1s steps between DAY_WINDOW (coarse cache). Steps outside of DAY_WINDOW are 0.
+    :return: pd.Series (float32)
+    """
+    store = abb_ds.StationDataStore(solar_station=solar_station) if store is None else store
+    column = cache_column(freq)
+    day = pd.Timestamp(day).normalize()
+    if not store.has_day(column, day):
+        update_clear_sky_cache(solar_station, day, day, freq, store, processes=1)
+    cs = store.read_day(day, [column])[column]
+
+    if index is None:
+        if _seconds(freq) == 1:
+            return cs.rename(abb_ds.CLEAR_SKY)
+        index = pd.date_range(start=cs.index[0], end=cs.index[-1], freq=dt.timedelta(seconds=1))
+    index = pd.DatetimeIndex(index)
+    values = np.interp(index.values.astype(np.int64), cs.index.values.astype(np.int64), cs.values, left=0, right=0)
+    return pd.Series(values.astype(np.float32), index=index, name=abb_ds.CLEAR_SKY)
+
+
+def ineichen_series(path_c=None, path_ms=None, print_to_csv=False, visualize=False, freq='1s', processes=None,
+                    start=None, end=None):
+    """
+    Updates the clear sky caches of station C (and of MS if path_ms is given)
+    :param print_to_csv: additionally writes <station>-<day>-cs.csv to path_c / path_ms (interpolated to the time steps
+        of the -int.csv of the day)
+    """
+    stations = [(abb_st.C, path_c, ac.c_int_data_path, "C-")]
+    if path_ms is not None:
+        stations.append((abb_st.MS, path_ms, ac.ms_int_data_path, "MS-"))
+
+    for solar_station, path, int_path, prefix in stations:
+        print("update clear sky cache", solar_station, freq)
+        computed = update_clear_sky_cache(solar_station, start, end, freq, processes=processes)
+        print("computed", len(computed), "days")
+
+        if not (print_to_csv or visualize):
+            continue
+
+        d_from = DATE_RANGES[solar_station][0] if start is None else start
+        d_to = DATE_RANGES[solar_station][1] if end is None else end
+        for day in pd.date_range(start=pd.Timestamp(d_from).normalize(), end=pd.Timestamp(d_to).normalize(), freq="D"):
+            int_file = os.path.join(int_path, prefix + str(day.date()) + "-int.csv")
+            if not os.path.isfile(int_file):
+                continue
+            times = pd.read_csv(int_file, header=None, index_col=0, parse_dates=True, usecols=[0]).index
+            cs = clear_sky(day, solar_station, freq, index=times).astype(float)
+
+            if print_to_csv is True:
+                name = prefix + str(day.date()) + "-cs.csv"
+                out_path = os.path.join(path, name)
+                print("Write to: ", out_path)
+                cs.to_csv(out_path, sep=',', index=True)
+
+            if visualize:
+                cs.plot(x=None)
+                plt.show()
@@ -0,0 +1,255 @@
+import datetime as dt
+import os
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import abb_clouddrl_read_pipeline as abb_rp
+from .abb_clouddrl_constants import ABB_Solarstation
+
+"""
+Station data store: one named column per signal instead of one csv per signal and day.
+
+Layout (below data_C_int/store by default):
+    <column>/YYYY-MM-DD.npy     structured array (time datetime64[ns], value float64 or float32), sorted by time
+
+Column names: irr, cs, mpc@<constraint>, naive@<constraint>, pred@<model> (see column_name). Every day of every
+column is a separate file, so adding a controller variant or a day only writes new files (days of different columns
+can be written by parallel processes). Existing days are never rewritten unless overwrite=True is passed.
+Reads open the day files as memory maps and only load the days (and rows) of the requested time range.
+"""
+
+IRR = 'irr'
+CLEAR_SKY = 'cs'
+MPC = 'mpc'
+NAIVE = 'naive'
+PREDICTION = 'pred'
+
+_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.\-]+(@[A-Za-z0-9_.\-]+)?$')
+_DAY_FORMAT = '%Y-%m-%d'
+
+
+def _record(dtype=np.float64):
+    return np.dtype([('time', 'M8[ns]'), ('value', dtype)])
+
+
+# suffix of the per day csv files (C-YYYY-MM-DD-<suffix>.csv) -> column
+LEGACY_COLUMNS = {'int': IRR,
+                  'cs': CLEAR_SKY,
+                  'mpc': 'mpc@100_old',
+                  'mpc100': 'mpc@100',
+                  'mpc40': 'mpc@40',
+                  'naive100': 'naive@100_old',
+                  'naive100_new': 'naive@100',
+                  'naive40': 'naive@40_old',
+                  'naive40_new': 'naive@40'}
+
+# column names of the -all.csv files written by the old analysis_g_consolidate_data.py -> column
+ALL_CSV_COLUMNS = OrderedDict([('int', IRR),
+                               ('cs', CLEAR_SKY),
+                               ('mpc100', 'mpc@100_old'),
+                               ('mpc100_new', 'mpc@100'),
+                               ('mpc40', 'mpc@40'),
+                               ('naive100', 'naive@100_old'),
+                               ('naive100_new', 'naive@100'),
+                               ('naive40', 'naive@40_old')])
+
+
+def column_name(kind, variant=None):
+    """
+    column_name('mpc', 100) -> 'mpc@100', column_name('pred', 'cnn_lstm') -> 'pred@cnn_lstm'
+    numeric variants (change constraints in Wh/min) are written as integers
+    """
+    if variant is None:
+        return kind
+    if isinstance(variant, (int, float, np.number)) and float(variant).is_integer():
+        variant = int(variant)
+    return kind + '@' + str(variant)
+
+
+def _check_name(name):
+    if not _NAME_PATTERN.match(name):
+        raise ValueError("Illegal column name: " + str(name))
+
+
+def _to_day(day):
+    return pd.Timestamp(day).normalize()
+
+
+class StationDataStore():
+    def __init__(self, root=None, solar_station=ABB_Solarstation.C):
+        """
+        :param root: store directory, default: <data path of the station>/store
+        """
+        if root is None:
+            root = os.path.join(abb_rp.data_path_dict[solar_station], 'store')
+        self.root = root
+
+    def _day_path(self, name, day):
+        return os.path.join(self.root, name, _to_day(day).strftime(_DAY_FORMAT) + '.npy')
+
+    def columns(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def has_column(self, name):
+        return os.path.isdir(os.path.join(self.root, name))
+
+    def days(self, name=None):
+        """Days (Timestamps) of a column, or of any column if name is None"""
+        names = self.columns() if name is None else [name]
+        days = set()
+        for n in names:
+            path = os.path.join(self.root, n)
+            if os.path.isdir(path):
+                days.update(f[:-4] for f in os.listdir(path) if f.endswith('.npy'))
+        return [pd.Timestamp(d) for d in sorted(days)]
+
+    def has_day(self, name, day):
+        return os.path.isfile(self._day_path(name, day))
+
+    def write_day(self, name, data, overwrite=False, dtype=np.float64):
+        """
+        Writes one day of a column
+        :param data: pd.Series (or single column DataFrame) with a DatetimeIndex within one day
+        :param dtype: stored value type, float32 halves the size of derived columns (f.e. clear sky)
+        """
+        _check_name(name)
+        if isinstance(data, pd.DataFrame):
+            data = data.iloc[:, 0]
+        if len(data.index) == 0:
+            return
+        data = data.sort_index()
+        day = _to_day(data.index[0])
+        if _to_day(data.index[-1]) != day:
+            raise ValueError("write_day: data of column {} spans several days".format(name))
+
+        path = self._day_path(name, day)
+        if os.path.exists(path) and not overwrite:
+            raise ValueError("Column {} already contains {} (use overwrite=True)".format(name, day.date()))
+
+        records = np.empty(len(data.index), dtype=_record(dtype))
+        records['time'] = pd.DatetimeIndex(data.index).values.astype('M8[ns]')
+        records['value'] = data.values
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+
+    def add_column(self, name, data, overwrite=False, dtype=np.float64):
+        """
+        Writes a column (or more days of it), data is split by day
+        :param data: pd.Series with a DatetimeIndex
+        """
+        if isinstance(data, pd.DataFrame):
+            data = data.iloc[:, 0]
+        data = data.sort_index()
+        days = pd.DatetimeIndex(data.index).normalize()
+        bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+            self.write_day(name, data.iloc[start:end], overwrite=overwrite, dtype=dtype)
+
+    def remove_column(self, name):
+        path = os.path.join(self.root, name)
+        for f in os.listdir(path):
+            os.remove(os.path.join(path, f))
+        os.rmdir(path)
+
+    def _read_day(self, name, day, start=None, end=None):
+        path = self._day_path(name, day)
+        if not os.path.isfile(path):
+            return None
+        records = np.load(path, mmap_mode='r')
+        lo, hi = 0, len(records)
+        if start is not None:
+            lo = np.searchsorted(records['time'], np.datetime64(pd.Timestamp(start).to_datetime64(), 'ns'), 'left')
+        if end is not None:
+            hi = np.searchsorted(records['time'], np.datetime64(pd.Timestamp(end).to_datetime64(), 'ns'), 'right')
+        part = np.array(records[lo:hi])
+        return pd.Series(part['value'], index=pd.DatetimeIndex(part['time']), name=name)
+
+    def read_column(self, name, start=None, end=None):
+        """
+        :param start, end: time range (inclusive), anything pd.Timestamp accepts, None = open range
+        :return: pd.Series
+        """
+        if not self.has_column(name):
+            raise KeyError("Unknown column: " + str(name))
+        parts = []
+        for day in self._days_in_range(name, start, end):
+            s = self._read_day(name, day, start, end)
+            if s is not None:
+                parts.append(s)
+        if not parts:
+            return pd.Series([], index=pd.DatetimeIndex([]), name=name, dtype=np.float64)
+        return pd.concat(parts)
+
+    def _days_in_range(self, name, start, end):
+        days = self.days(name)
+        if start is not None:
+            days = [d for d in days if d >= _to_day(start)]
+        if end is not None:
+            days = [d for d in days if d <= _to_day(end)]
+        return days
+
+    def read(self, columns=None, start=None, end=None, join='inner'):
+        """
+        Reads several columns of a time range into one DataFrame
+        :param columns: list of column names, all columns if None. A dict {output name: column name} renames the
+            columns (f.e. ALL_CSV_COLUMNS for the column names of the old -all.csv files)
+        :param join: 'inner' keeps only timestamps present in all columns (like concat + dropna of the csv
+            merges), 'outer' keeps all timestamps
+        """
+        if columns is None:
+            columns = self.columns()
+        if not isinstance(columns, dict):
+            columns = OrderedDict((name, name) for name in columns)
+        series = [self.read_column(name, start, end).rename(out) for out, name in columns.items()]
+        if not series:
+            return pd.DataFrame()
+        return pd.concat(series, axis=1, join=join)[list(columns)]
+
+    def read_day(self, day, columns=None, join='inner'):
+        day = _to_day(day)
+        return self.read(columns, start=day, end=day + dt.timedelta(days=1) - dt.timedelta(microseconds=1),
+                         join=join)
+
+    def iter_days(self, columns=None, start=None, end=None, join='inner'):
+        """
+        Yields (day, DataFrame) for every day in the range which is present in the first column
+        :param columns: list of column names or dict {output name: column name}, like read()
+        """
+        if columns is None:
+            columns = self.columns()
+        elif not isinstance(columns, dict):
+            columns = list(columns)
+        first = next(iter(columns.values())) if isinstance(columns, dict) else columns[0]
+        for day in self._days_in_range(first, start, end):
+            yield day, self.read_day(day, columns, join=join)
+
+
+def import_legacy_day(store, int_path, overwrite=False):
+    """
+    Copies the per day csv files of a day (C-YYYY-MM-DD-int.csv, -cs, -mpc100, -naive100_new, ..., see LEGACY_COLUMNS)
+    into the store, days already in the store are skipped
+    :param int_path: path of the -int.csv file of the day
+    :return: list of written columns
+    """
+    base = int_path.rsplit('-', 1)[0]
+    written = []
+    for suffix, name in LEGACY_COLUMNS.items():
+        path = base + '-' + suffix + '.csv'
+        if not os.path.isfile(path):
+            continue
+        data = pd.read_csv(path, index_col=0, parse_dates=True, header=None).iloc[:, 0]
+        if len(data.index) == 0 or (store.has_day(name, data.index[0]) and not overwrite):
+            continue
+        store.write_day(name, data, overwrite=overwrite)
+        written.append(name)
+
+    return written
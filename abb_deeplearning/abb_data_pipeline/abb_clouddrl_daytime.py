@@ -0,0 +1,148 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import abb_clouddrl_read_pipeline as abb_rp
+from .abb_clouddrl_constants import ABB_Solarstation
+
+"""
+Automatic daytime windows: for a day and a threshold, (t_from, t_to) are the first and last time at which the clear sky
+model reaches threshold * (maximum of the clear sky model of the day).
+
+The windows are kept in a table per station (<data path>/<station>-daytime.csv: day, threshold, t_from, t_to) and
+memoised per process, so the -cs.csv of a day is parsed only once for all thresholds (DEFAULT_THRESHOLDS and the
+requested one are computed together). Days missing in the table are computed on first access and appended.
+Rebuild the table (build_daytime_table(overwrite=True)) after the clear sky files were rewritten.
+"""
+
+DEFAULT_THRESHOLDS = (0.1, 0.2, 0.3)
+TABLE_COLUMNS = ['day', 'threshold', 't_from', 't_to']
+
+_STATION_PREFIX = {ABB_Solarstation.C: 'C', ABB_Solarstation.MS: 'MS'}
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# table path -> {(day string, threshold): (t_from, t_to)}
+_tables = {}
+
+
+def _day(day):
+    return pd.Timestamp(day).strftime('%Y-%m-%d')
+
+
+def _threshold(threshold):
+    return round(float(threshold), 6)
+
+
+def _key(day, threshold):
+    return _day(day), _threshold(threshold)
+
+
+def daytime_table_path(solar_station=ABB_Solarstation.C):
+    return os.path.join(abb_rp.data_path_dict[solar_station], _STATION_PREFIX[solar_station] + '-daytime.csv')
+
+
+def cs_path(day, solar_station=ABB_Solarstation.C):
+    return os.path.join(abb_rp.data_path_dict[solar_station],
+                        _STATION_PREFIX[solar_station] + '-' + pd.Timestamp(day).strftime('%Y-%m-%d') + '-cs.csv')
+
+
+def compute_daytimes(cs_data, thresholds=DEFAULT_THRESHOLDS):
+    """
+    :param cs_data: pd.Series, clear sky model of one day
+    :return: list of (t_from, t_to) Timestamps, one per threshold
+    """
+    values = cs_data.values
+    above = values[None, :] >= values.max() * np.asarray(thresholds, dtype=np.float64)[:, None]
+    first = np.argmax(above, axis=1)
+    last = len(values) - 1 - np.argmax(above[:, ::-1], axis=1)
+    return [(cs_data.index[f], cs_data.index[l]) for f, l in zip(first, last)]
+
+
+def _read_cs(path):
+    return pd.read_csv(path, header=None, index_col=0, parse_dates=True).iloc[:, 0]
+
+
+def _load_table(path):
+    if path in _tables:
+        return _tables[path]
+    table = {}
+    if os.path.isfile(path):
+        df = pd.read_csv(path, dtype={'day': str})
+        t_from = pd.to_datetime(df['t_from'], format=_TIME_FORMAT)
+        t_to = pd.to_datetime(df['t_to'], format=_TIME_FORMAT)
+        for day, threshold, f, t in zip(df['day'], df['threshold'], t_from, t_to):
+            table[_key(day, threshold)] = (f, t)
+    _tables[path] = table
+    return table
+
+
+def _rows(day, thresholds, windows):
+    return [[day, th, f.strftime(_TIME_FORMAT), t.strftime(_TIME_FORMAT)] for th, (f, t) in zip(thresholds, windows)]
+
+
+def _append_rows(path, rows):
+    write_header = not os.path.exists(path) or os.stat(path).st_size == 0
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(TABLE_COLUMNS)
+        writer.writerows(rows)
+
+
+def daytime(day, threshold=0.2, solar_station=ABB_Solarstation.C, cs_file=None):
+    """
+    Daytime window of a day (from the table, computed and appended if missing)
+    :param cs_file: -cs.csv of the day, default: cs_path(day, solar_station)
+    :return: (t_from, t_to) Timestamps
+    """
+    path = daytime_table_path(solar_station)
+    table = _load_table(path)
+    key = _key(day, threshold)
+    if key not in table:
+        thresholds = sorted(set([key[1]] + [_threshold(th) for th in DEFAULT_THRESHOLDS]))
+        thresholds = [th for th in thresholds if (key[0], th) not in table]
+        windows = compute_daytimes(_read_cs(cs_path(day, solar_station) if cs_file is None else cs_file), thresholds)
+        for th, window in zip(thresholds, windows):
+            table[(key[0], th)] = window
+        _append_rows(path, _rows(key[0], thresholds, windows))
+    return table[key]
+
+
+def build_daytime_table(solar_station=ABB_Solarstation.C, thresholds=DEFAULT_THRESHOLDS, overwrite=False):
+    """
+    Computes the daytime windows of all days with a -cs.csv file for all thresholds (one pass per day)
+    :param overwrite: recompute days which are already in the table
+    :return: pd.DataFrame (TABLE_COLUMNS)
+    """
+    path = daytime_table_path(solar_station)
+    table = {} if overwrite else dict(_load_table(path))
+    thresholds = [_threshold(th) for th in thresholds]
+    suffix = '-cs.csv'
+    data_path = abb_rp.data_path_dict[solar_station]
+
+    for f in sorted(os.listdir(data_path)):
+        if not f.endswith(suffix):
+            continue
+        day = f[len(_STATION_PREFIX[solar_station]) + 1:-len(suffix)]
+        try:
+            day = _day(day)
+        except ValueError:
+            continue
+        missing = [th for th in thresholds if (day, th) not in table]
+        if not missing:
+            continue
+        for th, window in zip(missing, compute_daytimes(_read_cs(os.path.join(data_path, f)), missing)):
+            table[(day, th)] = window
+
+    rows = [r for (day, th), window in sorted(table.items()) for r in _rows(day, [th], [window])]
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLE_COLUMNS)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    _tables[path] = table
+
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
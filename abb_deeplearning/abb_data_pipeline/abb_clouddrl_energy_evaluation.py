@@ -0,0 +1,286 @@
+import os
+import warnings
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from . import abb_clouddrl_data_store as abb_ds
+
+"""
+Energy throughput evaluation of battery controllers: the battery has to deliver |irradiance - control input| in every
+step, the sum over a day is the energy throughput of the controller on that day.
+
+The evaluator is fed day by day with the irradiance and the control inputs of N controllers as (T, N) matrix. Absolute
+errors, throughput, thresholded throughput (errors <= loss_threshold count as 0) and error quantiles are computed for
+all controllers at once. The per day rows are kept, the overall quantiles are taken from a per controller error
+histogram (exact up to bin_width), so every day is read and reduced once.
+
+Output files of EnergyThroughputEvaluator.write (per model directory):
+    energy_throughput.csv           thresholded throughput per day and controller (same table as before)
+    energy_throughput_sum.csv       row 'sum' of energy_throughput.csv
+    energy_throughput_stats.csv     all per day metrics, columns <metric>:<controller>
+    energy_throughput_overall.csv   all metrics over all days, one row per controller
+"""
+
+DEFAULT_QUANTILES = [50, 80, 90, 99]
+
+# controllers compared to every model: name in the tables -> store column (names of the old -all.csv files, see
+# abb_ds.ALL_CSV_COLUMNS)
+REFERENCE_CONTROLLERS = OrderedDict([('mpc100', 'mpc@100_old'),
+                                     ('mpc40', 'mpc@40'),
+                                     ('naive100', 'naive@100_old'),
+                                     ('naive40', 'naive@40_old')])
+
+
+def _quantile_names(quantiles):
+    return ['q' + str(q) for q in quantiles]
+
+
+class EnergyThroughputEvaluator():
+    def __init__(self, controllers, loss_threshold=0.0, quantiles=DEFAULT_QUANTILES, bin_width=0.1,
+                 max_error=2000.0):
+        """
+        :param controllers: names of the controllers, order of the columns of the control matrices passed to add_day
+        :param loss_threshold: errors <= loss_threshold are not counted in the thresholded throughput
+        :param quantiles: error percentiles (0-100) in the per day and overall tables
+        :param bin_width, max_error: error histogram of the overall quantiles (larger errors fall into the last bin)
+        """
+        self.controllers = list(controllers)
+        self.loss_threshold = loss_threshold
+        self.quantiles = list(quantiles)
+        self.bin_width = bin_width
+        self.nr_bins = int(np.ceil(max_error / bin_width)) + 1
+        self.metrics = ['throughput', 'throughput_t', 'steps', 'mean'] + _quantile_names(self.quantiles) + ['max']
+
+        n = len(self.controllers)
+        self._days = []
+        self._rows = []
+        self._histogram = np.zeros((n, self.nr_bins), dtype=np.int64)
+        self._offsets = np.arange(n, dtype=np.int64) * self.nr_bins
+
+    def add_day(self, day, irradiance, controls):
+        """
+        :param irradiance: (T,) irradiance, (T, N) if the controllers are compared with different irradiance
+            values (f.e. the actual_irr of a prediction file)
+        :param controls: (T, N) control inputs of the N controllers, (T,) if only one controller is evaluated,
+            missing values (nan) are ignored
+        :return: (metrics, N) array of the day, None if the day has no rows (the day is skipped)
+        """
+        irradiance = np.asarray(irradiance, dtype=np.float64)
+        controls = np.asarray(controls, dtype=np.float64)
+        if controls.size != len(irradiance) * len(self.controllers):
+            raise ValueError("add_day: control inputs of shape {} for {} steps and {} controllers".format(
+                controls.shape, len(irradiance), len(self.controllers)))
+        if len(irradiance) == 0:
+            return None
+        controls = controls.reshape(len(irradiance), len(self.controllers))
+        if irradiance.ndim == 1:
+            irradiance = irradiance[:, None]
+        elif irradiance.shape != controls.shape:
+            raise ValueError("add_day: irradiance of shape {} for {} controllers".format(
+                irradiance.shape, len(self.controllers)))
+
+        err = np.abs(irradiance - controls)
+        valid = ~np.isnan(err)
+        steps = valid.sum(axis=0)
+        err0 = np.where(valid, err, 0.0)
+        throughput = err0.sum(axis=0)
+        throughput_t = np.where(err0 > self.loss_threshold, err0, 0.0).sum(axis=0)
+
+        with warnings.catch_warnings():
+            # controllers without values on a day get nan quantiles
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = throughput / steps
+            if self.quantiles:
+                quantiles = np.nanpercentile(err, self.quantiles, axis=0).reshape(len(self.quantiles), -1)
+            else:
+                quantiles = np.zeros((0, err.shape[1]))
+            maximum = np.nanmax(err, axis=0) if len(err) else np.full(err.shape[1], np.nan)
+
+        bins = np.minimum((err0 / self.bin_width).astype(np.int64), self.nr_bins - 1) + self._offsets
+        self._histogram += np.bincount(bins[valid], minlength=self._histogram.size).reshape(self._histogram.shape)
+
+        row = np.vstack([throughput, throughput_t, steps, mean, quantiles, maximum])
+        self._days.append(pd.Timestamp(day).normalize())
+        self._rows.append(row)
+        return row
+
+    def per_day(self):
+        """All per day metrics, columns (metric, controller)"""
+        columns = pd.MultiIndex.from_product([self.metrics, self.controllers], names=['metric', 'controller'])
+        if not self._rows:
+            return pd.DataFrame(np.zeros((0, len(columns))), columns=columns, index=pd.DatetimeIndex([]))
+        data = np.stack(self._rows).reshape(len(self._rows), -1)
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self._days), columns=columns).sort_index()
+
+    def throughput(self, thresholded=True):
+        """Per day throughput, one column per controller (layout of the old energy_throughput.csv)"""
+        return self.per_day()['throughput_t' if thresholded else 'throughput'][self.controllers]
+
+    def _histogram_quantiles(self):
+        counts = self._histogram
+        cdf = np.cumsum(counts, axis=1)
+        total = cdf[:, -1]
+        result = np.full((len(self.quantiles), len(self.controllers)), np.nan)
+        for c in np.flatnonzero(total):
+            rank = np.asarray(self.quantiles, dtype=np.float64) / 100.0 * total[c]
+            b = np.minimum(np.searchsorted(cdf[c], rank, side='left'), self.nr_bins - 1)
+            below = np.where(b > 0, cdf[c][b - 1], 0)
+            frac = np.clip((rank - below) / np.maximum(counts[c][b], 1), 0, 1)
+            result[:, c] = (b + frac) * self.bin_width
+        return result
+
+    def overall(self):
+        """All metrics over all days, one row per controller"""
+        per_day = self.per_day()
+        steps = per_day['steps'].sum().values
+        throughput = per_day['throughput'].sum().values
+        maximum = per_day['max'].max().values
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            # interpolation within the last bin must not exceed the largest error
+            quantiles = np.minimum(self._histogram_quantiles(), maximum[None, :])
+            data = [throughput, per_day['throughput_t'].sum().values, steps, throughput / steps] + \
+                   list(quantiles) + [maximum]
+        return pd.DataFrame(np.vstack(data).T, index=self.controllers, columns=self.metrics)
+
+    def write(self, output_path):
+        """Writes the tables listed in the module documentation to the directory output_path"""
+        os.makedirs(output_path, exist_ok=True)
+        throughput = self.throughput()
+        throughput.to_csv(os.path.join(output_path, 'energy_throughput.csv'))
+        pd.DataFrame([throughput.sum()], index=['sum']).to_csv(os.path.join(output_path, 'energy_throughput_sum.csv'))
+
+        per_day = self.per_day()
+        per_day.columns = [m + ':' + c for m, c in per_day.columns]
+        per_day.to_csv(os.path.join(output_path, 'energy_throughput_stats.csv'))
+        self.overall().to_csv(os.path.join(output_path, 'energy_throughput_overall.csv'))
+
+
+def mpc_prediction_days(model_path, change_constraint=100, skip_preds=2):
+    """
+    Yields (day, control inputs, irradiance) of the MPC on predictions (analysis_pred_perform_mpc.py) of a model
+    directory, files <model_path>/MPC<c>-<skip>/...-pred_mpc<c>.csv, columns mpc_pred and actual_irr (the MPC is
+    evaluated against the irradiance of its own file, None if the file has no actual_irr column)
+    """
+    full_path = mpc_prediction_path(model_path, change_constraint, skip_preds)
+    filter_name = 'mpc' + str(int(change_constraint))
+    for f in sorted(os.listdir(full_path)):
+        if filter_name not in f or not f.endswith('.csv'):
+            continue
+        df = pd.read_csv(os.path.join(full_path, f), index_col=0, parse_dates=True)
+        if len(df.index):
+            yield df.index[0].normalize(), df['mpc_pred'], df['actual_irr'] if 'actual_irr' in df else None
+
+
+def mpc_prediction_path(model_path, change_constraint=100, skip_preds=2):
+    return os.path.join(model_path, "MPC" + str(int(change_constraint)) + "-" + str(skip_preds))
+
+
+def rl_prediction_days(model_path, column='ci'):
+    """Yields (day, control inputs) of the evaluation of a reinforcement learning agent, <model_path>/eval_predictions.csv"""
+    control = pd.read_csv(os.path.join(model_path, 'eval_predictions.csv'), index_col=0, parse_dates=True)[column]
+    control = control.sort_index()
+    days = control.index.normalize()
+    bounds = np.flatnonzero(days[1:] != days[:-1]) + 1
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(days)]):
+        yield days[start], control.iloc[start:end]
+
+
+def evaluate(control_days, name, store=None, reference_controllers=REFERENCE_CONTROLLERS, **evaluator_kwargs):
+    """
+    Evaluates a model against the reference controllers of the store at the time steps of the model
+    :param control_days: iterable of (day, pd.Series of control inputs) or (day, control inputs, pd.Series of the
+        irradiance the model is compared with), f.e. mpc_prediction_days(...). Without the irradiance of the model
+        (or None) the model is compared with the irradiance of the store like the reference controllers
+    :param name: name of the model in the tables
+    :param reference_controllers: {name in the tables: store column}
+    :param evaluator_kwargs: loss_threshold, quantiles, ... (see EnergyThroughputEvaluator)
+    :return: EnergyThroughputEvaluator
+    """
+    store = abb_ds.StationDataStore() if store is None else store
+    evaluator = EnergyThroughputEvaluator([name] + list(reference_controllers), **evaluator_kwargs)
+    columns = OrderedDict([(abb_ds.IRR, abb_ds.IRR)])
+    columns.update(reference_controllers)
+
+    for item in control_days:
+        day, control, irradiance = (tuple(item) + (None,))[:3]
+        reference = store.read(columns, start=control.index[0], end=control.index[-1], join='outer')
+        reference = reference.reindex(control.index).values
+        controls = np.column_stack([control.values, reference[:, 1:]])
+        if irradiance is None:
+            irradiance = reference[:, 0]
+        else:
+            irradiance = np.column_stack([irradiance.values] + [reference[:, 0]] * len(reference_controllers))
+        evaluator.add_day(day, irradiance, controls)
+
+    return evaluator
+
+
+def evaluate_store(store=None, controllers=None, start=None, end=None, **evaluator_kwargs):
+    """
+    Evaluates controllers of the store (default: every mpc@ and naive@ column) on all days of the irradiance
+    :return: EnergyThroughputEvaluator
+    """
+    store = abb_ds.StationDataStore() if store is None else store
+    if controllers is None:
+        controllers = [c for c in store.columns() if c.split('@')[0] in (abb_ds.MPC, abb_ds.NAIVE)]
+    evaluator = EnergyThroughputEvaluator(controllers, **evaluator_kwargs)
+
+    for day, df in store.iter_days([abb_ds.IRR] + list(controllers), start=start, end=end, join='outer'):
+        evaluator.add_day(day, df[abb_ds.IRR].values, df[list(controllers)].values)
+
+    return evaluator
+
+
+def _evaluate_model_path(args):
+    model_path, kind, store_root, write, kwargs = args
+    kwargs = dict(kwargs)
+    if kind == 'mpc':
+        change_constraint, skip_preds = kwargs.pop('change_constraint'), kwargs.pop('skip_preds')
+        days = mpc_prediction_days(model_path, change_constraint, skip_preds)
+        name = 'mpc_pred' + str(int(change_constraint))
+        output_path = mpc_prediction_path(model_path, change_constraint, skip_preds)
+    elif kind == 'rl':
+        days = rl_prediction_days(model_path)
+        name = 'rl'
+        output_path = model_path
+    else:
+        raise ValueError("Unknown prediction kind: " + str(kind))
+
+    evaluator = evaluate(days, name, store=abb_ds.StationDataStore(store_root), **kwargs)
+    if write:
+        evaluator.write(output_path)
+        print("Energy throughput:", output_path)
+    return evaluator.throughput()[name], evaluator.overall().loc[name]
+
+
+def evaluate_model_paths(model_paths, kind='mpc', store_root=None, processes=None, change_constraint=100,
+                         skip_preds=2, write=True, **evaluator_kwargs):
+    """
+    Evaluates the predictions of many model directories in a process pool, the tables of every model are written
+    to its directory (MPC<c>-<skip> for kind='mpc', the model directory for kind='rl')
+    :param kind: 'mpc' (analysis_pred_perform_mpc.py output) or 'rl' (eval_predictions.csv)
+    :param write: False = only return the tables, the tables in the model directories are left unchanged
+    :param store_root: root of the StationDataStore, default store of station C
+    :return: (thresholded throughput per day, one column per model directory; overall metrics, one row per model)
+    """
+    kwargs = dict(evaluator_kwargs)
+    if kind == 'mpc':
+        kwargs.update(change_constraint=change_constraint, skip_preds=skip_preds)
+    tasks = [(path, kind, store_root, write, kwargs) for path in model_paths]
+
+    if processes == 1 or len(tasks) <= 1:
+        results = [_evaluate_model_path(t) for t in tasks]
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(_evaluate_model_path, tasks)
+
+    names = [os.path.basename(os.path.normpath(path)) for path in model_paths]
+    if not results:
+        return pd.DataFrame(), pd.DataFrame()
+    comparison = pd.concat([r[0].rename(n) for r, n in zip(results, names)], axis=1)
+    overall = pd.DataFrame([r[1] for r in results], index=names)
+    return comparison, overall
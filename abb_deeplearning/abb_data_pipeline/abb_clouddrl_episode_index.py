@@ -0,0 +1,119 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+"""
+Hard episode index for the reinforcement learning experiments. Instead of pickling lists of episode DataFrames,
+evaluation runs append one row per episode (start, end, reward, per step error quantiles) to a csv index.
+Training selects episodes from the index by reward threshold or percentile and slices them out of the shared
+episode store (rl_data csv, sorted by time) when they are sampled.
+"""
+
+ERROR_QUANTILES = [0.5, 0.9, 0.99]
+INDEX_COLUMNS = ['start', 'end', 'steps', 'reward_sum', 'reward_mean', 'err_mean'] + \
+                ['err_q' + str(int(q * 100)) for q in ERROR_QUANTILES] + ['err_max']
+
+
+def episode_errors(episode_df, control_inputs, irr_column='irr'):
+    """
+    :param episode_df: episode DataFrame (index: timestamps)
+    :param control_inputs: list of (control input, timestamp) tuples of the episode
+    :return: absolute difference between control input and irradiance per step
+    """
+    if not control_inputs:
+        return np.zeros(0)
+    ci = np.array([t[0] for t in control_inputs], dtype=np.float64)
+    irr = episode_df[irr_column].reindex([t[1] for t in control_inputs]).values.astype(np.float64)
+    return np.abs(irr - ci)
+
+
+class EpisodeIndexWriter():
+    def __init__(self, path):
+        """
+        Appends episodes to the index at path, the file stays open and is flushed after every episode
+        so the index is usable while an evaluation is still running
+        """
+        self.path = path
+        write_header = not os.path.exists(path) or os.stat(path).st_size == 0
+        self.file = open(path, 'a')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(INDEX_COLUMNS)
+            self.file.flush()
+
+    def add(self, start, end, rewards, errors):
+        rewards = np.asarray(rewards, dtype=np.float64)
+        errors = np.asarray(errors, dtype=np.float64)
+        if len(errors):
+            error_stats = [np.mean(errors)] + list(np.percentile(errors, [q * 100 for q in ERROR_QUANTILES])) + \
+                          [np.max(errors)]
+        else:
+            error_stats = [np.nan] * (len(ERROR_QUANTILES) + 2)
+
+        self.writer.writerow([str(start), str(end), len(rewards), np.sum(rewards),
+                              np.mean(rewards) if len(rewards) else np.nan] + error_stats)
+        self.file.flush()
+
+    def add_episode(self, episode_df, control_inputs, rewards):
+        self.add(episode_df.index[0], episode_df.index[-1], rewards, episode_errors(episode_df, control_inputs))
+
+    def close(self):
+        self.file.close()
+
+
+def read_episode_index(path):
+    return pd.read_csv(path, parse_dates=['start', 'end'])
+
+
+def select_episodes(index_df, max_reward=None, percentile=None, column='reward_sum'):
+    """
+    Hard episodes of the index, either all episodes with column <= max_reward or the lowest percentile
+    (e.g. percentile=10: 10% of episodes with lowest reward). Error columns select the highest percentile.
+    """
+    selected = index_df
+    higher_is_harder = column.startswith('err')
+    if max_reward is not None:
+        selected = selected[selected[column] >= max_reward] if higher_is_harder else \
+            selected[selected[column] <= max_reward]
+    if percentile is not None:
+        if higher_is_harder:
+            selected = selected[selected[column] >= np.percentile(index_df[column], 100 - percentile)]
+        else:
+            selected = selected[selected[column] <= np.percentile(index_df[column], percentile)]
+    return selected.reset_index(drop=True)
+
+
+def difficulty_weights(index_df, column='reward_sum', alpha=1.0):
+    """
+    Rank based sampling probabilities (like rank based prioritized replay): p_i ~ (1/rank_i)^alpha, rank 1 is the
+    hardest episode. alpha=0 samples uniformly.
+    """
+    values = index_df[column].values
+    if not column.startswith('err'):
+        values = -values
+    ranks = np.empty(len(values))
+    ranks[np.argsort(-values, kind='mergesort')] = np.arange(1, len(values) + 1)
+    weights = (1.0 / ranks) ** alpha
+    return weights / np.sum(weights)
+
+
+def episode_slices(store_df, index_df):
+    """
+    Positions of the indexed episodes in the store (sorted by time)
+    :return: start and stop (exclusive) arrays, store_df.iloc[start:stop] is the episode
+    """
+    store_index = store_df.index.values
+    starts = np.searchsorted(store_index, index_df['start'].values, side='left')
+    stops = np.searchsorted(store_index, index_df['end'].values, side='right')
+    return starts, stops
+
+
+def episode_from_store(store_df, start, stop):
+    # only the sampled episode is copied, with done flag on its last sample
+    episode_df = store_df.iloc[start:stop].copy()
+    done_pd = np.zeros(len(episode_df.index)).astype(int)
+    done_pd[-1] = 1
+    episode_df["done"] = done_pd
+    return episode_df
@@ -0,0 +1,130 @@
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from . import abb_clouddrl_read_pipeline as abb_rp
+
+"""
+Parallel image transformations (rescaling, sunspot markers) of the cloud images.
+
+Days are processed by a pool of workers. Every image is decoded once as uint8 and resized to all requested scales with
+PIL (bilinear with antialiasing), the sunspot table (-sp.csv) of a day is read once. Outputs are written next to the
+images (same names as before: <image>_Resize<scale>.jpeg, <image>_Resize_sp_<scale>.jpeg) through a temporary file,
+completed outputs are appended to a manifest per day directory (MANIFEST_NAME), so interrupted runs resume where they
+stopped. Outputs written by older runs (file exists, not in the manifest) are skipped as well.
+"""
+
+MANIFEST_NAME = '.transformations'
+SUNSPOT_HALF_SIZE = 20
+SUNSPOT_COLOR = (0, 255, 0)
+
+
+def output_path(image_path, scale, sunspots=False):
+    prefix = image_path.rsplit('_', 1)[0]
+    return prefix + ('_Resize_sp_' if sunspots else '_Resize') + str(scale) + '.jpeg'
+
+
+def draw_sunspot(image, x, y, half_size=SUNSPOT_HALF_SIZE, color=SUNSPOT_COLOR):
+    """Draws the (2 * half_size + 1) square marker centered on image[x, y] (x: row, y: column) in place"""
+    image[max(x - half_size, 0):x + half_size + 1, max(y - half_size, 0):y + half_size + 1] = color
+    return image
+
+
+def transform_image(image_path, scales, sunspot=None, draft=False):
+    """
+    Decodes an image once and returns it resized to every scale
+    :param sunspot: (x, y) pixel coordinates of the sun, drawn as marker before resizing
+    :param draft: let the jpeg decoder reduce the image (1/2, 1/4, 1/8) to at least the largest scale, only used
+        without sunspot (the sunspot coordinates refer to the full image)
+    :return: dict scale -> uint8 array (scale, scale, channels)
+    """
+    with Image.open(image_path) as img:
+        if draft and sunspot is None:
+            img.draft(img.mode, (max(scales), max(scales)))
+        img = img.convert('RGB')
+        if sunspot is not None:
+            img = Image.fromarray(draw_sunspot(np.array(img), int(sunspot[0]), int(sunspot[1])))
+        return {scale: np.asarray(img.resize((scale, scale), Image.BILINEAR)) for scale in scales}
+
+
+def _save(array, path):
+    tmp_path = path + '.tmp'
+    Image.fromarray(array).save(tmp_path, format='JPEG')
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(day_path):
+    path = os.path.join(day_path, MANIFEST_NAME)
+    if not os.path.isfile(path):
+        return set()
+    with open(path) as f:
+        return set(line.strip() for line in f if line.strip())
+
+
+def _transform_day(args):
+    day_path, images, scales, sunspot_path, draft = args
+    sunspots = sunspot_path is not None
+    done = _read_manifest(day_path) | set(os.listdir(day_path))
+
+    todo = [(key, path) for key, path in images.items()
+            if not all(os.path.basename(output_path(path, s, sunspots)) in done for s in scales)]
+    if not todo:
+        return 0, len(images)
+
+    if sunspots:
+        # sunspot table of the day, read once: time -> (x, y)
+        sunspot_data = pd.read_csv(sunspot_path, index_col=0, parse_dates=True, header=None).iloc[:, 0:2]
+        sunspot_data = sunspot_data[~sunspot_data.index.duplicated()]
+        coords = sunspot_data.reindex(pd.DatetimeIndex([key for key, _ in todo])).values
+
+    transformed = 0
+    with open(os.path.join(day_path, MANIFEST_NAME), 'a') as manifest:
+        for i, (key, path) in enumerate(todo):
+            sunspot = coords[i] if sunspots else None
+            if sunspots and np.isnan(sunspot).any():
+                print(path, "has no sunspot coordinates")
+                continue
+            for scale, image in transform_image(path, scales, sunspot, draft).items():
+                out = output_path(path, scale, sunspots)
+                _save(image, out)
+                manifest.write(os.path.basename(out) + '\n')
+            manifest.flush()
+            transformed += 1
+
+    return transformed, len(images) - len(todo)
+
+
+def transform_images(scales, sunspots=False, solar_station=None, img_d_tup_l=None, img_t_tup_l=None,
+                     automatic_daytime=False, file_filter={"Debevec", ".jpeg"}, processes=None, draft=False):
+    """
+    Resizes (and marks the sunspot on) all images of the day/time ranges, one worker per day
+    :param scales: int or list of output sizes in pixels, all are produced from one decode
+    :param sunspots: draw the sunspot marker (needs the -sp.csv of the days)
+    :param processes: worker processes, default: number of cpus, 1: sequential
+    :return: (number of transformed images, number of skipped images)
+    """
+    scales = [scales] if np.isscalar(scales) else list(scales)
+    kwargs = {} if solar_station is None else {'solar_station': solar_station}
+
+    tasks = []
+    for day in abb_rp.read_cld_img_time_range_paths(img_d_tup_l=img_d_tup_l, img_t_tup_l=img_t_tup_l,
+                                                    automatic_daytime=automatic_daytime, file_filter=file_filter,
+                                                    get_sp_data=sunspots, randomize_days=False, **kwargs):
+        if not day[0]:
+            continue
+        day_path = os.path.dirname(next(iter(day[0].values())))
+        tasks.append((day_path, dict(day[0]), scales, day[2] if sunspots else None, draft))
+
+    if processes == 1 or len(tasks) <= 1:
+        results = [_transform_day(t) for t in tasks]
+    else:
+        with Pool(processes) as pool:
+            results = list(pool.imap_unordered(_transform_day, tasks))
+
+    transformed = sum(r[0] for r in results)
+    skipped = sum(r[1] for r in results)
+    print("Transformed", transformed, "images, skipped", skipped, "(done before)")
+    return transformed, skipped
@@ -8,6 +8,7 @@ from .abb_clouddrl_constants import ABB_Solarstation
 from .abb_clouddrl_constants import abb_filepattern
 from . import abb_clouddrl_transformation_pipeline
 from . import abb_clouddrl_visualization_pipeline
+from . import abb_clouddrl_daytime as abb_dt
 import itertools as it
 import datetime as dt
 import os
@@ -161,12 +162,10 @@ def read_cld_img_time_range_paths(solar_station=ABB_Solarstation.C, img_d_tup_l=
                 raise ValueError('Wrong solar power plant input')
         """
         if automatic_daytime:
+            # precomputed daytime table (abb_clouddrl_daytime), the -cs.csv is only read for days missing in it
             cs_path = day_path[1].rsplit('-', 1)[0] + '-cs.csv'
-            cs_data = pd.Series.from_csv(cs_path)
-            threshold_irradiance = cs_data.max() * automatic_daytime_threshold
-            cs_ind = cs_data[cs_data>=threshold_irradiance].index
-            t_from = cs_ind[0]
-            t_to = cs_ind[-1]
+            t_from, t_to = abb_dt.daytime(os.path.basename(day_path[0]).split('-', 1)[1], automatic_daytime_threshold,
+                                          solar_station, cs_file=cs_path)
             img_t_tup_l = [(t_from,t_to)]
             print(str(day_path[1]) + " restricted to automatic daytimes: ", img_t_tup_l)
 
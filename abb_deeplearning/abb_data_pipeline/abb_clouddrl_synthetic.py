@@ -0,0 +1,262 @@
+import datetime as dt
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+"""
+Synthetic station data for load tests and small test fixtures. Writes a station tree in the layout of the
+/media/data/Daten tree:
+
+    root/img_C/C-<day>/<Y_m_d_H_M_S>_Debevec.jpeg
+    root/img_C/cavriglia_skymask<image_size>.png
+    root/data_C_int/C-<day>-int.csv, -cs.csv, -mpc.csv, -sp.csv
+    root/rl_data.csv
+
+Clouds are soft discs drifting with a common wind over a fisheye sky. The irradiance is the clear sky irradiance
+attenuated by the clouds in front of the sun, so images and irradiance agree. Days are generated in parallel.
+"""
+
+LATITUDE = 43.5354  # Cavriglia
+
+DEFAULT_CLOUD_FIELD = {
+    'nr_clouds': 12,  # clouds in the (periodic) cloud field
+    'radius': (0.1, 0.35),  # cloud radius range, fraction of the image radius
+    'speed': (2e-4, 8e-4),  # wind speed range, image radii per second
+    'opacity': (0.5, 0.95),  # cloud optical thickness range, 1 blocks the sun completely
+    'softness': 0.3,  # width of the cloud edge, fraction of the radius
+    'diffuse': 0.15,  # fraction of the clear sky irradiance that is left under a thick cloud
+}
+
+
+def solar_position(times, latitude=LATITUDE):
+    """
+    Approximate solar elevation and azimuth (degrees) for local solar time (no equation of time)
+    :param times: DatetimeIndex
+    :return: elevation, azimuth arrays
+    """
+    lat = np.radians(latitude)
+    day_of_year = times.dayofyear.values
+    hours = times.hour.values + times.minute.values / 60.0 + times.second.values / 3600.0
+
+    declination = np.radians(23.44) * np.sin(2 * np.pi * (284 + day_of_year) / 365.0)
+    hour_angle = np.radians(15.0 * (hours - 12.0))
+    sin_elevation = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    elevation = np.arcsin(np.clip(sin_elevation, -1, 1))
+    azimuth = np.arctan2(np.sin(hour_angle), np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))
+    return np.degrees(elevation), (np.degrees(azimuth) + 180.0) % 360.0
+
+
+def clear_sky_irradiance(elevation):
+    """Haurwitz clear sky model, global horizontal irradiance in W/m^2"""
+    cos_zenith = np.sin(np.radians(np.maximum(elevation, 0)))
+    with np.errstate(divide='ignore'):
+        ghi = 1098.0 * cos_zenith * np.exp(-0.057 / cos_zenith)
+    return np.where(cos_zenith > 0, ghi, 0.0)
+
+
+def ramp_limited(target, max_change):
+    """
+    Follows target with at most max_change per sample. Used as stand in for the MPC solution, it is the optimal
+    policy of the MPC without look ahead.
+    """
+    out = np.empty(len(target))
+    out[0] = target[0]
+    for i in range(1, len(target)):
+        out[i] = out[i - 1] + min(max(target[i] - out[i - 1], -max_change), max_change)
+    return out
+
+
+class CloudField():
+    def __init__(self, cloud_field=None, seed=0):
+        """
+        Periodic field of drifting clouds in image coordinates (image circle = unit disc). Positions are analytic in
+        time, so the sun coverage can be evaluated every second and images only at image timestamps.
+        :param cloud_field: settings, see DEFAULT_CLOUD_FIELD (missing keys use the defaults)
+        """
+        self.settings = dict(DEFAULT_CLOUD_FIELD, **(cloud_field or {}))
+        rng = np.random.RandomState(seed)
+        n = self.settings['nr_clouds']
+
+        wind_direction = rng.uniform(0, 2 * np.pi)
+        self.velocity = rng.uniform(*self.settings['speed']) * np.array([np.cos(wind_direction),
+                                                                          np.sin(wind_direction)])
+        self.period = 3.0  # clouds wrap around in [-1.5,1.5]^2, they enter and leave the image circle
+        self.origin = rng.uniform(-1.5, 1.5, size=(n, 2))
+        self.radius = rng.uniform(*self.settings['radius'], size=n)
+        self.opacity = rng.uniform(*self.settings['opacity'], size=n)
+
+    def centers(self, seconds):
+        """:return: cloud centers (len(seconds), nr_clouds, 2)"""
+        pos = self.origin[None, :, :] + np.asarray(seconds, dtype=np.float64)[:, None, None] * self.velocity
+        return (pos + self.period / 2) % self.period - self.period / 2
+
+    def density(self, seconds, points):
+        """
+        Cloud optical density at points
+        :param seconds: (T,) seconds since the start of the day
+        :param points: (T, P, 2) positions per time
+        :return: (T, P) density in [0,1]
+        """
+        centers = self.centers(seconds).astype(np.float32)
+        points = np.asarray(points, dtype=np.float32)
+        extent = np.max(np.abs(points))
+        out = np.zeros(points.shape[:2], dtype=np.float32)
+        for c in range(len(self.radius)):
+            edge = self.settings['softness'] * self.radius[c]
+            # only the times at which the cloud is close to the points are evaluated
+            near = np.flatnonzero(np.max(np.abs(centers[:, c, :]), axis=1) < extent + self.radius[c] + edge)
+            if len(near) == 0:
+                continue
+            dist = np.hypot(points[near, :, 0] - centers[near, None, c, 0],
+                            points[near, :, 1] - centers[near, None, c, 1])
+            out[near] += self.opacity[c] * np.clip((self.radius[c] + edge / 2 - dist) / edge, 0, 1)
+        return np.minimum(out, 1.0)
+
+
+def sun_image_position(elevation, azimuth):
+    """Equidistant fisheye projection, zenith in the image center, north up"""
+    r = (90.0 - elevation) / 90.0
+    a = np.radians(azimuth)
+    return np.stack([r * np.sin(a), -r * np.cos(a)], axis=-1)
+
+
+def _grid(size):
+    coords = (np.arange(size, dtype=np.float32) + 0.5) / size * 2 - 1
+    return np.meshgrid(coords, coords)
+
+
+def _interpolation_matrix(size_out, size_in):
+    """Linear interpolation from size_in to size_out samples (pixel centers aligned), as (size_out, size_in) matrix"""
+    x = np.clip((np.arange(size_out) + 0.5) * size_in / size_out - 0.5, 0, size_in - 1)
+    lo = np.floor(x).astype(int)
+    hi = np.minimum(lo + 1, size_in - 1)
+    w = np.zeros((size_out, size_in), dtype=np.float32)
+    w[np.arange(size_out), lo] += 1 - (x - lo)
+    w[np.arange(size_out), hi] += x - lo
+    return w
+
+
+def render_images(field, seconds, sun_positions, image_size, field_size=64, chunk_size=64):
+    """
+    Renders sky images for the given seconds. Cloud density and sun glare are smooth, they are evaluated on a
+    field_size grid for a chunk of frames at once and upsampled to image_size with two matrix products.
+    :return: generator of uint8 (image_size, image_size, 3) arrays
+    """
+    field_size = min(field_size, image_size)
+    fx, fy = _grid(field_size)
+    grid = np.stack([fx.ravel(), fy.ravel()], axis=-1)
+    up = _interpolation_matrix(image_size, field_size)
+
+    xx, yy = _grid(image_size)
+    inside = (xx ** 2 + yy ** 2 <= 1.0)[:, :, None]
+    sky = np.array([70, 120, 200], dtype=np.float32) + \
+        np.hypot(xx, yy)[:, :, None] * np.array([60, 60, 40], dtype=np.float32)
+    glare_color = np.float32(255) - sky
+    cloud_color = np.array([235, 235, 240], dtype=np.float32)
+
+    for start in range(0, len(seconds), chunk_size):
+        s = seconds[start:start + chunk_size]
+        sun = sun_positions[start:start + chunk_size].astype(np.float32)
+        alpha = field.density(s, np.broadcast_to(grid, (len(s),) + grid.shape)).reshape(len(s), field_size,
+                                                                                         field_size)
+        glare = np.clip(1.0 - np.hypot(fx[None] - sun[:, None, None, 0], fy[None] - sun[:, None, None, 1]) / 0.15,
+                        0, 1)
+        alpha = np.matmul(np.matmul(up, alpha), up.T)[..., None]
+        glare = np.matmul(np.matmul(up, glare.astype(np.float32)), up.T)[..., None]
+
+        frames = ((sky + glare * glare_color) * (1 - alpha) + cloud_color * alpha) * inside
+        for frame in frames:
+            yield np.uint8(np.clip(frame, 0, 255))
+
+
+def sky_mask(image_size):
+    """Mask of the fisheye circle (255 inside), same convention as cavriglia_skymask256.png"""
+    xx, yy = _grid(image_size)
+    return np.uint8((xx ** 2 + yy ** 2 <= 1.0) * 255)
+
+
+def create_synthetic_day(root, day, image_size=256, image_interval_s=7, start_time='06:00:00', end_time='20:00:00',
+                         cloud_field=None, change_constraint_wh_min=100, daytime_threshold=0.2, jpeg_quality=90,
+                         seed=0):
+    """
+    Writes the images and data files of one day (see module docstring)
+    :param day: datetime of the day
+    :param daytime_threshold: images are written while the clear sky irradiance is above this fraction of its maximum
+        (same as automatic_daytime in the read pipeline)
+    :return: rl_data rows of the day (irr, mpc, cs, img_name), indexed by image time
+    """
+    day_name = 'C-' + day.strftime('%Y-%m-%d')
+    img_dir = os.path.join(root, 'img_C', day_name)
+    data_dir = os.path.join(root, 'data_C_int')
+    os.makedirs(img_dir, exist_ok=True)
+
+    t_from = dt.datetime.combine(day.date(), dt.datetime.strptime(start_time, '%H:%M:%S').time())
+    t_to = dt.datetime.combine(day.date(), dt.datetime.strptime(end_time, '%H:%M:%S').time())
+    times = pd.date_range(t_from, t_to, freq=dt.timedelta(seconds=1))
+    seconds = np.arange(len(times), dtype=np.float64)
+
+    elevation, azimuth = solar_position(times)
+    cs = clear_sky_irradiance(elevation)
+    sun = sun_image_position(elevation, azimuth)
+
+    field = CloudField(cloud_field, seed=seed)
+    cover = field.density(seconds, sun[:, None, :])[:, 0]
+    diffuse = field.settings['diffuse']
+    irr = cs * (1.0 - (1.0 - diffuse) * cover)
+    mpc = ramp_limited(irr, change_constraint_wh_min / 60.0)
+
+    sun_pixels = np.clip((sun + 1) / 2 * image_size, 0, image_size - 1)
+    for suffix, data in (('int', irr), ('cs', cs), ('mpc', mpc), ('sp', sun_pixels[:, ::-1])):
+        # whole seconds are written as 'Y-m-d H:M:S' like the interpolated station data
+        pd.DataFrame(data, index=times).to_csv(os.path.join(data_dir, day_name + '-' + suffix + '.csv'), header=False)
+
+    image_pos = np.arange(0, len(times), image_interval_s)
+    image_pos = image_pos[cs[image_pos] >= cs.max() * daytime_threshold]
+    image_names = []
+    for pos, frame in zip(image_pos, render_images(field, seconds[image_pos], sun[image_pos], image_size)):
+        image_name = times[pos].strftime('%Y_%m_%d_%H_%M_%S') + '_Debevec.jpeg'
+        Image.fromarray(frame).save(os.path.join(img_dir, image_name), quality=jpeg_quality)
+        image_names.append(os.path.join(day_name, image_name))
+
+    rl_pd = pd.DataFrame({'irr': irr[image_pos], 'mpc': mpc[image_pos], 'cs': cs[image_pos]},
+                         index=times[image_pos], columns=['irr', 'mpc', 'cs'])
+    rl_pd['img_name'] = image_names
+    return rl_pd
+
+
+def _create_synthetic_day(args):
+    root, day, kwargs = args
+    return create_synthetic_day(root, day, **kwargs)
+
+
+def create_synthetic_station(root, first_day='2015-07-16', nr_days=10, processes=None, rl_data_name='rl_data.csv',
+                             seed=0, **day_kwargs):
+    """
+    Writes a synthetic station tree (see module docstring), days are generated in parallel
+    :param first_day: first day, string YYYY-MM-DD
+    :param processes: number of worker processes, all cores if None, 1 generates in the calling process
+    :param day_kwargs: image_size, image_interval_s, start_time, end_time, cloud_field, ... of create_synthetic_day
+    :return: rl_data DataFrame of all days (also written to root/rl_data_name)
+    """
+    os.makedirs(os.path.join(root, 'img_C'), exist_ok=True)
+    os.makedirs(os.path.join(root, 'data_C_int'), exist_ok=True)
+    image_size = day_kwargs.get('image_size', 256)
+    Image.fromarray(sky_mask(image_size)).save(
+        os.path.join(root, 'img_C', 'cavriglia_skymask' + str(image_size) + '.png'))
+
+    day0 = dt.datetime.strptime(first_day, '%Y-%m-%d')
+    # every day gets its own cloud field
+    jobs = [(root, day0 + dt.timedelta(days=i), dict(day_kwargs, seed=seed + i)) for i in range(nr_days)]
+    if processes == 1:
+        day_list = [_create_synthetic_day(job) for job in jobs]
+    else:
+        with Pool(processes) as pool:
+            day_list = pool.map(_create_synthetic_day, jobs)
+
+    rl_pd = pd.concat(day_list, axis=0).sort_index()
+    if rl_data_name is not None:
+        rl_pd.to_csv(os.path.join(root, rl_data_name))
+    return rl_pd
@@ -9,17 +9,18 @@ from .abb_clouddrl_constants import ABB_Solarstation as abb_st
 from .abb_clouddrl_constants import abb_filepattern
 from . import abb_clouddrl_constants as ac
 from . import abb_clouddrl_read_pipeline as abb_rp
+from . import abb_clouddrl_data_store as abb_ds
+from . import abb_clouddrl_energy_evaluation as abb_ee
+from . import abb_clouddrl_image_transformation as abb_it
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import datetime as dt
 import math
-import skimage.io as skio
-import scipy.misc as misc
-import skimage.transform as skt
 import pathlib
 import warnings
 from collections import Counter
+from multiprocessing import Pool
 
 
 def abb_linear_interpolate_illuminance(path, output_path=None, filename_pattern=abb_filepattern, abb_solarstation=None,
@@ -428,48 +429,34 @@ def create_scaled_classification_data(solar_station=ac.ABB_Solarstation.C, img_d
         # TODO finish
 
 
-def energy_throughput_per_day_optimal(solar_station=abb_st.C,
-                                      file_filter={"Debevec", ".jpeg"}, print_to_csv=False, path=None, visualize=False):
+def energy_throughput_per_day_optimal(solar_station=abb_st.C, print_to_csv=False, path=None, visualize=False,
+                                      store=None, controller='mpc@100_old'):
     """
     Creates per day data of aggregated energy throughput (difference irradiance and  given optimal MPC
     Calculated between automatically inferred time in abb constants
+    :param store: StationDataStore with the irradiance and the controller column, default: store of the station
+    :param controller: store column of the optimal MPC (default: the old -mpc.csv files)
     :return: timeseries day data -> value function (energy throughput)
     """
-    date_list = list()
-    value_list = list()
-
-    for data_tuple in abb_rp.read_cld_img_time_range_paths(solar_station=solar_station, img_d_tup_l=None,
-                                                           img_t_tup_l=None, automatic_daytime=True,
-                                                           file_filter=file_filter, get_mpc_data=True,
-                                                           randomize_days=False):
-
-        irr_data = pd.Series.from_csv(data_tuple[1])
-        mpc_data = pd.Series.from_csv(data_tuple[2])
-        diff = pd.Series.abs(irr_data - mpc_data)
-        diff = diff.dropna()
-
-        # print(irr_data.index)
-        day_string = "%02d" % (int(irr_data.index[0].to_pydatetime().day))
-        month_string = "%02d" % (int(irr_data.index[0].to_pydatetime().month))  # extract month with leading zero
-        year_string = (str(irr_data.index[0].to_pydatetime().year))
-
-        date = dt.datetime.strptime(year_string + "-" + month_string + "-" + day_string, '%Y-%m-%d')
+    if solar_station is abb_st.C:
+        path = os.path.join(ac.c_int_data_path, 'C-optimal-mpc-energy-tp.csv')
+    elif solar_station is abb_st.MS:
+        path = os.path.join(ac.ms_int_data_path, 'MS-optimal-mpc-energy-tp.csv')
+        raise ValueError('Automatic daytime not implemented vor MS yet')
+    else:
+        raise ValueError('Wrong solar power plant input')
 
-        if solar_station is abb_st.C:
-            t_from, t_to = ac.c_sunrise_sunset[month_string]
-            path = os.path.join(ac.c_int_data_path, 'C-optimal-mpc-energy-tp.csv')
-        elif solar_station is abb_st.MS:
-            path = os.path.join(ac.ms_int_data_path, 'MS-optimal-mpc-energy-tp.csv')
-            raise ValueError('Automatic daytime not implemented vor MS yet')
-        else:
-            raise ValueError('Wrong solar power plant input')
+    store = abb_ds.StationDataStore(solar_station=solar_station) if store is None else store
+    evaluator = abb_ee.EnergyThroughputEvaluator([controller], quantiles=[])
 
-        integral = pd.Series.sum(diff.between_time(t_from.time(), t_to.time()))
-        print(date, integral)
-        value_list.append(integral)
-        date_list.append(date)
+    for day, data in store.iter_days([abb_ds.IRR, controller]):
+        t_from, t_to = ac.c_sunrise_sunset["%02d" % day.month]
+        data = data.between_time(t_from.time(), t_to.time())
+        evaluator.add_day(day, data[abb_ds.IRR].values, data[controller].values)
 
-    ts = pd.Series(value_list, index=date_list)
+    ts = evaluator.throughput(thresholded=False)[controller]
+    ts.name = None
+    print(ts)
 
     if print_to_csv is True:
         print("Write to: ", path)
@@ -482,126 +469,56 @@ def energy_throughput_per_day_optimal(solar_station=abb_st.C,
     return ts
 
 
+def _image_date_ranges(abb_solarstation, img_d_tup_l):
+    if img_d_tup_l is not None:
+        return img_d_tup_l
+    if abb_solarstation is abb_st.C:
+        return [(ac.c_min_date, ac.c_max_date)]
+    elif abb_solarstation is abb_st.MS:
+        return [(ac.ms_min_date, ac.ms_max_date)]
+    raise ValueError('ABB Solarstation not found (C or MS?)')
+
+
 def images_resize(scale=None, abb_solarstation=ac.ABB_Solarstation.C, img_d_tup_l=None, img_t_tup_l=None,
-                  automatic_daytime=False, file_filter={"Debevec", ".jpeg"}):
+                  automatic_daytime=False, file_filter={"Debevec", ".jpeg"}, processes=None, draft=False):
+    """
+    Writes <image>_Resize<scale>.jpeg for all images, see abb_clouddrl_image_transformation
+    :param scale: size in pixels or list of sizes (all sizes are produced from one decode)
+    :param processes: worker processes (one day per task), default: number of cpus
+    """
     if scale is None:
         raise ValueError('Input new scale in Pixels')
 
     if img_t_tup_l is None:
         automatic_daytime = True
 
-    if img_d_tup_l is None:
-        if abb_solarstation is abb_st.C:
-            img_d_tup_l = [(ac.c_min_date, ac.c_max_date)]
-        elif abb_solarstation is abb_st.MS:
-            img_d_tup_l = [(ac.ms_min_date, ac.ms_max_date)]
-        else:
-            raise ValueError('ABB Solarstation not found (C or MS?)')
-
+    img_d_tup_l = _image_date_ranges(abb_solarstation, img_d_tup_l)
     print("Creating list from " + str(img_d_tup_l[0][0]) + ' until ' + str(img_d_tup_l[0][1]))
-    """
-    image_path_list = [list(data_tuple[0].values()) for data_tuple in abb_rp.read_cld_img_time_range_paths(
-        solar_station=abb_solarstation, img_d_tup_l=img_d_tup_l, img_t_tup_l=img_t_tup_l,
-        automatic_daytime=automatic_daytime, file_filter=file_filter, randomize_days=False)][0]
-    print(len(image_path_list))
-    print("Done")
-    """
-    for day in abb_rp.read_cld_img_time_range_paths(solar_station=abb_solarstation, img_d_tup_l=img_d_tup_l,
-                                                    img_t_tup_l=img_t_tup_l, automatic_daytime=automatic_daytime,
-                                                    file_filter=file_filter, randomize_days=False):
-        image_path_list = list(day[0].values())
-
-        for image_path in image_path_list:
-            print(image_path)
-            new_path = image_path.rsplit('_', 1)
-            output_path = new_path[0] + '_Resize' + str(scale) + '.jpeg'
-            print(output_path)
-
-            o_path = pathlib.Path(output_path)
-
-            if not o_path.is_file():
 
-                image = skio.imread(image_path)
-
-                image = skt.resize(image, (scale, scale))
-
-                skio.imsave(output_path, image)
-
-            else:
-                print(output_path, "already exists")
+    return abb_it.transform_images(scale, sunspots=False, solar_station=abb_solarstation, img_d_tup_l=img_d_tup_l,
+                                   img_t_tup_l=img_t_tup_l, automatic_daytime=automatic_daytime,
+                                   file_filter=file_filter, processes=processes, draft=draft)
 
 
 def images_draw_sunspots(scale=None, abb_solarstation=ac.ABB_Solarstation.C, img_d_tup_l=None, img_t_tup_l=None,
-                  automatic_daytime=False, file_filter={"Debevec", ".jpeg"}):
+                  automatic_daytime=False, file_filter={"Debevec", ".jpeg"}, processes=None):
+    """
+    Writes <image>_Resize_sp_<scale>.jpeg (41x41 green square on the sunspot of the -sp.csv) for all images
+    :param scale: size in pixels or list of sizes (all sizes are produced from one decode)
+    :param processes: worker processes (one day per task), default: number of cpus
+    """
     if scale is None:
         raise ValueError('Input new scale in Pixels')
 
     if img_t_tup_l is None:
         automatic_daytime = True
 
-    if img_d_tup_l is None:
-        if abb_solarstation is abb_st.C:
-            img_d_tup_l = [(ac.c_min_date, ac.c_max_date)]
-        elif abb_solarstation is abb_st.MS:
-            img_d_tup_l = [(ac.ms_min_date, ac.ms_max_date)]
-        else:
-            raise ValueError('ABB Solarstation not found (C or MS?)')
-
+    img_d_tup_l = _image_date_ranges(abb_solarstation, img_d_tup_l)
     print("Creating list from " + str(img_d_tup_l[0][0]) + ' until ' + str(img_d_tup_l[0][1]))
 
-    for day in abb_rp.read_cld_img_time_range_paths(solar_station=abb_solarstation, img_d_tup_l=img_d_tup_l,
-                                                    img_t_tup_l=img_t_tup_l, automatic_daytime=automatic_daytime,
-                                                    file_filter=file_filter, get_sp_data=True,randomize_days=False):
-
-
-        image_keys = list(day[0].keys())
-
-
-        for key in image_keys:
-            image_path = day[0][key]
-            print(image_path)
-
-
-            sunspot_data = pd.read_csv(day[2], index_col=0,parse_dates=True,header=None) # read sp file data with sunspot coordinates
-
-            sunspot_coords = sunspot_data.loc[key].ix[:,0:2].values[0]
-
-
-
-            sunspot_x = int(sunspot_coords[0])
-            sunspot_y = int(sunspot_coords[1])
-
-
-            new_path = image_path.rsplit('_', 1)
-            output_path = new_path[0] + '_Resize_sp_' + str(scale) + '.jpeg'
-            print(output_path)
-
-            o_path = pathlib.Path(output_path)
-
-            if not o_path.is_file():
-
-                image = misc.imread(image_path)
-
-                for i in range(-20,21):
-                    for j in range(-20,21):
-                        image[sunspot_x + i, sunspot_y + j, 0] = 0.0
-                        image[sunspot_x+i,sunspot_y+j,1] = 255.0
-                        image[sunspot_x + i, sunspot_y + j, 2] = 0.0
-
-                print(image.shape)
-                image = skt.resize(image, (scale, scale))
-
-
-                #misc.imshow(image)
-
-
-
-                skio.imsave(output_path, image)
-
-            else:
-                print(output_path, "already exists")
-
-
+    return abb_it.transform_images(scale, sunspots=True, solar_station=abb_solarstation, img_d_tup_l=img_d_tup_l,
+                                   img_t_tup_l=img_t_tup_l, automatic_daytime=automatic_daytime,
+                                   file_filter=file_filter, processes=processes)
 
 
 def change_information_histogram(solar_station=ac.ABB_Solarstation.C, bins='auto',density=True):
@@ -670,88 +587,126 @@ def change_information_histogram(solar_station=ac.ABB_Solarstation.C, bins='auto
 
 
 
-def naive_battery_throughput_calculation(solar_station=ac.ABB_Solarstation.C,change_constraint_wh_min=ac.solar_irradiance / 25):
+def ramp_limited_follower(target, max_change, min_ramp=16):
+    """
+    Follows target with at most max_change per sample: y[0] = target[0], y[i] = y[i-1] + clip(target[i]-y[i-1]).
+    Stretches where y equals the target are copied as slices up to the next jump larger than max_change, ramps
+    longer than min_ramp samples are filled as straight line up to the first sample where the line gets within
+    max_change of the target (searched in growing windows). Only short ramps are stepped sample by sample.
+    :param target: 1d array
+    :param max_change: maximum absolute change per sample
+    :return: 1d array y
+    """
+    target = np.asarray(target, dtype=np.float64)
+    n = len(target)
+    y = np.empty(n)
+    if n == 0:
+        return y
+    t = target.tolist()
+    # tracking breaks at i if |target[i] - target[i-1]| > max_change
+    jumps = (np.flatnonzero(np.abs(np.diff(target)) > max_change) + 1).tolist() + [n]
+    jp = 0
+
+    y[0] = yk = t[0]
+    ramp = 0
+    i = 1
+    while i < n:
+        d = t[i] - yk
+        if -max_change <= d <= max_change:
+            # tracking from i until the next jump
+            while jumps[jp] <= i:
+                jp += 1
+            j = jumps[jp]
+            y[i:j] = target[i:j]
+            yk = t[j - 1]
+            ramp = 0
+            i = j
+            continue
+
+        s = max_change if d > 0 else -max_change
+        yk += s
+        y[i] = yk
+        ramp += 1
+        i += 1
+        if ramp < min_ramp or i == n:
+            continue
+
+        # long ramp: y[i] = yk + s*(i-k) while the target stays further than max_change ahead of y[i-1]
+        window = min_ramp
+        end = i
+        while end < n:
+            stop = min(n, end + window)
+            line_prev = yk + s * np.arange(end - i, stop - i)
+            still_ramping = (target[end:stop] - line_prev) * np.sign(s) > max_change
+            if not still_ramping.all():
+                end += int(np.argmin(still_ramping))
+                break
+            end = stop
+            window *= 2
+        y[i:end] = yk + s * np.arange(1, end - i + 1)
+        if end > i:
+            yk = yk + s * (end - i)
+        ramp = 0
+        i = end
+    return y
+
+
+def naive_battery_control(irradiance, change_constraints_wh_min=(ac.solar_irradiance / 10, ac.solar_irradiance / 25,
+                                                                  ac.solar_irradiance / 62.5)):
+    """
+    Naive, reactive control of the battery: the control input follows the irradiance of the previous second with
+    the ramp constraint. All constraints are evaluated on the same day array.
+    :param irradiance: pd.Series of one day (1s sampling)
+    :param change_constraints_wh_min: list of ramp constraints [Wh/min], default 100, 40 and the slow ramp 16
+        (40 / 2.5)
+    :return: pd.DataFrame, one column naive<constraint> per constraint
     """
-    Calculate naive, reactive control of battery
+    values = irradiance.values.astype(np.float64)
+    # lagged target: y[1] follows x[0], y[2] follows x[1], ...
+    lagged = np.concatenate([values[:1], values[:-1]])
+    columns = dict()
+    for change_constraint_wh_min in change_constraints_wh_min:
+        columns['naive' + str(int(change_constraint_wh_min))] = ramp_limited_follower(lagged,
+                                                                                      change_constraint_wh_min / 60)
+    return pd.DataFrame(columns, index=irradiance.index, columns=list(columns))
+
+
+def _naive_battery_day(args):
+    int_data_path, change_constraints_wh_min, store_root = args
+    store = abb_ds.StationDataStore(store_root)
+    int_data_pd = pd.Series.from_csv(int_data_path)
+    naive_pd = naive_battery_control(int_data_pd, change_constraints_wh_min)
+    for change_constraint_wh_min, column in zip(change_constraints_wh_min, naive_pd.columns):
+        store.write_day(abb_ds.column_name(abb_ds.NAIVE, change_constraint_wh_min), naive_pd[column], overwrite=True)
+    return int_data_path
+
+
+def naive_battery_throughput_calculation(solar_station=ac.ABB_Solarstation.C,
+                                         change_constraints_wh_min=(ac.solar_irradiance / 10,
+                                                                    ac.solar_irradiance / 25,
+                                                                    ac.solar_irradiance / 62.5),
+                                         processes=None, store=None):
+    """
+    Calculate naive, reactive control of battery for all days, days are processed in parallel
     :param solar_station: 
-    :param change_constraint_wh_min: 
-    :return: 
+    :param change_constraints_wh_min: list of ramp constraints [Wh/min], a single value is accepted as well
+    :param processes: number of worker processes, all cores if None, 1 runs in the calling process
+    :param store: abb_clouddrl_data_store.StationDataStore (default store of the station), every constraint is
+        written as column naive@<constraint>
+    :return: list of processed days (paths of the -int.csv files)
     """
+    if np.isscalar(change_constraints_wh_min):
+        change_constraints_wh_min = [change_constraints_wh_min]
+    if store is None:
+        store = abb_ds.StationDataStore(solar_station=solar_station)
     day_list = abb_rp.read_cld_img_day_range_paths(solar_station=solar_station,suffix='int')
+    jobs = [(day[1], list(change_constraints_wh_min), store.root) for day in day_list]
 
+    if processes == 1:
+        return [_naive_battery_day(job) for job in jobs]
+    with Pool(processes) as pool:
+        return pool.map(_naive_battery_day, jobs)
 
-    for day in day_list:
-
-        naive_control_values=list()
-        naive_control_values2=list()
-
-        index_list = list()
-
-        int_data_path = day[1]
-        int_data_pd = pd.Series.from_csv(int_data_path)
-
-        #print(int_data_pd.iloc[::4])
-
-        it1 = int_data_pd.iteritems()
-        it2 = int_data_pd.iteritems()
-        next(it2)
-
-        max_abs_change = change_constraint_wh_min/60
-
-        max_abs_change2 = max_abs_change/2.5
-
-        print(max_abs_change)
-
-        naive_control_values.append(int_data_pd.iloc[0])
-        naive_control_values2.append(int_data_pd.iloc[0])
-
-
-        index_list.append(int_data_pd.index[0])
-
-        for row1,row2 in zip(it1,it2):
-
-
-
-            diff = row1[1]-naive_control_values[-1]
-            diff2 = row2[1]-naive_control_values2[-1]
-
-            if abs(diff) > max_abs_change:
-
-                next_control = naive_control_values[-1]+ np.sign(diff)*max_abs_change
-                naive_control_values.append(next_control)
-            else:
-                naive_control_values.append(row1[1])
-
-            """
-            if abs(diff2) > max_abs_change2:
-
-                next_control = naive_control_values2[-1]+ np.sign(diff2)*max_abs_change2
-                naive_control_values2.append(next_control)
-            else:
-                naive_control_values2.append(row2[1])
-            """
-
-            index_list.append(row2[0])
-
-
-
-
-        naive_pd = pd.Series(data=naive_control_values,index=index_list)
-        #naive_pd2 = pd.DataFrame(data=naive_control_values2, index=index_list)
-
-        output_path = int_data_path.rsplit('-',1)[0]+'-naive'+str(int(change_constraint_wh_min))+'_new.csv'
-
-
-        pd.Series.to_csv(naive_pd,path=output_path)
-        #output_path=
-        """
-        plot_pd = pd.concat([pd.Series.to_frame(naive_pd),pd.Series.to_frame(int_data_pd)],axis=1)
-
-        print(naive_pd,int_data_pd)
-
-        plot_pd.plot()
-        plt.show()
-        """
 
 def create_rl_environment_input_files(solar_sation = ac.ABB_Solarstation.C, automatic_daytime=True,file_filter={"Debevec", ".jpeg"},output_path=None,output_name="rl_data.csv"):
     """
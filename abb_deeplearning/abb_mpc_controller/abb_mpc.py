@@ -1,5 +1,6 @@
 from ..abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
 from ..abb_data_pipeline import abb_clouddrl_constants as abb_c
+from ..abb_data_pipeline import abb_clouddrl_data_store as abb_ds
 
 import cvxpy as cvx
 import numpy as np
@@ -14,7 +15,7 @@ import os
 import datetime as dt
 
 
-def perform_default_mpc(day_path_list, time_range=None, resolution_s=1, change_constraint_wh_min=abb_c.solar_irradiance / 10, output_path=None, interpolate_to_s=False, plot=False, write_file=False):
+def perform_default_mpc(day_path_list, time_range=None, resolution_s=1, change_constraint_wh_min=abb_c.solar_irradiance / 10, output_path=None, interpolate_to_s=False, plot=False, write_file=False, store=None):
     """
     Multithreaded calculation of Model Predictive control (calls__default_mpc__ function) with default parameters. Order of day_path_list (containing paths to files that are fromatted like this: (datetime,irradiance data))
     may be lost, depending on thread scheduling. Set output path. If None, same output path as path to the input files
@@ -24,6 +25,7 @@ def perform_default_mpc(day_path_list, time_range=None, resolution_s=1, change_c
     output_path: Where data is printed
     interpolate_to_s: Interpolate the data to second frequency (linear interpolation)
     plot: Create plot of LP data. Only works when  __default_mpc__ is called directly
+    store: abb_clouddrl_data_store.StationDataStore, if set the solution is written as column mpc@<constraint>
 
     writes file with Pandas TimeSeries data
 
@@ -31,14 +33,14 @@ def perform_default_mpc(day_path_list, time_range=None, resolution_s=1, change_c
     """
 
     with ThreadPoolExecutor(max_workers=1) as thread_executor:
-        [thread_executor.submit(__default_mpc__, day_path, time_range, resolution_s, change_constraint_wh_min, output_path, interpolate_to_s, plot, write_file)
+        [thread_executor.submit(__default_mpc__, day_path, time_range, resolution_s, change_constraint_wh_min, output_path, interpolate_to_s, plot, write_file, store)
          for day_path in day_path_list]
 
 
 
 
 def __default_mpc__(day_path, time_range=None, resolution_s=1, change_constraint_wh_min=abb_c.solar_irradiance / 10,
-                    output_path=None, interpolate_to_s=False, plot=False, write_file=False):
+                    output_path=None, interpolate_to_s=False, plot=False, write_file=False, store=None):
     # Load data into pandas Series
     print("solving:",day_path)
     if time_range is None:
@@ -113,6 +115,9 @@ def __default_mpc__(day_path, time_range=None, resolution_s=1, change_constraint
 
         __mpc_file_printer__(sol_pd, output_path_t)
 
+    if store is not None:
+        store.write_day(abb_ds.column_name(abb_ds.MPC, change_constraint_wh_min), sol_pd, overwrite=True)
+
 
 def __prediction_mpc__(prediction_path,day_list,solar_station=abb_c.ABB_Solarstation.C,nr_predictions = 11,pred_interval_s=60, change_constraint_wh_min=abb_c.solar_irradiance / 10,full_int_irr_pd=None,skip_preds=1,
                     output_path=None, plot=False, write_file=False):
@@ -0,0 +1,33 @@
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_data_store as abb_ds
+
+
+def _store(root):
+    store = abb_ds.StationDataStore(root=root)
+    for day in ['2015-09-01', '2015-09-02']:
+        index = pd.date_range(day + ' 10:00:00', periods=5, freq='s')
+        store.write_day(abb_ds.IRR, pd.Series(np.arange(5.0), index=index))
+        store.write_day('mpc@100_old', pd.Series(np.arange(5.0) + 1, index=index))
+    return store
+
+
+def test_iter_days_list():
+    with tempfile.TemporaryDirectory() as td:
+        days = list(_store(td).iter_days([abb_ds.IRR, 'mpc@100_old']))
+        assert [day for day, _ in days] == [pd.Timestamp('2015-09-01'), pd.Timestamp('2015-09-02')]
+        assert list(days[0][1].columns) == [abb_ds.IRR, 'mpc@100_old']
+
+
+def test_iter_days_renames_dict_columns():
+    with tempfile.TemporaryDirectory() as td:
+        columns = OrderedDict([('int', abb_ds.IRR), ('mpc100', 'mpc@100_old')])
+        days = list(_store(td).iter_days(columns, start='2015-09-02'))
+        assert len(days) == 1
+        df = days[0][1]
+        assert list(df.columns) == ['int', 'mpc100']
+        assert df['mpc100'].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
@@ -0,0 +1,101 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# the data pipeline needs the plotting and image dependencies of the full environment
+abb_tp = pytest.importorskip('abb_deeplearning.abb_data_pipeline.abb_clouddrl_transformation_pipeline')
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_data_store as abb_ds
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_energy_evaluation as abb_ee
+
+
+def test_add_day():
+    evaluator = abb_ee.EnergyThroughputEvaluator(['a', 'b'], loss_threshold=1.5, quantiles=[50])
+    irradiance = np.array([10.0, 20.0, 30.0])
+    controls = np.array([[9.0, 10.0], [22.0, np.nan], [30.0, 27.0]])
+    evaluator.add_day('2015-09-01', irradiance, controls)
+
+    per_day = evaluator.per_day()
+    assert per_day[('throughput', 'a')].iloc[0] == 3.0
+    assert per_day[('throughput_t', 'a')].iloc[0] == 2.0
+    assert per_day[('throughput', 'b')].iloc[0] == 3.0
+    assert per_day[('steps', 'b')].iloc[0] == 2
+
+    with pytest.raises(ValueError):
+        evaluator.add_day('2015-09-02', irradiance, controls[:, :1])
+
+
+def test_empty_day_is_skipped():
+    evaluator = abb_ee.EnergyThroughputEvaluator(['a', 'b'])
+    assert evaluator.add_day('2015-09-01', np.zeros(0), np.zeros((0, 2))) is None
+    evaluator.add_day('2015-09-02', np.array([1.0]), np.array([[2.0, 4.0]]))
+    assert evaluator.add_day('2015-09-03', np.zeros(0), np.zeros(0)) is None
+
+    per_day = evaluator.per_day()
+    assert list(per_day.index) == [pd.Timestamp('2015-09-02')]
+    assert evaluator.throughput(thresholded=False).loc['2015-09-02'].tolist() == [1.0, 3.0]
+
+
+def test_optimal_throughput_day_without_controller():
+    with tempfile.TemporaryDirectory() as td:
+        store = abb_ds.StationDataStore(root=td)
+        for day in ['2015-09-01', '2015-09-02']:
+            index = pd.date_range(day + ' 10:00:00', periods=60, freq='s')
+            store.write_day(abb_ds.IRR, pd.Series(np.full(60, 500.0), index=index))
+        index = pd.date_range('2015-09-01 10:00:00', periods=60, freq='s')
+        store.write_day('mpc@100_old', pd.Series(np.full(60, 498.0), index=index))
+
+        ts = abb_tp.energy_throughput_per_day_optimal(store=store)
+        assert list(ts.index) == [pd.Timestamp('2015-09-01')]
+        assert ts.iloc[0] == 120.0
+
+
+def test_evaluate_model_paths_without_write():
+    with tempfile.TemporaryDirectory() as td:
+        store_root = os.path.join(td, 'store')
+        store = abb_ds.StationDataStore(root=store_root)
+        index = pd.date_range('2015-09-01 10:00:00', periods=3, freq='s')
+        store.write_day(abb_ds.IRR, pd.Series([10.0, 20.0, 30.0], index=index))
+        for column in abb_ee.REFERENCE_CONTROLLERS.values():
+            store.write_day(column, pd.Series([10.0, 20.0, 30.0], index=index))
+
+        model_path = os.path.join(td, 'model')
+        pred_path = abb_ee.mpc_prediction_path(model_path, 100, 1)
+        os.makedirs(pred_path)
+        pd.DataFrame({'mpc_pred': [9.0, 22.0, 30.0]}, index=index).to_csv(
+            os.path.join(pred_path, '2015-09-01-pred_mpc100.csv'))
+
+        comparison, overall = abb_ee.evaluate_model_paths([model_path], store_root=store_root, change_constraint=100,
+                                                          skip_preds=1, loss_threshold=1.5, write=False)
+        assert comparison['model'].tolist() == [2.0]
+        assert list(overall.index) == ['model']
+        assert os.listdir(pred_path) == ['2015-09-01-pred_mpc100.csv']
+
+
+def test_mpc_prediction_uses_actual_irr():
+    with tempfile.TemporaryDirectory() as td:
+        store_root = os.path.join(td, 'store')
+        store = abb_ds.StationDataStore(root=store_root)
+        index = pd.date_range('2015-09-01 10:00:00', periods=3, freq='s')
+        store.write_day(abb_ds.IRR, pd.Series([10.0, 20.0, 30.0], index=index))
+        for column in abb_ee.REFERENCE_CONTROLLERS.values():
+            store.write_day(column, pd.Series([10.0, 20.0, 30.0], index=index))
+
+        # the irradiance of the prediction file is shifted against the store
+        model_path = os.path.join(td, 'model')
+        pred_path = abb_ee.mpc_prediction_path(model_path, 100, 1)
+        os.makedirs(pred_path)
+        pd.DataFrame({'mpc_pred': [10.0, 20.0, 30.0], 'actual_irr': [12.0, 22.0, 32.0]}, index=index).to_csv(
+            os.path.join(pred_path, '2015-09-01-pred_mpc100.csv'))
+
+        evaluator = abb_ee.evaluate(abb_ee.mpc_prediction_days(model_path, 100, 1), 'mpc_pred100',
+                                    store=abb_ds.StationDataStore(root=store_root))
+        throughput = evaluator.throughput(thresholded=False).iloc[0]
+        assert throughput['mpc_pred100'] == 6.0
+        assert (throughput[list(abb_ee.REFERENCE_CONTROLLERS)] == 0.0).all()
+
+    evaluator = abb_ee.EnergyThroughputEvaluator(['a', 'b'])
+    with pytest.raises(ValueError):
+        evaluator.add_day('2015-09-01', np.zeros((3, 3)), np.zeros((3, 2)))
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+# the data pipeline needs the plotting and image dependencies of the full environment
+abb_tp = pytest.importorskip('abb_deeplearning.abb_data_pipeline.abb_clouddrl_transformation_pipeline')
+
+
+def _reference_follower(target, max_change):
+    # clamped recurrence of the former per-sample loop
+    y = np.empty(len(target))
+    y[0] = target[0]
+    for i in range(1, len(target)):
+        y[i] = y[i - 1] + np.clip(target[i] - y[i - 1], -max_change, max_change)
+    return y
+
+
+def _step(n=400, low=0.0, high=800.0, at=100, back=300):
+    x = np.full(n, low)
+    x[at:back] = high
+    return x
+
+
+def _ramp(n, length, slope, start=100.0):
+    x = np.full(n, start)
+    x[10:10 + length] = start + slope * np.arange(1, length + 1)
+    x[10 + length:] = x[9 + length]
+    return x
+
+
+TARGETS = [
+    ('random walk', np.cumsum(np.random.RandomState(0).normal(0, 2, 5000)) + 500),
+    ('random walk with jumps', np.cumsum(np.random.RandomState(1).standard_cauchy(5000)) + 500),
+    ('noisy day', np.clip(np.random.RandomState(2).normal(600, 150, 3000), 0, None)),
+    ('step', _step()),
+    ('step down', 800 - _step()),
+    ('constant', np.full(500, 321.0)),
+    ('long ramp', _ramp(300, 200, 5.0)),
+    ('short ramp', _ramp(300, 5, 5.0)),
+    ('ramp of min_ramp samples', _ramp(300, 16, -5.0)),
+    ('jump at the end', np.r_[np.zeros(50), 1000.0]),
+    ('length 1', np.array([42.0])),
+]
+
+
+@pytest.mark.parametrize('max_change', [1000 / 10 / 60., 1000 / 25 / 60., 1000 / 62.5 / 60.])
+@pytest.mark.parametrize('name, target', TARGETS, ids=[name for name, _ in TARGETS])
+def test_ramp_limited_follower_matches_loop(name, target, max_change):
+    y = abb_tp.ramp_limited_follower(target, max_change)
+    reference = _reference_follower(target, max_change)
+    assert y.shape == target.shape
+    assert np.allclose(y, reference, rtol=0, atol=1e-9)
+    assert np.all(np.abs(np.diff(y)) <= max_change + 1e-9)
+
+
+@pytest.mark.parametrize('min_ramp', [1, 2, 16, 1000])
+def test_ramp_limited_follower_min_ramp(min_ramp):
+    target = np.cumsum(np.random.RandomState(3).standard_cauchy(2000))
+    assert np.allclose(abb_tp.ramp_limited_follower(target, 0.7, min_ramp=min_ramp),
+                       _reference_follower(target, 0.7), rtol=0, atol=1e-9)
+
+
+def test_ramp_limited_follower_empty():
+    assert len(abb_tp.ramp_limited_follower(np.zeros(0), 1.0)) == 0
+
+
+def test_naive_battery_control():
+    index = pd.date_range('2015-09-01 10:00:00', periods=600, freq='s')
+    irradiance = pd.Series(_step(600, 100.0, 900.0, 50, 400), index=index)
+    naive = abb_tp.naive_battery_control(irradiance, [100, 40])
+
+    assert list(naive.columns) == ['naive100', 'naive40']
+    lagged = np.r_[irradiance.values[:1], irradiance.values[:-1]]
+    assert np.allclose(naive['naive40'].values, _reference_follower(lagged, 40 / 60.))
+    assert naive['naive100'].iloc[50] == 100.0 and naive['naive100'].iloc[51] == 100.0 + 100 / 60.
+
+
+def test_naive_battery_control_default_constraints():
+    index = pd.date_range('2015-09-01 10:00:00', periods=100, freq='s')
+    naive = abb_tp.naive_battery_control(pd.Series(np.linspace(0, 500, 100), index=index))
+    assert list(naive.columns) == ['naive100', 'naive40', 'naive16']
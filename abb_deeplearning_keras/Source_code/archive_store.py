@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Random access to the images inside the tar archives without extracting them (replaces extracted image folders and
+the pickled StringIO dictionaries of convert_jpg_pickles.py)
+
+- a member offset index is built once per archive and kept next to it (<archive>.index.npz: member names, data
+  offsets and sizes, size and mtime of the archive), it is rebuilt when the archive changed. tar_downsampler.py
+  writes the index together with its output archives
+- a read is a single os.pread at the recorded offset on a file descriptor kept open per archive (no shared file
+  position, so a store can be used by several threads and forked worker processes)
+- paths are the paths of the extracted files: <root>/<folder>/<name> is read from the archive <root>/<folder>.tar
+  (member <folder>/<name> or <name>), files which exist on disk are read from the filesystem
+- compressed archives (.tar.gz) have no usable offsets, open_reader() streams them instead (sequential reads in
+  member order are fast, random access decompresses from the start), recompress them to .tar (tar_downsampler.py)
+
+Usage:
+command line arguments - {archive folder} : builds the missing indexes of all archives
+
+@author: Arthur Habicht
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import tarfile
+
+import numpy as np
+
+ARCHIVE_EXTENSION = '.tar'
+COMPRESSED_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+INDEX_SUFFIX = '.index.npz'
+
+
+def member_key(name):
+    # ./2015_07_16/x.jpeg -> 2015_07_16/x.jpeg
+    while name.startswith('./'):
+        name = name[2:]
+    return name
+
+
+def index_path(archive_path, index_dir=None):
+    if index_dir is None:
+        return archive_path + INDEX_SUFFIX
+    return os.path.join(index_dir, os.path.basename(archive_path) + INDEX_SUFFIX)
+
+
+def _archive_stat(archive_path):
+    stat = os.stat(archive_path)
+    return stat.st_size, stat.st_mtime
+
+
+def write_index(archive_path, names, offsets, sizes, index_dir=None):
+    """Writes the member offset index of a complete (closed) archive"""
+    path = index_path(archive_path, index_dir)
+    archive_size, archive_mtime = _archive_stat(archive_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, names=np.array([member_key(n) for n in names], dtype='U'),
+                 offsets=np.asarray(offsets, dtype=np.int64), sizes=np.asarray(sizes, dtype=np.int64),
+                 archive_size=np.int64(archive_size), archive_mtime=np.float64(archive_mtime))
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+def build_index(archive_path, index_dir=None):
+    """
+    Scans the headers of an uncompressed archive (data blocks are skipped) and writes its index
+    :return: dict member name -> (offset, size)
+    """
+    if archive_path.lower().endswith(COMPRESSED_EXTENSIONS):
+        raise ValueError("No random access into compressed archive " + archive_path)
+    names, offsets, sizes = [], [], []
+    with tarfile.open(archive_path, 'r:') as archive:
+        for member in archive:
+            if member.isreg() and not member.issparse():
+                names.append(member.name)
+                offsets.append(member.offset_data)
+                sizes.append(member.size)
+    write_index(archive_path, names, offsets, sizes, index_dir)
+    return dict(zip([member_key(n) for n in names], zip(offsets, sizes)))
+
+
+def load_index(archive_path, index_dir=None):
+    """
+    Member index of an archive, built if it is missing or older than the archive
+    :return: dict member name -> (offset, size)
+    """
+    path = index_path(archive_path, index_dir)
+    if os.path.isfile(path):
+        with np.load(path) as data:
+            if (int(data['archive_size']), float(data['archive_mtime'])) == _archive_stat(archive_path):
+                return dict(zip(data['names'].tolist(), zip(data['offsets'].tolist(), data['sizes'].tolist())))
+    return build_index(archive_path, index_dir)
+
+
+def member_names(archive_path, index_dir=None):
+    """Names of the files in an archive, from the index (compressed archives are listed without an index)"""
+    if archive_path.lower().endswith(COMPRESSED_EXTENSIONS):
+        with tarfile.open(archive_path) as archive:
+            return [member_key(m.name) for m in archive if m.isfile()]
+    index = load_index(archive_path, index_dir)
+    return sorted(index, key=lambda name: index[name][0])
+
+
+def _pread(fd, size, offset):
+    if not hasattr(os, 'pread'):
+        # python 2 / windows: seek and read, a store must then not be shared by threads
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+    chunks = []
+    while size > 0:
+        chunk = os.pread(fd, size, offset)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+        offset += len(chunk)
+    return b''.join(chunks)
+
+
+class ArchiveReader(object):
+    def __init__(self, archive_path, index_dir=None):
+        """Reads members of one uncompressed archive at their indexed offsets"""
+        self.archive_path = archive_path
+        self.index = load_index(archive_path, index_dir)
+        self._fd = None
+
+    def names(self):
+        return sorted(self.index, key=lambda name: self.index[name][0])
+
+    def __contains__(self, name):
+        return member_key(name) in self.index
+
+    def read(self, name):
+        """:return: bytes of the member"""
+        offset, size = self.index[member_key(name)]
+        if self._fd is None:
+            self._fd = os.open(self.archive_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        data = _pread(self._fd, size, offset)
+        if len(data) != size:
+            raise IOError("Truncated member {} of {}".format(name, self.archive_path))
+        return data
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __getstate__(self):
+        # file descriptors are opened again after unpickling (worker processes)
+        state = self.__dict__.copy()
+        state['_fd'] = None
+        return state
+
+
+class CompressedArchiveReader(object):
+    def __init__(self, archive_path):
+        """Reads members of a compressed archive by streaming through it (same interface as ArchiveReader)"""
+        self.archive_path = archive_path
+        self._archive = tarfile.open(archive_path)
+        self._members = dict((member_key(m.name), m) for m in self._archive.getmembers() if m.isfile())
+
+    def names(self):
+        return sorted(self._members, key=lambda name: self._members[name].offset_data)
+
+    def __contains__(self, name):
+        return member_key(name) in self._members
+
+    def read(self, name):
+        """:return: bytes of the member"""
+        return self._archive.extractfile(self._members[member_key(name)]).read()
+
+    def close(self):
+        self._archive.close()
+
+
+def open_reader(archive_path, index_dir=None):
+    """ArchiveReader of an uncompressed archive, CompressedArchiveReader of a compressed one"""
+    if archive_path.lower().endswith(COMPRESSED_EXTENSIONS):
+        return CompressedArchiveReader(archive_path)
+    return ArchiveReader(archive_path, index_dir)
+
+
+class ArchiveImageStore(object):
+    def __init__(self, root, index_dir=None):
+        """
+        Path based access to the images of all archives in root
+        :param index_dir: folder of the member indexes, default: next to the archives
+        """
+        self.root = root
+        self.index_dir = index_dir
+        self._readers = {}
+
+    def _reader(self, folder):
+        if folder not in self._readers:
+            archive_path = os.path.join(self.root, folder + ARCHIVE_EXTENSION)
+            self._readers[folder] = ArchiveReader(archive_path, self.index_dir) if os.path.isfile(archive_path) \
+                else None
+        return self._readers[folder]
+
+    def _locate(self, path):
+        parts = os.path.relpath(path, self.root).split(os.sep)
+        reader = self._reader(parts[0]) if len(parts) >= 2 and parts[0] != os.pardir else None
+        if reader is None:
+            return None, None
+        for name in ('/'.join(parts), '/'.join(parts[1:])):
+            if name in reader:
+                return reader, name
+        return None, None
+
+    def exists(self, path):
+        return os.path.isfile(path) or self._locate(path)[0] is not None
+
+    def read(self, path):
+        """:return: bytes of the file (raw JPEG data)"""
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        reader, name = self._locate(path)
+        if reader is None:
+            raise IOError("No such file or archive member: " + path)
+        return reader.read(name)
+
+    def open(self, path):
+        """File object of the file, f.e. for PIL.Image.open"""
+        return io.BytesIO(self.read(path))
+
+    def listdir(self, folder):
+        """Names of the files of an archive folder, like os.listdir of the extracted folder"""
+        reader = self._reader(folder)
+        if reader is None:
+            return os.listdir(os.path.join(self.root, folder))
+        return [name.split('/')[-1] for name in reader.names()]
+
+    def build_indexes(self):
+        """Builds the missing indexes of all archives in root, returns the archive folders"""
+        folders = [f[:-len(ARCHIVE_EXTENSION)] for f in sorted(os.listdir(self.root)) if f.endswith(ARCHIVE_EXTENSION)]
+        for folder in folders:
+            self._reader(folder)
+        return folders
+
+    def close(self):
+        for reader in self._readers.values():
+            if reader is not None:
+                reader.close()
+
+
+if __name__ == "__main__":
+    store = ArchiveImageStore(sys.argv[1].rstrip('/'))
+    print("Indexed", len(store.build_indexes()), "archives")
@@ -4,19 +4,20 @@
 Created on Tue Jan 24 16:14:53 2017
 
 Loading compressed JPEG images in to memory, prior to feeding to the array generator
+- the JPEG bytes are read from the tar archives at their indexed offsets (archive_store.py), nothing is extracted
+  or pickled: the output is the list of image paths of the range, readable with archive_store.ArchiveImageStore
 
 @author: maverick
 """
 
 from PIL import Image
-from cStringIO import StringIO
 #import glob, os
 import sys, time
 import pandas
-#import pickle
-import dill as pickle
 import numpy as np
 
+import archive_store
+
 
 
 def build_file_list(df, root_dir):
@@ -41,8 +42,8 @@ def slice_subset(df, start_date, end_date, slice_by_hour=False, start_hour=5, en
     return subset    
     
 
-# Method builds a dictionary with {key,value} = file_name_with_path, jpg object stored in StringIO
-def build_file_object_dictionary(file_list):
+# Method builds a dictionary with {key,value} = file_name_with_path, jpg file object (read from the archives)
+def build_file_object_dictionary(file_list, store):
     
     length = float(len(file_list))
     print (str(length)+" files")
@@ -55,22 +56,20 @@ def build_file_object_dictionary(file_list):
             print (str((i/length)*100)[:4]+" %")
                 
         if img_file. endswith(".jpeg"):
-            jpgdata = StringIO(open(img_file).read())
-            img_dict[img_file] = jpgdata
+            img_dict[img_file] = store.open(img_file)
     
     return img_dict
     
 
     
-def save_pickle(content, file_name):
-    with open(file_name, 'wb') as handle:
-        pickle.dump(content, handle, protocol=pickle.HIGHEST_PROTOCOL)
+def save_file_list(file_list, file_name):
+    with open(file_name, 'w') as handle:
+        handle.write('\n'.join(file_list) + '\n')
 
         
-def read_pickle(file_name):
-    with open(file_name, 'rb') as handle:
-        data = pickle.load(handle)
-    return data
+def read_file_list(file_name):
+    with open(file_name) as handle:
+        return [line.strip() for line in handle if line.strip()]
     
     
 if __name__ == "__main__":
@@ -93,30 +92,21 @@ if __name__ == "__main__":
     print ("building list of files...")
     file_list = build_file_list(subset, root_dir)
     
-    print ("generating file objects...")
-#    img_dict = build_file_object_dictionary(file_list)
-    
+    print ("indexing archives...")
+    store = archive_store.ArchiveImageStore(root_dir.rstrip('/'))
+    store.build_indexes()
     
-    #saving and reading pickle files
-    save_pickle(build_file_object_dictionary(file_list), '/home/maverick/knet/out/'+out_file_name+'.pickle')
+    #saving the file list, the images are read from the archives when they are used
+    save_file_list(file_list, '/home/maverick/knet/out/'+out_file_name+'.txt')
 
     
     
     #Test code
-#    start_time = time.time()
-   
-#    data = read_pickle('out/2015-08-01.pickle')
-#    print (data == img_dict)
-#    print ("old = "+str(len(img_dict))+",new = "+str(len(data)))
- 
-#    for item in file_list:
-#        Image.open(img_dict[item])
-    
-    
+#    file_list = read_file_list('out/2015-08-01.txt')
 #    for item in file_list:
-#        img = np.array(Image.open(data[item]))
+#        img = np.array(Image.open(store.open(item)))
 #        
-#    img = np.array(Image.open(data[file_list[567]]))
+#    img = np.array(Image.open(store.open(file_list[567])))
 #    Image.fromarray(img)    
     
         
@@ -22,6 +22,9 @@ import h5py
 from datetime import datetime
 import numpy as np
 import glob
+import io
+
+import archive_store
 
 def read_images_from_archive(source_dir):
     total = 0
@@ -29,13 +32,16 @@ def read_images_from_archive(source_dir):
     images = []
     names = []            
     for item in archives:
-        if "tar" in item:
-            archive = tarfile.open(os.path.join(source_dir, item))
-            archive_items = archive.getmembers()
+        if item.lower().endswith((archive_store.ARCHIVE_EXTENSION,) + archive_store.COMPRESSED_EXTENSIONS):
+            # members are read at the offsets of the persistent archive index (archive_store.py), compressed
+            # archives are streamed
+            archive = archive_store.open_reader(os.path.join(source_dir, item))
+            archive_items = archive.names()
             total = total + len(archive_items)
             print (len(archive_items))
             print ("Total = "+ str(total))
             archive_images, archive_names = convert_to_array(archive, archive_items)
+            archive.close()
             images.append(archive_images)
             names.append(archive_names)
     return images, names
@@ -47,15 +53,13 @@ def convert_to_array(archive, archive_items):
         dataset = {}
         i =0
         for item in archive_items:
-            img = archive.extractfile(item)
             try:
-#                print img.name
-                read_img = Image.open(img)
+                read_img = Image.open(io.BytesIO(archive.read(item)))
                 img_arr = array(read_img)
                 images.append(img_arr)
 
                 # to clean up the tar folder path residue and only pick the name
-                img_name = img.name.split('/')[1] 
+                img_name = item.split('/')[1] 
                 img_name = img_name.split('_Debevec')[0]
                 img_name = img_name.split('_exp')[0]
                 names.append(img_name)
@@ -66,7 +70,7 @@ def convert_to_array(archive, archive_items):
 #                print os.path.join(output_dir+'/'+img.name[2:])
 #                processed_img.save(os.path.join(output_dir+'/'+img.name[2:]),"JPEG",quality=90)
             except Exception,e:
-                print "Error processing " + str(img)
+                print "Error processing " + str(item)
                 pass
             
         return images, names
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorised label computation for the merged log tables (prepare_logs_labels.py, prepare_logs_labels_MS.py)
+
+The labels compare the state at every log row (start_index) with the state lookahead minutes later (end_index, first
+row after t + lookahead, the last row at the end of the table). All transforms are column operations over the
+start/end index arrays, several look-ahead durations are labelled in one call.
+
+@author: Arthur Habicht
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+
+CLEAR_THRESHOLD = 0.80
+GRADIENT_THRESHOLDS = (6, -6)
+
+
+def end_indices(timestamps, lookahead_duration):
+    """
+    Index of the first row after timestamp + lookahead_duration minutes for every row, clipped to the last row
+    :param timestamps: sorted datetime64 array or DatetimeIndex
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    end = timestamps.searchsorted(timestamps + np.timedelta64(int(lookahead_duration * 60e9), 'ns'), side='right')
+    return np.minimum(end, len(timestamps) - 1)
+
+
+def label_thresholds_gradient(irradiation, end_index):
+    """Irradiation change in % between every row and its end_index row, rows with 0 irradiation are shifted by 1"""
+    x = np.asarray(irradiation, dtype=np.float64)
+    y = x[end_index]
+    zero = x == 0
+    x = np.where(zero, 1.0, x)
+    y = np.where(zero, y + 1.0, y)
+    return ((y / x) - 1) * 100
+
+
+def label_binary_values_gradient(metric, thresholds=GRADIENT_THRESHOLDS):
+    """1=increase, 0=same, -1=decrease, nan if the metric is exactly on a threshold"""
+    threshold_m, threshold_n = thresholds
+    labels = np.full(len(metric), np.nan)
+    labels[metric > threshold_m] = 1
+    labels[(metric > threshold_n) & (metric < threshold_m)] = 0
+    labels[metric < threshold_n] = -1
+    return labels
+
+
+def label_thresholds_clear(irradiation, ghi, threshold=CLEAR_THRESHOLD):
+    """0=occluded (irradiation below threshold x clear sky ghi), 1=clear"""
+    return np.where(np.asarray(irradiation) < np.asarray(ghi) * threshold, 0, 1)
+
+
+def label_binary_values_clear(state, end_index):
+    """0=occluded-occluded, 1=occluded-clear, 2=clear-occluded, 3=clear-clear"""
+    state = np.asarray(state).astype(np.int64)
+    return 2 * state + state[end_index]
+
+
+def process_labels(store, lookahead_durations, irradiation_column='irradiation_hs', gradient=False,
+                   threshold=CLEAR_THRESHOLD):
+    """
+    Adds the labels of all look-ahead durations (minutes): <d>_bin_clear, with gradient=True also <d>_min_grad and
+    <d>_bin_grad. The state column 'threshold' is computed from irradiation_column and ghi if it is missing.
+    start_index and end_index (of the last duration) are kept as columns.
+    """
+    if np.isscalar(lookahead_durations):
+        lookahead_durations = [lookahead_durations]
+    store = store.sort_index()
+    store['dt'] = store.index
+    store['start_index'] = np.arange(len(store))
+    if 'threshold' not in store:
+        store['threshold'] = label_thresholds_clear(store[irradiation_column].values, store['ghi'].values, threshold)
+
+    timestamps = store.index.values
+    state = store['threshold'].values
+    for duration in lookahead_durations:
+        end = end_indices(timestamps, duration)
+        store[str(duration) + '_bin_clear'] = label_binary_values_clear(state, end)
+        if gradient:
+            metric = label_thresholds_gradient(store[irradiation_column].values, end)
+            store[str(duration) + '_min_grad'] = metric
+            store[str(duration) + '_bin_grad'] = label_binary_values_gradient(metric)
+        store['end_index'] = end
+    return store
+
+
+def compute_two_class_label(store, label_name='5_bin_clear'):
+    """Reduces the 4-label schema to the future state only: 0=occluded, 1=clear (nan stays nan)"""
+    return pd.Series(np.mod(store[label_name].values, 2), index=store.index)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Master index of the images in the tar archives joined with the labelled sensor logs (replaces the per row
+nearest timestamp search and merge of metadata_index.py)
+
+- every image is matched to a log timestamp by one searchsorted over the sorted image and log timestamp arrays,
+  optionally within a tolerance (images without a log entry in direction or within the tolerance are dropped)
+- station settings (STATIONS): C logs are aligned with the images (exact match), MS timestamps are not aligned
+  (first log entry at or after the image like the searchsorted of metadata_index.py, valid date range only,
+  corrupted days excluded)
+- the index is columnar: one .npz per archive below the index folder (<archive stem>.npz, one array per column,
+  float columns as float32, strings as fixed width unicode), reads load only the requested columns
+- update() only joins archives which are not in the index yet, new archives are appended without rebuilding
+
+Usage:
+command line arguments - {archive folder} {labelled logs hdf} {index folder} [--station C|MS] [--hdf master_index.h5]
+
+   example :
+   python master_index.py /home/maverick/Desktop/ms_256_archives out/MS/labels_logs.h5 out/MS/master_index --station MS
+
+@author: Arthur Habicht
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import tarfile
+
+import numpy as np
+import pandas as pd
+
+import archive_store
+
+TIME_FORMAT = '%Y_%m_%d_%H_%M_%S'
+TIME_COLUMN = 'dt'
+NEAREST_TIME_COLUMN = 'nearest_time'
+ARCHIVE_COLUMN = 'archive'
+
+STATIONS = {
+    'C': {'direction': 'nearest', 'tolerance': pd.Timedelta(0), 'date_range': None, 'excluded_days': []},
+    'MS': {'direction': 'forward', 'tolerance': None, 'date_range': ('2015-07-15', '2016-04-21'),
+           'excluded_days': ['2015-07-26']},
+}
+
+_TIME_KEY = '__time__'
+_COLUMNS_KEY = '__columns__'
+
+
+def archive_stem(file_name):
+    # eg: 2015_09_05.tar -> 2015_09_05
+    return file_name.split('.')[0]
+
+
+def list_archive_images(path):
+    """(folder, name) of every file of an archive, from the member index of archive_store.py"""
+    folders, names = [], []
+    for member in archive_store.member_names(path):
+        parts = member.split('/')
+        if len(parts) >= 2:
+            folders.append(parts[0])
+            names.append(parts[-1])
+    return folders, names
+
+
+def images_frame(folders, names):
+    """Image DataFrame (folder, name) indexed by the timestamp in the file name, names without timestamp are dropped"""
+    df = pd.DataFrame({'folder': folders, 'name': names}, columns=['folder', 'name'])
+    # eg: 2015_07_15_10_00_00_Debevec.jpeg, 2015_07_15_10_00_00_exp1.jpeg -> 2015_07_15_10_00_00
+    times = pd.to_datetime(df['name'].str.extract(r'^(\d{4}_\d{2}_\d{2}_\d{2}_\d{2}_\d{2})', expand=False),
+                           format=TIME_FORMAT, errors='coerce')
+    if times.isnull().any():
+        print("Skipped", int(times.isnull().sum()), "files without timestamp")
+    df = df[times.notnull().values]
+    df.index = pd.DatetimeIndex(times[times.notnull()].values, name=TIME_COLUMN)
+    return df.sort_index(kind='mergesort')
+
+
+def nearest_positions(times, reference, direction='nearest', tolerance=None):
+    """
+    Position of the matching reference timestamp for every time, -1 if there is none in direction or within tolerance
+    :param times, reference: sorted datetime64 arrays
+    :param direction: 'nearest' (ties go to the earlier timestamp), 'forward' (first reference >= time) or
+        'backward' (last reference <= time)
+    :param tolerance: maximum distance (pd.Timedelta), None = unlimited
+    """
+    times = np.asarray(times, dtype='M8[ns]')
+    reference = np.asarray(reference, dtype='M8[ns]')
+    n = len(reference)
+    if n == 0:
+        return np.full(len(times), -1, dtype=np.int64)
+
+    after = np.searchsorted(reference, times, side='left')
+    if direction == 'forward':
+        positions = after
+    elif direction == 'backward':
+        positions = np.searchsorted(reference, times, side='right') - 1
+    elif direction == 'nearest':
+        before = after - 1
+        d_before = times - reference[np.maximum(before, 0)]
+        d_after = reference[np.minimum(after, n - 1)] - times
+        positions = np.where((after >= n) | ((before >= 0) & (d_before <= d_after)), before, after)
+    else:
+        raise ValueError("Unknown direction: " + str(direction))
+
+    valid = (positions >= 0) & (positions < n)
+    if tolerance is not None:
+        distance = np.abs(reference[np.clip(positions, 0, n - 1)] - times)
+        valid &= distance <= np.timedelta64(pd.Timedelta(tolerance).value, 'ns')
+    return np.where(valid, positions, -1)
+
+
+def join_nearest(images, logs, direction='nearest', tolerance=None):
+    """
+    Joins every image with its matching log entry in direction (see nearest_positions) (all log columns and NEAREST_TIME_COLUMN)
+    Log entries with duplicate timestamps keep the last one, images with duplicate timestamps are dropped
+    :param images, logs: DataFrames with a DatetimeIndex
+    """
+    images = images.sort_index(kind='mergesort')
+    logs = logs[~logs.index.duplicated(keep='last')].sort_index()
+    positions = nearest_positions(images.index.values, logs.index.values, direction, tolerance)
+    matched = positions >= 0
+
+    log_part = logs.iloc[positions[matched]]
+    log_part = log_part.drop([c for c in log_part.columns if c in images.columns or c == TIME_COLUMN], axis=1)
+    log_part[NEAREST_TIME_COLUMN] = log_part.index
+    log_part.index = images.index[matched]
+
+    joined = pd.concat([images[matched], log_part], axis=1)
+    return joined[~joined.index.duplicated(keep=False)]
+
+
+def select_station_range(df, station):
+    settings = STATIONS[station]
+    if settings['date_range'] is not None:
+        df = df.loc[settings['date_range'][0]:settings['date_range'][1]]
+    if settings['excluded_days']:
+        df = df[~df.index.normalize().isin(pd.DatetimeIndex(settings['excluded_days']))]
+    return df
+
+
+def _column_array(values, float_dtype):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return values.astype(float_dtype)
+    if values.dtype.kind in 'OSU':
+        return values.astype('U')
+    return values
+
+
+class MasterIndex(object):
+    def __init__(self, root, float_dtype=np.float32):
+        """
+        :param root: index folder, one <archive stem>.npz per archive
+        :param float_dtype: stored type of float columns
+        """
+        self.root = root
+        self.float_dtype = float_dtype
+
+    def _path(self, stem):
+        return os.path.join(self.root, stem + '.npz')
+
+    def archives(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(f[:-4] for f in os.listdir(self.root) if f.endswith('.npz'))
+
+    def has_archive(self, stem):
+        return os.path.isfile(self._path(stem))
+
+    def write_archive(self, stem, df, overwrite=False):
+        """Writes the index part of an archive (an empty df marks the archive as indexed)"""
+        path = self._path(stem)
+        if os.path.exists(path) and not overwrite:
+            raise ValueError("Archive {} is already indexed (use overwrite=True)".format(stem))
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+        df = df.sort_index(kind='mergesort')
+        arrays = dict((str(i), _column_array(df[c].values, self.float_dtype)) for i, c in enumerate(df.columns))
+        arrays[_TIME_KEY] = pd.DatetimeIndex(df.index).values.astype('M8[ns]')
+        arrays[_COLUMNS_KEY] = np.array([str(c) for c in df.columns], dtype='U')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+
+    def _read_archive(self, stem, columns, start, end):
+        with np.load(self._path(stem)) as data:
+            times = data[_TIME_KEY]
+            lo, hi = 0, len(times)
+            if start is not None:
+                lo = np.searchsorted(times, np.datetime64(pd.Timestamp(start).value, 'ns'), 'left')
+            if end is not None:
+                hi = np.searchsorted(times, np.datetime64(pd.Timestamp(end).value, 'ns'), 'right')
+            stored = list(data[_COLUMNS_KEY])
+            names = stored if columns is None else [c for c in columns if c in stored]
+            return pd.DataFrame(dict((c, data[str(stored.index(c))][lo:hi]) for c in names), columns=names,
+                                index=pd.DatetimeIndex(times[lo:hi], name=TIME_COLUMN))
+
+    def read(self, columns=None, start=None, end=None, archives=None):
+        """
+        :param columns: list of columns, all if None
+        :param start, end: time range (inclusive), None = open range
+        :param archives: list of archive stems, all if None
+        :return: pd.DataFrame indexed by image timestamp
+        """
+        stems = self.archives() if archives is None else archives
+        parts = [self._read_archive(stem, columns, start, end) for stem in stems]
+        if not parts:
+            return pd.DataFrame(columns=columns or [], index=pd.DatetimeIndex([], name=TIME_COLUMN))
+        return pd.concat(parts).sort_index(kind='mergesort')
+
+    def update(self, archive_dir, logs, station='C', overwrite=False):
+        """
+        Indexes all archives of archive_dir which are not in the index yet, with one nearest timestamp join
+        :param logs: labelled logs DataFrame (DatetimeIndex) of the station
+        :return: list of the newly indexed archive stems
+        """
+        settings = STATIONS[station]
+        # extracted day folders and the member indexes next to the archives are skipped
+        paths = [os.path.join(archive_dir, item) for item in sorted(os.listdir(archive_dir))]
+        new = [(archive_stem(os.path.basename(path)), path) for path in paths
+               if os.path.isfile(path) and not path.endswith(archive_store.INDEX_SUFFIX) and tarfile.is_tarfile(path)]
+        new = [(stem, path) for stem, path in new if overwrite or not self.has_archive(stem)]
+        if not new:
+            return []
+
+        frames = []
+        for stem, path in new:
+            images = images_frame(*list_archive_images(path))
+            images[ARCHIVE_COLUMN] = stem
+            frames.append(images)
+        images = select_station_range(pd.concat(frames), station)
+        logs = select_station_range(logs.sort_index(), station)
+
+        joined = join_nearest(images, logs, settings['direction'], settings['tolerance'])
+        parts = dict((stem, part.drop(ARCHIVE_COLUMN, axis=1)) for stem, part in joined.groupby(ARCHIVE_COLUMN))
+        for stem, _ in new:
+            self.write_archive(stem, parts.get(stem, joined.iloc[:0].drop(ARCHIVE_COLUMN, axis=1)),
+                               overwrite=overwrite)
+            print(stem, len(parts[stem].index) if stem in parts else 0, "images indexed")
+        return [stem for stem, _ in new]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("archive_dir", help="folder with the image archives")
+    parser.add_argument("logs", help="labelled logs hdf (prepare_logs_labels.py)")
+    parser.add_argument("index_dir", help="master index folder")
+    parser.add_argument("--station", default="C", choices=sorted(STATIONS))
+    parser.add_argument("--overwrite", action="store_true", help="re-index archives which are already indexed")
+    parser.add_argument("--hdf", default=None, help="also export the full index as hdf table")
+    args = parser.parse_args()
+
+    index = MasterIndex(args.index_dir)
+    index.update(args.archive_dir, pd.read_hdf(args.logs), station=args.station, overwrite=args.overwrite)
+    if args.hdf is not None:
+        index.read().to_hdf(args.hdf, 'df', mode='w', format='table', data_columns=True, complevel=9,
+                            complib='zlib')
@@ -17,6 +17,9 @@ import pandas
 from datetime import datetime
 import itertools
 
+import archive_store
+import master_index
+
 
 def read_images_from_archive(source_dir):
     total = 0
@@ -25,13 +28,13 @@ def read_images_from_archive(source_dir):
     name = []
     timestamp = []
     for item in archives:
-        if "tar" in item:
-            archive = tarfile.open(os.path.join(source_dir, item))
-            archive_items = archive.getmembers()
+        if "tar" in item and not item.endswith(archive_store.INDEX_SUFFIX):
+            # member names from the persistent offset index, built on the first access
+            archive_items = archive_store.member_names(os.path.join(source_dir, item))
             total = total + len(archive_items)
             print (len(archive_items))
             print ("Total = "+ str(total))
-            folder_names, file_names, timestamps = build_file_index(archive, archive_items)
+            folder_names, file_names, timestamps = build_file_index(archive_items)
             folder.append(folder_names)
             name.append(file_names)
             timestamp.append(timestamps)
@@ -45,7 +48,7 @@ def read_images_from_archive(source_dir):
         
         
 
-def build_file_index(archive, archive_items):
+def build_file_index(archive_items):
         folder = []
         name = []
         timestamp = []
@@ -53,7 +56,7 @@ def build_file_index(archive, archive_items):
         for item in archive_items:
 
             try:
-                item_name = str(item).split("'")[1]
+                item_name = item
                 folder_name = item_name.split("/")[0]
                 file_name = item_name.split("/")[1]
                 time = file_name.split('_Debevec')[0]
@@ -95,14 +98,6 @@ def read_hdf(hdf_file):
     df = pandas.read_hdf(hdf_file)
     return df
 
-def find_nearest_timestamp(row):
-    date = row['dt']
-    print date
-    i = logs.index.searchsorted(date)
-    nearest_timestamp = logs.index[i]
-    return nearest_timestamp
-    
-    
 if __name__== "__main__":
     
 #    root_dir = sys.argv[1]    
@@ -110,50 +105,15 @@ if __name__== "__main__":
     
     root_dir = "/home/maverick/Desktop/ms_256_archives"
 #    root_dir = "/home/maverick/Desktop/temp/chk"
-    folder, name, timestamp = read_images_from_archive(root_dir)
-    df = convert_to_df(folder,name,timestamp) 
-    
-    convert_to_hdf(df, 'MS/metadata')
-    
-    metadata = read_hdf('out/MS/metadata.h5')
     logs = read_hdf('out/MS/labels_logs.h5')
-    
-    
-    ############Specific to MS data to handle non-aligned timestamps###############
-    #range of dates for which data is valid/complete
-    metadata = metadata.ix['2015-07-15':'2016-04-21']
-    logs = logs.ix['2015-07-15':'2016-04-21']
-
-    # finds nearest timestamp match for each image by finding corresponding index value in logs
-    metadata['dt'] = metadata.index
-    metadata['nearest_time']= metadata.apply(find_nearest_timestamp, axis=1)
-    
-    #combine logs and metadata by joining nearest_time in metadata to index of logs
-    logs['nearest_time'] = logs.index
-    master_data = pandas.merge(metadata, logs, on='nearest_time')
-    master_data['dt'] = master_data['dt_x']
-    master_data.set_index('dt',inplace=True)
-    master_data = master_data.sort_index()
-    master_data = master_data.drop(master_data.ix['2015-07-26':'2015-07-26'])
-    master_data = master_data.drop(master_data.index.get_duplicates())
-    convert_to_hdf(master_data,'MS/master_index')
-    ########################################
-    
-    #OLD code to merge logs and metadata on plain 'dt' without finding nearest timestamps
-    metadata['dt'] = metadata.index
-    logs['dt'] = logs.index
-    master_data = pandas.merge(metadata, logs, on='dt')
-    master_data.set_index('dt',inplace=True)
-    master_data = master_data.sort_index()
-#    master_data['3_bin'].plot()
-    convert_to_hdf(master_data,'MS/master_index')
 
+    # first log timestamp at or after every image (one searchsorted over all timestamps, see master_index.py),
+    # only archives which are not indexed yet are joined
+    index = master_index.MasterIndex('out/MS/master_index')
+    index.update(root_dir, logs, station='MS')
+    master_data = index.read()
+    convert_to_hdf(master_data,'MS/master_index')
 
-    
-
-                            
-                            
-                            
 
 #    mdata = metadata.ix['2015-07-15':'2015-07-15']
 #    ldata = logs.ix['2015-07-15':'2015-07-15']
@@ -0,0 +1,119 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Batched inference for the keras models, used by the predict_daily scripts
+
+- sky mask is converted once into numpy factors instead of ImageOps.invert per image
+- images are decoded, masked and resized by a thread pool, every image only once per batch
+  (consecutive sequences share images)
+- decoding of the next batch runs while the model predicts the current batch (predict_on_batch)
+- one columnar output file (hdf5 table) with predictions and labels per day
+
+@author: Arthur Habicht
+"""
+
+from __future__ import print_function
+
+import os
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas
+
+from inputgenerator import prepare_sky_mask, load_masked_image, sample_image_paths
+
+
+class BatchPredictor(object):
+    def __init__(self, model, sky_mask, img_rows, img_cols, batch_size=128, workers=4, input_irradiance=True):
+        """
+        :param model: compiled keras model with weights (img_input and optionally irr_input)
+        :param sky_mask: PIL image of sky mask
+        :param workers: threads for decoding images (PIL releases the GIL while decoding and resizing)
+        """
+        self.model = model
+        self.mask = prepare_sky_mask(sky_mask)
+        self.img_rows = img_rows
+        self.img_cols = img_cols
+        self.batch_size = batch_size
+        self.input_irradiance = input_irradiance
+        self.decode_pool = ThreadPool(workers)
+        self.batch_pool = ThreadPool(1)  # assembles next batch while the model predicts
+
+    def close(self):
+        self.decode_pool.close()
+        self.batch_pool.close()
+
+    def _load_image(self, fname):
+        return load_masked_image(fname, self.mask, self.img_rows, self.img_cols)
+
+    def _create_batch(self, paths):
+        unique_paths, inverse = np.unique(paths, return_inverse=True)
+        frames = np.stack(self.decode_pool.map(self._load_image, list(unique_paths)))
+        frames = frames[inverse.reshape(paths.shape)]  # samples x sequence x rows x cols x 3
+
+        # stack sequence along channels (newest image first), like inputgenerator.create_image_sequence
+        batch = np.concatenate([frames[:, i] for i in range(paths.shape[1])], axis=3).astype(np.float32)
+        batch /= 255.0
+        return batch
+
+    def predict(self, paths, irr):
+        """
+        :param paths: image paths samples x sequence_length
+        :param irr: irradiance of newest image per sample
+        :return: predictions samples x outputs
+        """
+        if len(paths) == 0:
+            return np.zeros((0,) + tuple(self.model.output_shape[1:]), dtype=np.float32)
+
+        starts = list(range(0, len(paths), self.batch_size))
+        pending = self.batch_pool.apply_async(self._create_batch, (paths[starts[0]:starts[0] + self.batch_size],))
+
+        predictions = list()
+        for i, start in enumerate(starts):
+            img_batch = pending.get()
+            if i + 1 < len(starts):
+                next_start = starts[i + 1]
+                pending = self.batch_pool.apply_async(self._create_batch,
+                                                      (paths[next_start:next_start + self.batch_size],))
+
+            if self.input_irradiance:
+                inputs = {"img_input": img_batch, "irr_input": irr[start:start + len(img_batch)].reshape(-1, 1)}
+            else:
+                inputs = {"img_input": img_batch}
+            predictions.append(self.model.predict_on_batch(inputs))
+
+        return np.concatenate(predictions, axis=0)
+
+    def predict_day(self, day_df, master_df, root_dir, sequence_length, sequence_stride, label_columns):
+        """
+        :param day_df: samples of a single day (index = timestamps in master_df)
+        :param label_columns: columns of day_df written as L0,L1,...
+        :return: DataFrame with columns P0,P1,...,L0,L1,...
+        """
+        paths, irr = sample_image_paths(day_df, master_df, root_dir, sequence_length, sequence_stride)
+        predictions = self.predict(paths, irr).reshape(len(day_df), -1)
+
+        pred_df = pandas.DataFrame(data=predictions, index=day_df.index,
+                                   columns=["P" + str(i) for i in range(predictions.shape[1])])
+        label_df = day_df[label_columns].astype(np.float32)
+        label_df.columns = ["L" + str(i) for i in range(len(label_columns))]
+        return pandas.concat([pred_df, label_df], axis=1)
+
+
+def predict_days(predictor, set_df, master_df, root_dir, sequence_length, sequence_stride, label_columns, output_dir):
+    """
+    Predicts all days in set_df and writes one file per day: output_dir/yyyy-mm-dd_predictions.h5 (key predictions)
+    :return: list of written paths
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    written = list()
+    for day, day_df in set_df.sort_index().groupby(set_df.sort_index().index.date):
+        result_df = predictor.predict_day(day_df, master_df, root_dir, sequence_length, sequence_stride,
+                                          label_columns)
+        path = os.path.join(output_dir, str(day) + '_predictions.h5')
+        result_df.to_hdf(path, 'predictions', mode='w', format='table')
+        print(day, "samples:", len(result_df), "->", path)
+        written.append(path)
+    return written
@@ -14,7 +14,9 @@ import pandas
 
 import numpy as np
 import os
+import threading
 from keras.utils import np_utils
+from keras.utils import Sequence
 from sklearn.model_selection import train_test_split
 from scipy import misc
 
@@ -44,6 +46,176 @@ def process_image(fname, sky_mask, img_rows, img_cols):
     return img
 
 
+def prepare_sky_mask(sky_mask):
+    """
+    Precomputes the masking of process_image, which pastes the sky mask with its inverse as alpha:
+    masked = img*mask + 255*mask*(1-mask), mask scaled to [0,1]
+    :param sky_mask: PIL image
+    :return: (keep, fill) float32 arrays of shape rows x cols x 1
+    """
+    mask = np.asarray(sky_mask.convert('L'), dtype=np.float32) / 255.0
+    keep = mask[:, :, np.newaxis]
+    fill = (255.0 * mask * (1.0 - mask))[:, :, np.newaxis]
+    return keep, fill
+
+
+def load_masked_image(fname, mask, img_rows, img_cols, image_store=None):
+    # same result as process_image with a mask from prepare_sky_mask, returns uint8 array
+    # image_store: f.e. archive_store.ArchiveImageStore, reads fname from the tar archives
+    keep, fill = mask
+    img = Image.open(fname if image_store is None else image_store.open(fname))
+    img = np.asarray(img.convert('RGB'), dtype=np.float32)
+    img = np.rint(img * keep + fill).astype(np.uint8)
+    img = Image.fromarray(img).resize((img_rows, img_cols), Image.ANTIALIAS)
+    return np.asarray(img)
+
+
+def sample_positions(set_df, master_df, sequence_length, sequence_stride):
+    """
+    Positions in master_df of the images of every sample in set_df (vectorised lookup of generate_data)
+    :return: array samples x sequence_length, newest image first
+    """
+    relative_seq_indices = np.array([-i for i in range(0, sequence_stride * (sequence_length - 1) + 1, sequence_stride)])
+
+    positions = master_df.index.get_indexer(set_df.index)
+    if np.any(positions < 0):
+        raise ValueError("Samples missing in master_df")
+
+    return positions[:, np.newaxis] + relative_seq_indices[np.newaxis, :]
+
+
+def sample_image_paths(set_df, master_df, root_dir, sequence_length, sequence_stride):
+    """
+    Image paths and irradiance of every sample in set_df
+    :return: paths array samples x sequence_length (newest image first), irradiance of newest image
+    """
+    seq_positions = sample_positions(set_df, master_df, sequence_length, sequence_stride)
+    folders = master_df['folder'].values[seq_positions[:, 0]]
+    names = master_df['name'].values[seq_positions]
+
+    paths = np.array([[os.path.join(root_dir, folder, name) for name in sample_names]
+                      for folder, sample_names in zip(folders, names)])
+    irr = master_df['irradiation_hs'].values[seq_positions[:, 0]].astype(np.float32)
+    return paths, irr
+
+
+class DataSequence(Sequence):
+    """
+    Index based keras Sequence over set_df, replaces generate_data. Safe for fit_generator with workers > 1
+    and use_multiprocessing. Every frame is masked and resized once and kept in a frame cache:
+    a memmap file shared by all worker processes if frame_cache_file is set, otherwise a bounded
+    cache per process. With an image_store (archive_store.ArchiveImageStore) the frames are read
+    directly from the tar archives of root_dir.
+    """
+
+    def __init__(self,
+                 set_df,
+                 master_df,
+                 root_dir,
+                 img_rows,
+                 img_cols,
+                 batch_size,
+                 sequence_length,
+                 sequence_stride,
+                 sky_mask,
+                 labels,
+                 shuffle=False,
+                 seed=1337,
+                 frame_cache_file=None,
+                 frame_cache_size=20000,
+                 image_store=None):
+
+        self.img_rows = img_rows
+        self.img_cols = img_cols
+        self.batch_size = batch_size
+        self.sequence_length = sequence_length
+        self.mask = prepare_sky_mask(sky_mask)
+        self.shuffle = shuffle
+        self.image_store = image_store
+        self.random_state = np.random.RandomState(seed)
+
+        paths, irr = sample_image_paths(set_df, master_df, root_dir, sequence_length, sequence_stride)
+
+        # frames used by the set, samples refer to them by slot
+        self.frame_paths, slots = np.unique(paths, return_inverse=True)
+        self.sample_slots = slots.reshape(paths.shape)
+        self.irr = irr
+        self.labels = set_df[labels].values.astype(np.float32).reshape(len(set_df), len(labels))
+        self.index = set_df.index
+
+        self.order = np.arange(len(set_df))
+        if self.shuffle:
+            self.random_state.shuffle(self.order)
+
+        self.frame_cache_file = frame_cache_file
+        self.frame_cache_size = frame_cache_size
+        self._reset_cache()
+
+        if frame_cache_file is not None:  # create cache file in main process, workers open it in r+ mode
+            frame_shape = (len(self.frame_paths), img_cols, img_rows, 3)
+            np.memmap(frame_cache_file, dtype=np.uint8, mode='w+', shape=frame_shape).flush()
+            np.memmap(frame_cache_file + '.done', dtype=np.uint8, mode='w+', shape=(len(self.frame_paths),)).flush()
+
+    def _reset_cache(self):
+        self._frames = None
+        self._frames_done = None
+        self._frame_dict = dict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # memmaps and locks are opened again in each worker process
+        state = self.__dict__.copy()
+        for key in ['_frames', '_frames_done', '_frame_dict', '_lock']:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_cache()
+
+    def __len__(self):
+        return int(np.ceil(len(self.order) / float(self.batch_size)))
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.random_state.shuffle(self.order)
+
+    def _frame(self, slot):
+        if self.frame_cache_file is not None:
+            if self._frames is None:
+                frame_shape = (len(self.frame_paths), self.img_cols, self.img_rows, 3)
+                self._frames = np.memmap(self.frame_cache_file, dtype=np.uint8, mode='r+', shape=frame_shape)
+                self._frames_done = np.memmap(self.frame_cache_file + '.done', dtype=np.uint8, mode='r+',
+                                              shape=(len(self.frame_paths),))
+            if not self._frames_done[slot]:
+                self._frames[slot] = load_masked_image(self.frame_paths[slot], self.mask, self.img_rows,
+                                                       self.img_cols, self.image_store)
+                self._frames_done[slot] = 1  # frame is written before it is flagged, concurrent writes are identical
+            return self._frames[slot]
+
+        frame = self._frame_dict.get(slot)
+        if frame is None:
+            frame = load_masked_image(self.frame_paths[slot], self.mask, self.img_rows, self.img_cols,
+                                      self.image_store)
+            with self._lock:
+                if len(self._frame_dict) >= self.frame_cache_size:
+                    self._frame_dict.pop(next(iter(self._frame_dict)))
+                self._frame_dict[slot] = frame
+        return frame
+
+    def __getitem__(self, idx):
+        samples = self.order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        slots = self.sample_slots[samples]
+
+        X = np.empty((len(samples), self.img_cols, self.img_rows, 3 * self.sequence_length), dtype=np.float32)
+        for i in range(len(samples)):
+            for s in range(self.sequence_length):  # newest image first, like create_image_sequence
+                X[i, :, :, 3 * s:3 * (s + 1)] = self._frame(slots[i, s])
+        X /= 255.0
+
+        return {"img_input": X, "irr_input": self.irr[samples]}, self.labels[samples]
+
+
     
 def generate_data(
         set_df,
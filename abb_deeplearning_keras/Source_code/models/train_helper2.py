@@ -183,6 +183,10 @@ if __name__ == "__main__":
     input_irradiance = params['input_irradiance']
     prediction_resolution = params['prediction_resolution']
     cpk_path = params['cpk_path']
+    workers = params.get('workers', 4)
+    use_multiprocessing = params.get('use_multiprocessing', False)
+    frame_cache_dir = params.get('frame_cache_dir', None)
+    read_from_archives = params.get('read_from_archives', False)
 
     seq_channels = sequence_length*3
     labels30 = ["IRR" + str(i) for i in range(31)] #20sec forecast frequency
@@ -210,57 +214,36 @@ if __name__ == "__main__":
         label_name=label_name,
         balanced=balanced)
 
-    train_batch_nr_per_epoch = (len(train_df) // batch_size)
-    validation_batch_nr_per_epoch = (len(validation_df) // batch_size)
-    test_batch_nr_per_epoch = (len(test_df) // batch_size)
-
-    #shuffle train_set, numpy seed
-    train_df = train_df.sample(frac=1,random_state=nrs)
-
-
-
-
-    training_data_generator = ig.generate_data(
-        set_df=train_df,
-        master_df=master_df,
-        root_dir=root_dir,
-        img_rows=img_rows,
-        img_cols=img_cols,
-        batch_size=batch_size,
-        order=order,
-        sequence_length=sequence_length,
-        sequence_stride=sequence_stride,
-        sky_mask=sky_mask,
-        labels=labels
-    )
-
-    validation_data_generator = ig.generate_data(
-        set_df=validation_df,
-        master_df=master_df,
-        root_dir=root_dir,
-        img_rows=img_rows,
-        img_cols=img_cols,
-        batch_size=batch_size,
-        order=order,
-        sequence_length=sequence_length,
-        sequence_stride=sequence_stride,
-        sky_mask=sky_mask,
-        labels=labels
-    )
-
-    test_data_generator = ig.generate_data(
-        set_df=test_df,
-        master_df=master_df,
-        root_dir=root_dir,
-        img_rows=img_rows,
-        img_cols=img_cols,
-        batch_size=batch_size,
-        order=order,
-        sequence_length=sequence_length,
-        sequence_stride=sequence_stride,
-        sky_mask=sky_mask,
-        labels=labels
-    )
+    image_store = None
+    if read_from_archives:
+        # images are read from the tar archives of root_dir at their indexed offsets (archive_store.py)
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import archive_store
+        image_store = archive_store.ArchiveImageStore(root_dir.rstrip('/'))
+        image_store.build_indexes()
+
+    def data_sequence(set_df, shuffle, cache_name):
+        # index based Sequence, safe for several workers; frames are cached in a shared file if frame_cache_dir is set
+        frame_cache_file = os.path.join(frame_cache_dir, cache_name) if frame_cache_dir else None
+        return ig.DataSequence(
+            set_df=set_df,
+            master_df=master_df,
+            root_dir=root_dir,
+            img_rows=img_rows,
+            img_cols=img_cols,
+            batch_size=batch_size,
+            sequence_length=sequence_length,
+            sequence_stride=sequence_stride,
+            sky_mask=sky_mask,
+            labels=labels,
+            shuffle=shuffle,
+            frame_cache_file=frame_cache_file,
+            image_store=image_store)
+
+    #train_set is shuffled every epoch, numpy seed
+    training_data_generator = data_sequence(train_df, True, 'train_frames.bin')
+    validation_data_generator = data_sequence(validation_df, False, 'validation_frames.bin')
+    test_data_generator = data_sequence(test_df, False, 'test_frames.bin')
 
     experiment_path = os.path.join(experiment_folder, experiment_name)
 
@@ -299,12 +282,14 @@ if __name__ == "__main__":
     if cpk_path:
         resnet_model.load_weights(cpk_path,by_name=True)
     history = resnet_model.fit_generator(training_data_generator,
-                               steps_per_epoch=train_batch_nr_per_epoch,
+                               steps_per_epoch=len(training_data_generator),
                                epochs=nb_epoch,
                                verbose=1,
                                validation_data=validation_data_generator,
-                               validation_steps=validation_batch_nr_per_epoch,
+                               validation_steps=len(validation_data_generator),
                                max_queue_size=100,
+                               workers=workers,
+                               use_multiprocessing=use_multiprocessing,
                                callbacks=[lr_reducer, csv_logger, checkpoint, visualizer])
 
     with open(os.path.join(experiment_path,'logs','history.pickle'),'wb') as f:
@@ -42,6 +42,9 @@ import matplotlib.pyplot as plt
 #from pvlib import clearsky, atmosphere
 #from pvlib.location import Location
 
+from label_transforms import process_labels, compute_two_class_label, end_indices, \
+    label_thresholds_gradient
+
 
 #merges multiple log files in a directory into a large dataframe
 def merge_logs(source_dir):
@@ -173,122 +176,10 @@ def sync_timeseries(logs_data, ghi_data, plant='MS'):
     return master_data.sort_index()
 
     
-#rolling window function to calculate irradiation change% (gradient based, measures against sensor data)
-def calc_label_thresholds_gradient(row):
-    try:
-        x = store['irradiation'].iloc[row['start_index']]
-        y = store['irradiation'].iloc[row['end_index']]
-        
-        if row['start_index'] % 10000 == 0:
-            print row['start_index']
-    except Exception,e:
-        y = store['irradiation'].iloc[row['end_index'] -1]
-        print "index out of bound corrected"
-
-    #appending 1 to zero values to avoid infinity, this makes x,y =1
-    if(x==0):
-        x+=1
-        y+=1        
-    metric = (((y/x)-1)*100)
-    return metric
-
-
-#rolling window function to calculate binary values for labels (gradient based, measures against irradiation)
-# 1=increase, 0=same, -1=decrease
-def calc_label_binary_values_gradient(row):
-    threshold_m = 6
-    threshold_n = -6
-    try:
-        x = store['irradiation'].iloc[row['start_index']]
-        y = store['irradiation'].iloc[row['end_index']]
-        
-        if row['start_index'] % 10000 == 0:
-            print row['start_index']
-    except Exception,e:
-        y = store['irradiation'].iloc[row['end_index'] -1]
-        print "index out of bound corrected"
-    
-    #appending 1 to zero values to avoid infinity, this makes x,y =1
-    if(x==0):
-        x+=1
-        y+=1
-    metric = (((y/x)-1)*100)
-    
-    if  metric > threshold_m:
-        return 1
-    elif metric > threshold_n and metric < threshold_m:
-        return 0
-    elif metric < threshold_n:
-        return -1
-
-        
-#rolling window function to calculate irradiation change% (measures against clearsky 'GHI' parameter)
-def calc_label_thresholds_clear(row):
-    clearsky = row['ghi']
-    irradiation = row['irradiation']
-    threshold = 0.80 #70 %
-    
-    if (irradiation < (clearsky *threshold)):
-        return 0 #occluded
-    else:
-        return 1 #clear
-
-    
-#rolling window function to calculate binary values for labels (measures against clearsky 'GHI' parameter)
-# 1=increase, 0=same, -1=decrease
-def calc_label_binary_values_clear(row):
-    try:
-        x = store['threshold'].iloc[row['start_index']]
-        y = store['threshold'].iloc[row['end_index']]
-        
-        if row['start_index'] % 10000 == 0:
-            print row['start_index']
-    except Exception,e:
-        y = store['threshold'].iloc[row['end_index'] -1]
-        print "index out of bound corrected"
-
-    if (x==0 and y==0): #occluded-occluded
-        return 0
-    elif (x==0 and y==1): #occluded-clear
-        return 1
-    elif (x==1 and y==0): #clear-occluded
-        return 2
-    elif (x==1 and y==1): #clear-clear
-        return 3
-        
-        
-        
-# method to apply the thresholds and find the binary labels for a given duration
-def process_labels(store, lookahead_duration):
-    store = store.sort_index()
-    store['dt'] = store.index
-    start_dates = store['dt'] + pd.Timedelta(minutes = lookahead_duration)
-    store['end_index'] = store['dt'].values.searchsorted(start_dates, side='right')
-    store['start_index'] = np.arange(len(store))
-    
-    print ("calculating thresholds..")
-#    store['threshold'] = store.apply(calc_label_thresholds_clear, axis=1)
-    print ("computing binary labels...")
-    store[str(lookahead_duration)+'_bin_clear'] = store.apply(calc_label_binary_values_clear, axis=1)
-    return store
-
-
-# Method to reduce the existing 4-label schema to 2-labels only, outputs only the future state
-def compute_two_class_label(row):
-    label_name = '5_bin_clear'
-    if row[label_name] == 0:
-        return 0 #occluded
-    elif row[label_name] == 1:
-        return 1 #clear
-    elif row[label_name] == 2:
-        return 0 #occluded
-    elif row[label_name] == 3:
-        return 1 #clear
-    
 #To calculate binary labels (0,1) only based on the future state. [00,01,10,11] reduced to [0,1]
 meta_file = '/home/maverick/knet/out/MS/master_index.h5'
 store = pd.read_hdf(meta_file)
-store['2_class'] = store.apply(lambda row: compute_two_class_label(row), axis =1)
+store['2_class'] = compute_two_class_label(store)
 len(store.loc[store['2_class'] == 0])
 len(store.loc[store['2_class'] == 1])
 store.to_hdf('out/MS/master_index1.h5','df',mode='w',format='table',data_columns=True)
@@ -313,10 +204,7 @@ copy = master_data
 
 store = pd.read_hdf('/home/maverick/knet/out/MS/master_logs_synced.h5')
 store.ix['2015-07-15':'2015-07-17']
-store = process_labels(store,3)
-store = process_labels(store,5)
-store = process_labels(store,7)
-store = process_labels(store,10)
+store = process_labels(store, [3, 5, 7, 10], irradiation_column='irradiation')
 store.to_hdf('out/MS/labels_logs.h5','df',mode='w',format='table',data_columns=True)
 
 
@@ -360,12 +248,11 @@ store['dt'] = store.index
 #start_dates = store['dt'] - pd.Timedelta(minutes=5)
 #store['start_index'] = store['dt'].values.searchsorted(start_dates, side='right')
 #store['end_index'] = np.arange(len(store))
-start_dates = store['dt'] + pd.Timedelta(minutes=1)
-store['end_index'] = store['dt'].values.searchsorted(start_dates, side='right')
+store['end_index'] = end_indices(store.index.values, 1)
 store['start_index'] = np.arange(len(store))
 
 
-store['3_min']= store.apply(calc_label_thresholds, axis=1)
+store['3_min'] = label_thresholds_gradient(store['irradiation'].values, store['end_index'].values)
 
 print(store[['dt', 'irradiation', '3_min','start_index','end_index']].iloc[100:150])
 
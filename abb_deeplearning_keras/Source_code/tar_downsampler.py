@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming downsampler for the tar archives of raw images (replaces the separate passes of downsample.py and
+mask_on_downsample.py)
+
+- the members of an archive are read sequentially in stream mode (no getmembers() scan, no random access)
+- every JPEG is decoded once (optionally with draft decoding to 1/2, 1/4, 1/8 of the size, at least the largest
+  target size) and resized to all sizes, masked and unmasked variants are produced in the same pass
+- one worker process per archive, a worker only holds the current image, so memory is bounded by workers x image
+- outputs per (size, variant): an archive with the same member names (output='tar', written to a temporary
+  file and renamed when complete together with its member offset index for archive_store.py, finished archives
+  are skipped on a rerun) or single files (output='dir', <destination>/<size>[_masked]/<member name>, directly
+  below the destination if only one output is requested)
+
+Usage:
+command line arguments - {img source folder} {sizes, f.e. 128,256} {destination folder} [options]
+
+   example :
+   python tar_downsampler.py /home/ubuntu/images/ 128,256 /home/ubuntu/new_images --mask skymask_256.png --masked both
+
+@author: Arthur Habicht
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import tarfile
+from multiprocessing import Pool
+
+from PIL import Image
+
+import archive_store
+
+ARCHIVE_EXTENSIONS = ('.tar', '.tar.gz', '.tgz')
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg')
+PLAIN = 'plain'
+MASKED = 'masked'
+
+
+def check_file_type(file_name):
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_stem(file_name):
+    # eg: 2015_09_05.tar -> 2015_09_05
+    return file_name.split('.')[0]
+
+
+def iter_tar_images(path):
+    """Yields (member name, JPEG bytes) of an archive, members are read in stream mode in archive order"""
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, archive.extractfile(member).read()
+
+
+def prepare_masks(sky_mask, sizes):
+    """
+    Sky mask resized to every size. The mask png is RGBA (opaque black outside the sky, transparent sky, see
+    mask_cleanup.py), it is pasted onto the resized images with its alpha channel
+    """
+    if sky_mask is None:
+        return {}
+    sky_mask = sky_mask.convert('RGBA')
+    return dict((size, sky_mask if sky_mask.size == (size, size) else sky_mask.resize((size, size), Image.LANCZOS))
+                for size in sizes)
+
+
+def transform_image(data, sizes, variants=(PLAIN,), masks=None, draft=False):
+    """
+    Decodes one JPEG and returns all requested outputs
+    :param variants: PLAIN and/or MASKED (same masking as mask_on_downsample.py)
+    :return: dict (size, variant) -> PIL image
+    """
+    img = Image.open(io.BytesIO(data))
+    if draft:
+        img.draft('RGB', (max(sizes), max(sizes)))
+    img = img.convert('RGB')
+
+    out = {}
+    for size in sizes:
+        resized = img.resize((size, size), Image.LANCZOS)
+        if PLAIN in variants:
+            out[(size, PLAIN)] = resized
+        if MASKED in variants:
+            masked = resized.copy() if PLAIN in variants else resized
+            masked.paste(masks[size], (0, 0), mask=masks[size])  # RGBA: pasted where the mask is opaque
+            out[(size, MASKED)] = masked
+    return out
+
+
+def output_name(output_dir, size, variant, stem=None):
+    name = str(size) + ('_masked' if variant == MASKED else '')
+    path = os.path.join(output_dir, name)
+    return path if stem is None else os.path.join(path, stem + '.tar')
+
+
+def _encode(img, quality):
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class _TarWriters(object):
+    def __init__(self, output_dir, stem, keys):
+        self.paths = dict((key, output_name(output_dir, key[0], key[1], stem)) for key in keys)
+        self.archives = {}
+        self.members = dict((key, ([], [], [])) for key in keys)
+        for key, path in self.paths.items():
+            if not os.path.exists(os.path.dirname(path)):
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    pass  # created by another worker
+            self.archives[key] = tarfile.open(path + '.tmp', 'w')
+
+    def write(self, key, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        archive = self.archives[key]
+        archive.addfile(info, io.BytesIO(data))
+        # member offset index (archive_store.py): the data blocks end at the current archive offset
+        blocks = (len(data) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE
+        names, offsets, sizes = self.members[key]
+        names.append(name)
+        offsets.append(archive.offset - blocks * tarfile.BLOCKSIZE)
+        sizes.append(len(data))
+
+    def close(self, complete=True):
+        for key, archive in self.archives.items():
+            archive.close()
+            if complete:
+                os.rename(self.paths[key] + '.tmp', self.paths[key])
+                archive_store.write_index(self.paths[key], *self.members[key])
+
+
+class _DirWriters(object):
+    def __init__(self, output_dir, stem, keys):
+        # a single output goes directly to output_dir (layout of downsample.py)
+        self.dirs = dict((key, output_dir if len(keys) == 1 else output_name(output_dir, key[0], key[1]))
+                         for key in keys)
+
+    def write(self, key, name, data):
+        path = os.path.join(self.dirs[key], name.lstrip('./'))
+        if not os.path.exists(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def close(self, complete=True):
+        pass
+
+
+def process_archive(args):
+    """Worker: streams one archive and writes all sizes and variants, returns the number of images"""
+    path, output_dir, sizes, variants, sky_mask_path, draft, output, quality = args
+    stem = archive_stem(os.path.basename(path))
+    keys = [(size, variant) for size in sizes for variant in variants]
+
+    if output == 'tar' and all(os.path.exists(output_name(output_dir, s, v, stem)) for s, v in keys):
+        print(path, "already processed")
+        return 0
+
+    masks = prepare_masks(Image.open(sky_mask_path), sizes) if MASKED in variants else None
+    writers = (_TarWriters if output == 'tar' else _DirWriters)(output_dir, stem, keys)
+    count = 0
+    try:
+        for name, data in iter_tar_images(path):
+            try:
+                images = transform_image(data, sizes, variants, masks, draft)
+            except (IOError, OSError, ValueError) as e:
+                print("Error processing " + name, e)
+                continue
+            for key, img in images.items():
+                writers.write(key, name, _encode(img, quality))
+            count += 1
+    except BaseException:
+        writers.close(complete=False)
+        raise
+    writers.close()
+    print(path, count, "images")
+    return count
+
+
+def downsample_archives(input_dir, sizes, output_dir, variants=(PLAIN,), sky_mask_path=None, draft=False,
+                        output='tar', workers=6, quality=90):
+    """
+    Processes all archives of input_dir in a pool of workers
+    :param sizes: list of target sizes (square images)
+    :param variants: PLAIN and/or MASKED (MASKED needs sky_mask_path)
+    :param output: 'tar' (one archive per input archive, size and variant) or 'dir' (single files)
+    :return: total number of images
+    """
+    if MASKED in variants and sky_mask_path is None:
+        raise ValueError("Masked variants need a sky mask")
+    tasks = [(os.path.join(input_dir, item), output_dir, list(sizes), tuple(variants), sky_mask_path, draft, output,
+              quality) for item in sorted(os.listdir(input_dir)) if check_file_type(item)]
+
+    if workers == 1 or len(tasks) <= 1:
+        return sum(process_archive(t) for t in tasks)
+    pool = Pool(workers)
+    try:
+        return sum(pool.imap_unordered(process_archive, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_dir", help="folder with the image archives")
+    parser.add_argument("sizes", help="comma separated image sizes, f.e. 128,256")
+    parser.add_argument("output_dir")
+    parser.add_argument("--mask", default=None, help="sky mask png for the masked variants")
+    parser.add_argument("--masked", default="no", choices=["no", "only", "both"])
+    parser.add_argument("--draft", action="store_true", help="reduced size JPEG decoding")
+    parser.add_argument("--output", default="tar", choices=["tar", "dir"])
+    parser.add_argument("--workers", type=int, default=6)
+    args = parser.parse_args()
+
+    variants = {"no": (PLAIN,), "only": (MASKED,), "both": (PLAIN, MASKED)}[args.masked]
+    total = downsample_archives(args.input_dir.rstrip('/'), [int(s) for s in args.sizes.split(',')],
+                                args.output_dir.rstrip('/'), variants=variants, sky_mask_path=args.mask,
+                                draft=args.draft, output=args.output, workers=args.workers)
+    print("Total = " + str(total))
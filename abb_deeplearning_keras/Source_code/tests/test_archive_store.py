@@ -0,0 +1,132 @@
+import io
+import os
+import pickle
+import sys
+import tarfile
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archive_store
+
+
+def _write_archive(path, files, mode):
+    with tarfile.open(path, mode) as archive:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('extension, mode', [('.tar', 'w'), ('.tar.gz', 'w:gz')])
+def test_open_reader(extension, mode):
+    files = [('2015_07_16/b.jpeg', b'bb'), ('2015_07_16/a.jpeg', b'a' * 1000)]
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, '2015_07_16' + extension)
+        _write_archive(path, files, mode)
+
+        reader = archive_store.open_reader(path)
+        try:
+            assert reader.names() == [name for name, _ in files]
+            assert '2015_07_16/a.jpeg' in reader
+            for name, data in files:
+                assert reader.read(name) == data
+        finally:
+            reader.close()
+        # the member index is only kept next to uncompressed archives
+        assert os.path.isfile(archive_store.index_path(path)) == (extension == '.tar')
+
+
+def _day_archive(root, files=(('2015_07_16/a.jpeg', b'a' * 1000), ('2015_07_16/b.jpeg', b'bb'))):
+    path = os.path.join(root, '2015_07_16.tar')
+    _write_archive(path, files, 'w')
+    return path
+
+
+def test_image_store_reads_members_by_path():
+    with tempfile.TemporaryDirectory() as td:
+        _day_archive(td)
+        store = archive_store.ArchiveImageStore(td)
+        try:
+            path = os.path.join(td, '2015_07_16', 'a.jpeg')
+            assert store.exists(path)
+            assert store.read(path) == b'a' * 1000
+            assert store.open(os.path.join(td, '2015_07_16', 'b.jpeg')).read() == b'bb'
+            assert store.listdir('2015_07_16') == ['a.jpeg', 'b.jpeg']
+            assert store.build_indexes() == ['2015_07_16']
+
+            missing = os.path.join(td, '2015_07_16', 'c.jpeg')
+            assert not store.exists(missing)
+            assert not store.exists(os.path.join(td, '2015_07_17', 'a.jpeg'))
+            with pytest.raises(IOError):
+                store.read(missing)
+        finally:
+            store.close()
+
+
+def test_image_store_members_without_folder():
+    with tempfile.TemporaryDirectory() as td:
+        _day_archive(td, files=[('./a.jpeg', b'aa')])
+        store = archive_store.ArchiveImageStore(td)
+        assert store.read(os.path.join(td, '2015_07_16', 'a.jpeg')) == b'aa'
+        store.close()
+
+
+def test_image_store_prefers_files_on_disk():
+    with tempfile.TemporaryDirectory() as td:
+        _day_archive(td)
+        # an extracted day folder without archive and an extracted file next to the archive
+        os.makedirs(os.path.join(td, '2015_07_17'))
+        with open(os.path.join(td, '2015_07_17', 'x.jpeg'), 'wb') as f:
+            f.write(b'xx')
+        os.makedirs(os.path.join(td, '2015_07_16'))
+        with open(os.path.join(td, '2015_07_16', 'b.jpeg'), 'wb') as f:
+            f.write(b'on disk')
+
+        store = archive_store.ArchiveImageStore(td)
+        assert store.read(os.path.join(td, '2015_07_17', 'x.jpeg')) == b'xx'
+        assert store.listdir('2015_07_17') == ['x.jpeg']
+        assert store.read(os.path.join(td, '2015_07_16', 'b.jpeg')) == b'on disk'
+        assert store.read(os.path.join(td, '2015_07_16', 'a.jpeg')) == b'a' * 1000
+        store.close()
+
+
+def test_stale_index_is_rebuilt():
+    with tempfile.TemporaryDirectory() as td:
+        path = _day_archive(td)
+        assert set(archive_store.load_index(path)) == {'2015_07_16/a.jpeg', '2015_07_16/b.jpeg'}
+
+        _write_archive(path, [('2015_07_16/c.jpeg', b'ccc')], 'w')
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        reader = archive_store.ArchiveReader(path)
+        assert reader.names() == ['2015_07_16/c.jpeg']
+        assert reader.read('2015_07_16/c.jpeg') == b'ccc'
+        reader.close()
+
+        with np.load(archive_store.index_path(path)) as data:
+            assert data['names'].tolist() == ['2015_07_16/c.jpeg']
+
+
+def test_reader_after_pickling():
+    with tempfile.TemporaryDirectory() as td:
+        path = _day_archive(td)
+        reader = archive_store.ArchiveReader(path)
+        assert reader.read('2015_07_16/b.jpeg') == b'bb'
+
+        copy = pickle.loads(pickle.dumps(reader))
+        assert copy._fd is None
+        assert copy.read('2015_07_16/a.jpeg') == b'a' * 1000
+        # the copy has its own file descriptor
+        reader.close()
+        assert copy.read('2015_07_16/b.jpeg') == b'bb'
+        copy.close()
+
+        store = archive_store.ArchiveImageStore(td)
+        store.read(os.path.join(td, '2015_07_16', 'a.jpeg'))
+        store = pickle.loads(pickle.dumps(store))
+        assert store.read(os.path.join(td, '2015_07_16', 'b.jpeg')) == b'bb'
+        store.close()
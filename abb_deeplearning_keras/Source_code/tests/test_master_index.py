@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+import tarfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import master_index as mi
+
+
+def test_ms_join_matches_old_searchsorted():
+    logs = pd.DataFrame({'irradiation_hs': [1.0, 2.0, 3.0]},
+                        index=pd.DatetimeIndex(['2015-08-01 10:00:00', '2015-08-01 10:00:10',
+                                                '2015-08-01 10:00:20']))
+    images = pd.DataFrame({'folder': 'f', 'name': ['a', 'b', 'c', 'd']},
+                          index=pd.DatetimeIndex(['2015-08-01 10:00:01', '2015-08-01 10:00:10',
+                                                  '2015-08-01 10:00:19', '2015-08-01 10:00:21']))
+    settings = mi.STATIONS['MS']
+    joined = mi.join_nearest(images, logs, settings['direction'], settings['tolerance'])
+
+    # metadata_index.find_nearest_timestamp: logs.index[logs.index.searchsorted(date)], images after the last log
+    # entry have no match
+    old = logs.index[logs.index.searchsorted(images.index[:3])]
+    assert list(joined['name']) == ['a', 'b', 'c']
+    assert list(joined[mi.NEAREST_TIME_COLUMN]) == list(old)
+    assert np.allclose(joined['irradiation_hs'].values, [2.0, 2.0, 3.0])
+
+
+def test_update_skips_folders(tmp_path):
+    archive_dir = tmp_path / 'archives'
+    (archive_dir / '2015_08_02').mkdir(parents=True)
+    (archive_dir / '2015_08_02' / '2015_08_02_10_00_05_Debevec.jpeg').write_bytes(b'x')
+    with tarfile.open(str(archive_dir / '2015_08_01.tar'), 'w') as archive:
+        for name in ['2015_08_01_10_00_05_Debevec.jpeg', '2015_08_01_10_00_15_Debevec.jpeg']:
+            info = tarfile.TarInfo('2015_08_01/' + name)
+            info.size = 1
+            archive.addfile(info, io.BytesIO(b'x'))
+
+    logs = pd.DataFrame({'irradiation_hs': [1.0, 2.0]},
+                        index=pd.DatetimeIndex(['2015-08-01 10:00:10', '2015-08-01 10:00:20']))
+    index = mi.MasterIndex(str(tmp_path / 'index'))
+    assert index.update(str(archive_dir), logs, station='MS') == ['2015_08_01']
+    # the member index written next to the archive is not indexed as archive on the next update
+    assert os.path.isfile(str(archive_dir / '2015_08_01.tar.index.npz'))
+    assert index.update(str(archive_dir), logs, station='MS', overwrite=True) == ['2015_08_01']
+
+    df = index.read()
+    assert list(df['name']) == ['2015_08_01_10_00_05_Debevec.jpeg', '2015_08_01_10_00_15_Debevec.jpeg']
+    assert np.allclose(df['irradiation_hs'].values, [1.0, 2.0])
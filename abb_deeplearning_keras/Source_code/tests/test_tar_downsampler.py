@@ -0,0 +1,56 @@
+import io
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tar_downsampler as td
+
+
+def _sky_mask(size):
+    # like mask_cleanup.py: opaque black outside the sky, transparent white sky (circle)
+    y, x = np.mgrid[:size, :size]
+    sky = (x - size / 2.0) ** 2 + (y - size / 2.0) ** 2 < (size / 3.0) ** 2
+    mask = np.zeros((size, size, 4), dtype=np.uint8)
+    mask[sky] = (255, 255, 255, 0)
+    mask[~sky] = (0, 0, 0, 255)
+    return Image.fromarray(mask, 'RGBA'), sky
+
+
+def _jpeg(size, value=120):
+    buf = io.BytesIO()
+    Image.fromarray(np.full((size, size, 3), value, dtype=np.uint8)).save(buf, 'JPEG', quality=95)
+    return buf.getvalue()
+
+
+def test_masked_matches_old_paste():
+    size = 32
+    mask, sky = _sky_mask(size)
+    data = _jpeg(64)
+
+    # mask_on_downsample.py before the streaming downsampler
+    old = Image.open(io.BytesIO(data)).resize((size, size), Image.LANCZOS)
+    old.paste(mask, (0, 0), mask=mask)
+
+    out = td.transform_image(data, [size], (td.PLAIN, td.MASKED), td.prepare_masks(mask, [size]))
+    new = np.asarray(out[(size, td.MASKED)])
+    assert np.array_equal(new, np.asarray(old))
+    assert np.all(new[~sky] == 0)
+    assert np.all(np.abs(new[sky].astype(int) - 120) <= 2)
+    # the plain variant is not masked
+    assert np.all(np.abs(np.asarray(out[(size, td.PLAIN)]).astype(int) - 120) <= 2)
+
+
+def test_mask_resized_to_every_size():
+    mask, _ = _sky_mask(64)
+    masks = td.prepare_masks(mask, [16, 64])
+    assert masks[16].size == (16, 16) and masks[16].mode == 'RGBA'
+    assert masks[64].size == (64, 64)
+
+    out = td.transform_image(_jpeg(64), [16], (td.MASKED,), masks)
+    masked = np.asarray(out[(16, td.MASKED)])
+    assert masked[0, 0].tolist() == [0, 0, 0]
+    assert np.all(np.abs(masked[8, 8].astype(int) - 120) <= 2)
@@ -11,13 +11,15 @@ from scipy import misc
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_constants as ac
 from scipy import ndimage
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_read_pipeline as arp
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_episode_index as aei
 import pickle
 
 
 class Environment():
     def __init__(self, train_set_path, test_set_path, solar_station=ac.ABB_Solarstation.C, image_size=84,
                  sequence_length=2, sequence_stride=9, actions=7, max_ramp_per_m=100, episode_length_train=None,episode_length_test=None,
-                 action_space=1, file="rl_data.csv",load_train_episodes=None,load_test_episodes=None,mask_path=None,divide_image_values=None,sample_training_episodes=None,exploration_follow="IRR",start_exploration_deviation=100,reward_type=1):
+                 action_space=1, file="rl_data.csv",load_train_episodes=None,load_test_episodes=None,mask_path=None,divide_image_values=None,sample_training_episodes=None,exploration_follow="IRR",start_exploration_deviation=100,reward_type=1,
+                 train_episode_index=None,index_max_reward=None,index_percentile=None,curriculum_alpha=None):
         self.actions = actions
         self.sequence_length = sequence_length
         self.sequence_stride = sequence_stride
@@ -34,6 +36,12 @@ class Environment():
         self.start_exploration_deviation = start_exploration_deviation
         self.exploration_follow=exploration_follow
         self.reward_type = reward_type
+        self.train_episode_index = train_episode_index
+        self.index_max_reward = index_max_reward
+        self.index_percentile = index_percentile
+        self.curriculum_alpha = curriculum_alpha
+        self.episode_store = None
+        self.train_episode_weights = None
 
         if self.mask_path:
             self.mask=misc.imread(self.mask_path)==0 #255 and 0 values
@@ -92,9 +100,18 @@ class Environment():
             # When all trianing episodes have been sampled at least once, renew the list, start again
             self.temp_train_episodes = list(self.train_episodes)
         print("Sampling episode...")
-        # Sample a random episode from the train_episodes list, delete it from list so that it is not sampled in this epoch again
-        self.current_episode_train = self.temp_train_episodes.pop(
-            random.randrange(len(self.temp_train_episodes)))  # sample episode and remove from temporary list
+        if self.train_episode_weights is not None:
+            # Curriculum: sample episodes of the hard episode index with probability depending on their difficulty
+            episode = self.train_episodes[np.random.choice(len(self.train_episodes), p=self.train_episode_weights)]
+        else:
+            # Sample a random episode from the train_episodes list, delete it from list so that it is not sampled in this epoch again
+            episode = self.temp_train_episodes.pop(
+                random.randrange(len(self.temp_train_episodes)))  # sample episode and remove from temporary list
+
+        if self.episode_store is not None:
+            # episodes of the index are (start, stop) positions in the episode store, only the sampled one is copied
+            episode = aei.episode_from_store(self.episode_store, episode[0], episode[1])
+        self.current_episode_train = episode
 
         print("Episode (from/to): ", str(self.current_episode_train.index[0]),
               str(self.current_episode_train.index[-1]))
@@ -601,7 +618,17 @@ class Environment():
         test_episodes = list()
 
 
-        if self.load_train_episodes:
+        if self.train_episode_index:
+            print("reading hard episode index " + str(self.train_episode_index))
+            self.episode_store = rl_pd.sort_index()
+            index_df = aei.select_episodes(aei.read_episode_index(self.train_episode_index),
+                                           max_reward=self.index_max_reward, percentile=self.index_percentile)
+            starts, stops = aei.episode_slices(self.episode_store, index_df)
+            train_episodes = list(zip(starts, stops))
+            if self.curriculum_alpha is not None:
+                self.train_episode_weights = aei.difficulty_weights(index_df, alpha=self.curriculum_alpha)
+
+        elif self.load_train_episodes:
             with open(self.load_train_episodes,'rb') as f:
                 train_episodes = pickle.load(f)
 
@@ -654,7 +681,10 @@ class Environment():
 
 
         if self.sample_training_episodes:
-            train_episodes = np.random.choice(train_episodes,size=self.sample_training_episodes)
+            sample = np.random.choice(len(train_episodes),size=self.sample_training_episodes)
+            train_episodes = [train_episodes[i] for i in sample]
+            if self.train_episode_weights is not None:
+                self.train_episode_weights = self.train_episode_weights[sample]/np.sum(self.train_episode_weights[sample])
 
 
         return train_episodes, test_episodes
@@ -7,6 +7,7 @@ from experience_replay_buffer import ExperienceReplayBuffer
 import numpy as np
 import time
 import rl_logging
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_episode_index as aei
 import collections
 slim = tf.contrib.slim
 from scipy import misc
@@ -177,13 +178,9 @@ tf.app.flags.DEFINE_integer(
 # Logging and Checkpoints
 ################################
 
-tf.app.flags.DEFINE_float(
-    'low_reward_t', -100,
-    'threshold for logging low reward episodes (high error)')
-
 tf.app.flags.DEFINE_string(
-    'low_reward_output_name', 'low_reward_episodes200.pickle',
-    'threshold for logging low reward episodes (high error)')
+    'episode_index_name', 'hard_episodes.csv',
+    'Hard episode index in eval_dir, one row per episode (reward, error quantiles), None to disable')
 
 
 tf.app.flags.DEFINE_integer(
@@ -231,7 +228,11 @@ def do_validation_run(sess, network, env, train_writer, step, output_path):
     total_episodes_q_value_list = list()
     total_chosen_action_list = list()
     control_input_df_list = list()
-    low_reward_episodes = list()
+
+    if FLAGS.episode_index_name:
+        episode_index = aei.EpisodeIndexWriter(os.path.join(output_path, FLAGS.episode_index_name))
+    else:
+        episode_index = None
 
     for episode_nr in range(nr_validation_episodes):
         print("Validation Episode " + str(episode_nr + 1) + "/" + str(nr_validation_episodes))
@@ -286,10 +287,9 @@ def do_validation_run(sess, network, env, train_writer, step, output_path):
             total_episodes_q_value_list.append(episode_q_value_sum / episode_steps)
 
 
-            if FLAGS.low_reward_t is not None:
-                if episode_reward_sum < FLAGS.low_reward_t:
-                    print("Adding episode to low reward list...")
-                    low_reward_episodes.append(env.current_testing_episode)
+            if episode_index is not None:
+                episode_index.add_episode(env.current_test_episode, env.current_test_control_inputs,
+                                          episode_reward_list)
 
 
             episode_action_counter = collections.Counter(episode_chosen_action_list)
@@ -326,12 +326,8 @@ def do_validation_run(sess, network, env, train_writer, step, output_path):
                                action_counter=action_counter,
                                set="validation_epoch", write_path=output_path)
 
-
-    if low_reward_episodes and FLAGS.low_reward_t:
-        print("Creating serialized low reward episodes list...")
-        lr_path = os.path.join(FLAGS.eval_dir,FLAGS.low_reward_output_name)
-        with open(lr_path,'wb') as f:
-            pickle.dump(low_reward_episodes,f)
+    if episode_index is not None:
+        episode_index.close()
 
 
 #######################################################################################################################
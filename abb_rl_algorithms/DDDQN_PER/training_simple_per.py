@@ -81,6 +81,23 @@ tf.app.flags.DEFINE_string(
 
 # "/home/dladmin/Documents/arthurma/rf/low_reward_episodes200.pickle"
 
+tf.app.flags.DEFINE_string(
+    'train_episode_index',
+    None,
+    'Hard episode index (csv written by testing_simple.py), used instead of load_train_episodes')
+
+tf.app.flags.DEFINE_float(
+    'index_max_reward', None,
+    'Only train on indexed episodes with reward sum <= index_max_reward')
+
+tf.app.flags.DEFINE_float(
+    'index_percentile', None,
+    'Only train on the given percentile of indexed episodes with lowest reward sum')
+
+tf.app.flags.DEFINE_float(
+    'curriculum_alpha', None,
+    'Sample indexed episodes with p ~ (1/difficulty rank)^alpha, None: uniform, every episode once per epoch')
+
 tf.app.flags.DEFINE_string(
     'load_test_episodes',
     None,
@@ -507,7 +524,9 @@ def main(_):
                           divide_image_values=FLAGS.divide_image_values,
                           sample_training_episodes=FLAGS.sample_train_episodes,
                           exploration_follow=FLAGS.exploration_follow, start_exploration_deviation=FLAGS.start_exploration_deviation,
-                          reward_type = FLAGS.reward_type)
+                          reward_type = FLAGS.reward_type,
+                          train_episode_index=FLAGS.train_episode_index, index_max_reward=FLAGS.index_max_reward,
+                          index_percentile=FLAGS.index_percentile, curriculum_alpha=FLAGS.curriculum_alpha)
 
         mainQN = Qnetwork(environment=env, stream_hidden_layer_size=FLAGS.stream_hidden_layer_size,
                           img_size=FLAGS.img_size,
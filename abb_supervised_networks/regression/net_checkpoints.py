@@ -0,0 +1,166 @@
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+"""
+Checkpoint helpers for the regression networks: cached variable maps for (optimistic) restores, averaging of
+exponential moving average (EMA) or last-k checkpoint weights and export/import of frozen inference graphs.
+A frozen graph contains the weights as constants, loading it does not need network construction or a Saver.
+"""
+
+FROZEN_INPUT_IMAGES = 'input_images'
+FROZEN_INPUT_LABELS = 'input_labels'
+FROZEN_PREDICTIONS = 'predictions'
+
+_variable_map_cache = dict()
+_frozen_graph_cache = dict()
+
+
+def _checkpoint_stamp(checkpoint_path):
+    # modification time of the checkpoint index (V2) or data file (V1), changes if the checkpoint is overwritten
+    for suffix in ['.index', '']:
+        if os.path.exists(checkpoint_path + suffix):
+            return os.path.getmtime(checkpoint_path + suffix)
+    return None
+
+
+def checkpoint_variable_map(checkpoint_path):
+    """
+    Variable name to shape map of a checkpoint. The map is memoised per process and stored next to the checkpoint
+    (<checkpoint>.varmap.json), so the checkpoint is only scanned once.
+    :param checkpoint_path: path prefix of checkpoint (e.g. train_dir/-44646)
+    :return: dict variable name -> shape list
+    """
+    stamp = _checkpoint_stamp(checkpoint_path)
+    key = (checkpoint_path, stamp)
+    if key in _variable_map_cache:
+        return _variable_map_cache[key]
+
+    map_path = checkpoint_path + '.varmap.json'
+    variable_map = None
+    if stamp is not None and os.path.exists(map_path):
+        try:
+            with open(map_path) as f:
+                stored = json.load(f)
+            if stored['stamp'] == stamp:
+                variable_map = stored['shapes']
+        except (ValueError, KeyError):
+            variable_map = None
+
+    if variable_map is None:
+        reader = tf.train.NewCheckpointReader(checkpoint_path)
+        variable_map = {name: list(shape) for name, shape in reader.get_variable_to_shape_map().items()}
+        if stamp is not None:
+            try:
+                with open(map_path, 'w') as f:
+                    json.dump({'stamp': stamp, 'shapes': variable_map}, f)
+            except IOError:
+                pass  # read only checkpoint directory, in-process cache is still used
+
+    _variable_map_cache[key] = variable_map
+    return variable_map
+
+
+def restorable_variables(checkpoint_path, variables=None):
+    """
+    Variables of the current graph that are available in the checkpoint with the same shape
+    :param variables: candidate variables, all global variables if None
+    :return: list of variables
+    """
+    if variables is None:
+        variables = tf.global_variables()
+    saved_shapes = checkpoint_variable_map(checkpoint_path)
+    return [var for var in variables if var.op.name in saved_shapes and
+            var.get_shape().as_list() == saved_shapes[var.op.name]]
+
+
+def optimistic_restore(session, save_file, max_to_keep=5):
+    # only restores variables that are available in checkpoint file, normally this results in an error
+    restore_vars = restorable_variables(save_file)
+    print("Saved in checkpoint:", len(checkpoint_variable_map(save_file)))
+    print("Restored from checkpoint:", len(restore_vars))
+    saver = tf.train.Saver(restore_vars, max_to_keep=max_to_keep)
+    saver.restore(session, save_file)
+
+
+def last_checkpoint_paths(checkpoint_dir, k):
+    """
+    :param checkpoint_dir: directory with "checkpoint" state file (train_dir)
+    :param k: number of newest checkpoints
+    :return: paths of the k newest checkpoints, oldest first
+    """
+    state = tf.train.get_checkpoint_state(checkpoint_dir)
+    if state is None or not state.all_model_checkpoint_paths:
+        raise ValueError("No checkpoints found in " + str(checkpoint_dir))
+    return list(state.all_model_checkpoint_paths)[-k:]
+
+
+def averaged_checkpoint_weights(checkpoint_paths, name_map):
+    """
+    Average of variables over several checkpoints (last-k averaging). Non float variables (e.g. global_step)
+    are taken from the newest checkpoint.
+    :param checkpoint_paths: list of checkpoint paths, newest last
+    :param name_map: dict graph variable name -> variable name in checkpoint (e.g. EMA shadow name)
+    :return: dict graph variable name -> numpy array
+    """
+    weights = dict()
+    for i, path in enumerate(checkpoint_paths):
+        reader = tf.train.NewCheckpointReader(path)
+        for var_name, ckpt_name in name_map.items():
+            value = reader.get_tensor(ckpt_name)
+            if not np.issubdtype(value.dtype, np.floating):
+                weights[var_name] = value
+            elif i == 0:
+                weights[var_name] = value.astype(np.float64)
+            else:
+                weights[var_name] += value
+
+    for var_name, value in weights.items():
+        if np.issubdtype(value.dtype, np.floating):
+            weights[var_name] = (value / len(checkpoint_paths)).astype(np.float32)
+    return weights
+
+
+def export_frozen_graph(session, output_path, predictions, weights=None):
+    """
+    Writes the graph of the current session with all variables converted to constants.
+    The graph needs placeholders named FROZEN_INPUT_IMAGES and FROZEN_INPUT_LABELS.
+    :param predictions: prediction tensor, exported as FROZEN_PREDICTIONS
+    :param weights: optional dict variable name -> value (averaged weights) that is loaded before freezing
+    """
+    predictions = tf.identity(predictions, name=FROZEN_PREDICTIONS)
+    if weights:
+        name2var = {var.op.name: var for var in tf.global_variables()}
+        for name, value in weights.items():
+            name2var[name].load(value, session)
+
+    frozen_graph_def = tf.graph_util.convert_variables_to_constants(session, session.graph.as_graph_def(),
+                                                                    [predictions.op.name])
+    with tf.gfile.GFile(output_path, 'wb') as f:
+        f.write(frozen_graph_def.SerializeToString())
+    print("Exported frozen graph:", output_path, len(frozen_graph_def.node), "nodes")
+
+
+def load_frozen_graph_def(frozen_graph_path):
+    # parsed graph defs are memoised, importing the same model several times in one process is cheap
+    if frozen_graph_path not in _frozen_graph_cache:
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(frozen_graph_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        _frozen_graph_cache[frozen_graph_path] = graph_def
+    return _frozen_graph_cache[frozen_graph_path]
+
+
+def import_frozen_predictions(frozen_graph_path, images, labels, name='frozen_model'):
+    """
+    Imports a frozen graph into the default graph and connects it to the given input tensors (e.g. queue output)
+    :return: prediction tensor
+    """
+    graph_def = load_frozen_graph_def(frozen_graph_path)
+    predictions, = tf.import_graph_def(graph_def,
+                                       input_map={FROZEN_INPUT_IMAGES + ':0': images,
+                                                  FROZEN_INPUT_LABELS + ':0': labels},
+                                       return_elements=[FROZEN_PREDICTIONS + ':0'], name=name)
+    return predictions
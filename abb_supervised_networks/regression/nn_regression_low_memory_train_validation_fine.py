@@ -31,7 +31,9 @@ from abb_deeplearning.abb_neuralnet_helpers import weight_visualizer
 from net_input_layers import input_layer_factory
 from net_output_layers import output_layer_factory
 from net_network_layers import network_factory
+import net_checkpoints
 from shutil import copyfile
+from tensorflow.python.client import device_lib
 
 
 
@@ -87,6 +89,15 @@ tf.app.flags.DEFINE_float(
     'per_process_gpu_memory_fraction', 0.3,
     'fraction of gpu memory used for this process')
 
+tf.app.flags.DEFINE_integer(
+    'num_towers', 1,
+    'Data parallel training: replicates the network on this many devices, each tower gets train_batch_size/num_towers'
+    'samples and the gradients are averaged. 1 = single tower without device placement')
+
+tf.app.flags.DEFINE_string(
+    'tower_device_type', 'gpu',
+    'gpu: one tower per available gpu, cpu: one tower per cpu device (e.g. socket), variables are kept on the cpu')
+
 
 tf.app.flags.DEFINE_string(
     'train_dir', '/home/dladmin/Documents/arthurma/runs/default',
@@ -558,6 +569,41 @@ def custom_preprocessor(image):
     return image
 
 
+def get_available_gpus():
+    local_device_protos = device_lib.list_local_devices()
+    return [x.name for x in local_device_protos if x.device_type == 'GPU']
+
+
+def _get_tower_devices():
+    # returns one device per tower, None means no explicit device placement (single tower)
+    if FLAGS.num_towers <= 1:
+        return [None]
+
+    if FLAGS.train_batch_size % FLAGS.num_towers != 0:
+        raise ValueError("train_batch_size needs to be divisible by num_towers")
+
+    if FLAGS.tower_device_type == 'gpu':
+        gpus = get_available_gpus()
+        if len(gpus) < FLAGS.num_towers:
+            raise ValueError("Not enough gpus for num_towers, available: " + str(gpus))
+        return gpus[:FLAGS.num_towers]
+    elif FLAGS.tower_device_type == 'cpu':
+        return ['/cpu:' + str(i) for i in range(FLAGS.num_towers)]  # devices are created by device_count in session config
+    else:
+        raise ValueError("Illegal tower_device_type, only gpu or cpu possible")
+
+
+def _tower_device_setter(device, variable_device='/cpu:0'):
+    # places variables on one device (shared by all towers), all other ops on the tower device
+    def _assign(op):
+        node_def = op if isinstance(op, tf.NodeDef) else op.node_def
+        if node_def.op in ['Variable', 'VariableV2', 'VarHandleOp']:
+            return variable_device
+        return device
+
+    return _assign
+
+
 def _configure_learning_rate(automatic_learning_rate,num_samples_per_epoch, global_step):
     """Configures the learning rate.
     Args:
@@ -732,7 +778,8 @@ def _weight_image_summary(summaries, weights, scope=""):
     summaries.add(tf.summary.image(tensor=weight_image, name="weights"))
 
 
-def _calculate_total_loss(summaries):
+def _calculate_total_loss(summaries, scope=None):
+    # scope: only losses of this tower, the regularization losses are shared by all towers
     regularization_losses = tf.get_collection(tf.GraphKeys.REGULARIZATION_LOSSES)
     print('reg_losses: ', len(regularization_losses))
     loss_list = []
@@ -743,7 +790,7 @@ def _calculate_total_loss(summaries):
         loss_list.append(regularization_loss_acc)
         summaries.add(tf.summary.scalar(name="accumulated_regularization_loss", tensor=regularization_loss_acc))
 
-    losses = tf.get_collection(tf.GraphKeys.LOSSES)
+    losses = tf.get_collection(tf.GraphKeys.LOSSES, scope)
     if losses:
         losses_acc = tf.add_n(losses, name="accumulated_losses")
 
@@ -755,8 +802,29 @@ def _calculate_total_loss(summaries):
     return total_loss, regularization_losses, losses
 
 
-def update_gradients(update_ops, optimizer, total_loss, variables_to_train, global_step, summaries):
-    gradients = optimizer.compute_gradients(total_loss, variables_to_train)
+def _average_gradients(tower_gradients):
+    # tower_gradients: list of (gradient, variable) lists, one per tower. Variables are shared between the towers
+    average_gradients = []
+    for grads_and_vars in zip(*tower_gradients):
+        var = grads_and_vars[0][1]
+        grads = [g for g, _ in grads_and_vars if g is not None]
+        if not grads:
+            average_gradients.append((None, var))
+        elif len(grads) == 1:
+            average_gradients.append((grads[0], var))
+        else:
+            average_gradients.append((tf.reduce_mean(tf.stack(grads, axis=0), axis=0), var))
+    return average_gradients
+
+
+def update_gradients(update_ops, optimizer, total_loss, variables_to_train, global_step, summaries, tower_losses=None):
+    # tower_losses: total loss of each tower, gradients are computed on the device of each tower and averaged
+    if tower_losses is None:
+        gradients = optimizer.compute_gradients(total_loss, variables_to_train)
+    else:
+        tower_gradients = [optimizer.compute_gradients(tower_loss, variables_to_train, colocate_gradients_with_ops=True)
+                           for tower_loss in tower_losses]
+        gradients = _average_gradients(tower_gradients)
 
     for grad, var in gradients:
         if grad is not None:
@@ -779,23 +847,7 @@ def update_gradients(update_ops, optimizer, total_loss, variables_to_train, glob
 
 def optimistic_restore(session, save_file):
     # only restores variables that are available in checkpoint file, normally this results in an error
-    reader = tf.train.NewCheckpointReader(save_file)
-    saved_shapes = reader.get_variable_to_shape_map()
-    print("Saved in checkpoint:", len(saved_shapes))
-    var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables() if
-                        var.name.split(':')[0] in saved_shapes])
-
-    restore_vars = []
-    name2var = dict(zip(map(lambda x: x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-    with tf.variable_scope('', reuse=True):
-        for var_name, saved_var_name in var_names:
-            curr_var = name2var[saved_var_name]
-            var_shape = curr_var.get_shape().as_list()
-            if var_shape == saved_shapes[saved_var_name]:
-                restore_vars.append(curr_var)
-    print("Restored from checkpoint:", len(restore_vars))
-    saver = tf.train.Saver(restore_vars, max_to_keep=FLAGS.max_nr_checkpoints_saved)
-    saver.restore(session, save_file)
+    net_checkpoints.optimistic_restore(session, save_file, max_to_keep=FLAGS.max_nr_checkpoints_saved)
 
 
 def get_nr_of_samples_in_sets(training_data_paths, validation_data_paths):
@@ -1124,6 +1176,52 @@ def _configure_network(input_batch, labels, is_training):
 
 ########################################################################################
 
+def _tower_loss(images, labels, is_training, change_weight, same_weight):
+    # network and prediction loss of one tower (adds loss to the LOSSES collection in the current name scope)
+    predictions, end_points, first_layer_weights = _configure_network(images, labels, is_training)
+
+    #only if balance_weights option is set to True, otherwise both change_weight and same_weight are 1
+    loss_weights = _create_weight_tensor(labels, change_weight, same_weight, is_training) # default, creates loss weights of 1 if balancing is switched off
+
+    print("loss weights:",loss_weights.get_shape())
+
+    full_labels = labels
+
+    #Irradiance labels each 20 seconds"
+    if FLAGS.prediction_nr == 31:
+        labels = tf.reshape(full_labels[:, 1:32], (-1, 31))
+    elif FLAGS.prediction_nr == 11:
+        labels = tf.reshape(full_labels[:, 1:32:3], (-1, 11))
+    else:
+        raise ValueError("Illegal prediction_nr set, only 11 or 31 possible, set correct outputlayer!")
+
+    #each minute
+    #labels = tf.reshape(labels[:, 1:32:3], (-1, 11))
+
+    print('prediction_shape:', predictions.get_shape())
+    print('labels_shape: ', labels.get_shape())
+
+    ####################
+    # LOSS #
+    ####################
+
+    # loss = tf.losses.mean_squared_error(labels, predictions, scope="loss", weights=loss_weights)
+
+    if FLAGS.loss_function == 'abs':
+        loss = tf.losses.absolute_difference(labels, predictions, scope="loss", weights=loss_weights)
+
+    elif FLAGS.loss_function == 'abs_max':
+        loss = custom_abs_max_loss(labels, predictions, weights=loss_weights,max_loss_weight=FLAGS.abs_max_weight)
+
+    elif FLAGS.loss_function == 'mse':
+        loss = tf.losses.mean_squared_error(labels, predictions, scope="loss", weights=loss_weights)
+    else:
+        raise ValueError("Illegal loss function")
+    #loss = custom_abs_loss(labels, predictions, loss_weights)
+
+    return predictions, end_points, first_layer_weights, loss, loss_weights, labels, full_labels
+
+
 def _get_train_val_test_sets(day_list, train_size=0.6, validation_size=0.1, test_size=0.3, seed=1):
     size = len(day_list)
 
@@ -1292,72 +1390,68 @@ def main(_):
 
     is_training = tf.placeholder(tf.bool, shape=None, name="is_training")
 
-    q_selector = tf.cond(is_training,
-                         lambda: tf.constant(0),
-                         lambda: tf.constant(1))
-
-    q = tf.QueueBase.from_list(q_selector, [train_queue, validation_queue])
-
-    images, labels, paths = q.dequeue()
-
-    print("Image shape", images.get_shape())
-
-    ##############################################################
-    # END: INPUT PIPELINE#
-    ##############################################################
-
-
-
     global_step = slim.create_global_step()
 
-    ####################
-    # Define the network #
-    ####################
-    predictions, end_points, first_layer_weights = _configure_network(images,labels, is_training)
+    tower_devices = _get_tower_devices()
 
-    #only if balance_weights option is set to True, otherwise both change_weight and same_weight are 1
-    loss_weights = _create_weight_tensor(labels, change_weight, same_weight, is_training) # default, creates loss weights of 1 if balancing is switched off
+    if len(tower_devices) == 1:
+        q_selector = tf.cond(is_training,
+                             lambda: tf.constant(0),
+                             lambda: tf.constant(1))
 
+        q = tf.QueueBase.from_list(q_selector, [train_queue, validation_queue])
 
+        images, labels, paths = q.dequeue()
 
+        print("Image shape", images.get_shape())
 
-    print("loss weights:",loss_weights.get_shape())
+        ##############################################################
+        # END: INPUT PIPELINE#
+        ##############################################################
 
-    full_labels = labels
+        ####################
+        # Define the network #
+        ####################
+        predictions, end_points, first_layer_weights, loss, loss_weights, labels, full_labels = _tower_loss(
+            images, labels, is_training, change_weight, same_weight)
 
-    #Irradiance labels each 20 seconds"
-    if FLAGS.prediction_nr == 31:
-        labels = tf.reshape(full_labels[:, 1:32], (-1, 31))
-    elif FLAGS.prediction_nr == 11:
-        labels = tf.reshape(full_labels[:, 1:32:3], (-1, 11))
-    else:
-        raise ValueError("Illegal prediction_nr set, only 11 or 31 possible, set correct outputlayer!")
-
-    #each minute
-    #labels = tf.reshape(labels[:, 1:32:3], (-1, 11))
-
-    print('prediction_shape:', predictions.get_shape())
-    print('labels_shape: ', labels.get_shape())
+        val_loss_op, val_full_labels = loss, full_labels
+        tower_scopes, tower_losses = [None], None
 
-    ####################
-    # LOSS #
-    ####################
+    else:
+        # each train batch is split into num_towers shards, the validation runs on a separate tower on the first device
+        train_images, train_labels, paths = train_queue.dequeue()
+        image_shards = tf.split(train_images, len(tower_devices), axis=0)
+        label_shards = tf.split(train_labels, len(tower_devices), axis=0)
+
+        print("Image shape", train_images.get_shape(), "towers:", tower_devices)
+
+        tower_outputs = list()
+        tower_scopes = list()
+        with tf.variable_scope(tf.get_variable_scope()):
+            for i, device in enumerate(tower_devices):
+                with tf.device(_tower_device_setter(device)), tf.name_scope('tower_' + str(i)) as tower_scope:
+                    tower_outputs.append(_tower_loss(image_shards[i], label_shards[i], is_training,
+                                                     change_weight, same_weight))
+                    tower_scopes.append(tower_scope)
+                    tf.get_variable_scope().reuse_variables()  # all towers share the variables of the first
+
+            with tf.device(_tower_device_setter(tower_devices[0])), tf.name_scope('validation_tower'):
+                val_images, val_labels, _ = validation_queue.dequeue()
+                _, _, _, val_loss_op, _, _, val_full_labels = _tower_loss(val_images, val_labels, tf.constant(False),
+                                                                        change_weight, same_weight)
+
+        # summaries and visualizations use the first tower, batch outputs are concatenated over all towers
+        _, end_points, first_layer_weights, _, _, _, _ = tower_outputs[0]
+        images = image_shards[0]
+        predictions = tf.concat([t[0] for t in tower_outputs], axis=0)
+        loss = tf.reduce_mean(tf.stack([t[3] for t in tower_outputs]))
+        loss_weights = tf.concat([t[4] for t in tower_outputs], axis=0)
+        labels = tf.concat([t[5] for t in tower_outputs], axis=0)
+        full_labels = tf.concat([t[6] for t in tower_outputs], axis=0)
 
     print("label_shape:", labels.get_shape())
 
-    # loss = tf.losses.mean_squared_error(labels, predictions, scope="loss", weights=loss_weights)
-
-    if FLAGS.loss_function == 'abs':
-        loss = tf.losses.absolute_difference(labels, predictions, scope="loss", weights=loss_weights)
-
-    elif FLAGS.loss_function == 'abs_max':
-        loss = custom_abs_max_loss(labels, predictions, weights=loss_weights,max_loss_weight=FLAGS.abs_max_weight)
-
-    elif FLAGS.loss_function == 'mse':
-        loss = tf.losses.mean_squared_error(labels, predictions, scope="loss", weights=loss_weights)
-    else:
-        raise ValueError("Illegal loss function")
-    #loss = custom_abs_loss(labels, predictions, loss_weights)
     #############################
     # Initial TensorBoard summaries #
     #############################
@@ -1396,8 +1490,8 @@ def main(_):
     train_summaries.add(tf.summary.scalar('learning_rate', learning_rate))
 
     # Gather update_ops. These contain, for example,
-    # the updates for the batch_norm variables.
-    update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS)
+    # the updates for the batch_norm variables. Only the first tower updates the (shared) batch norm statistics
+    update_ops = tf.get_collection(tf.GraphKeys.UPDATE_OPS, tower_scopes[0])
 
 
 
@@ -1409,10 +1503,15 @@ def main(_):
     variables_to_train = _get_variables_to_train()
 
     # Losses, regularization + output loss
-    total_loss, regularization_losses, prediction_loss = _calculate_total_loss(train_summaries)
+    if len(tower_devices) == 1:
+        total_loss, regularization_losses, prediction_loss = _calculate_total_loss(train_summaries)
+    else:
+        tower_losses = [_calculate_total_loss(train_summaries if i == 0 else set(), scope)[0]
+                        for i, scope in enumerate(tower_scopes)]
+        total_loss = tf.reduce_mean(tf.stack(tower_losses), name="total_loss")
 
     train_step, gradients = update_gradients(update_ops, optimizer, total_loss, variables_to_train, global_step,
-                                             train_summaries)
+                                             train_summaries, tower_losses=tower_losses)
 
     # Merge all summaries together.
     total_train_loss_summary = tf.summary.scalar("total_train_loss", total_loss)
@@ -1434,9 +1533,12 @@ def main(_):
 
     if FLAGS.per_process_gpu_memory_fraction:
         gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=FLAGS.per_process_gpu_memory_fraction)
-        config = tf.ConfigProto(log_device_placement=False,gpu_options = gpu_options)
+        config = tf.ConfigProto(log_device_placement=False,gpu_options = gpu_options, allow_soft_placement=True)
     else:
-        config = tf.ConfigProto(log_device_placement=False)
+        config = tf.ConfigProto(log_device_placement=False, allow_soft_placement=True)
+
+    if FLAGS.num_towers > 1 and FLAGS.tower_device_type == 'cpu':
+        config.device_count['CPU'] = FLAGS.num_towers
     with tf.Session(config=config) as sess:
         sess.run(init_op)
         coord = tf.train.Coordinator()
@@ -1572,7 +1674,7 @@ def main(_):
                             ls, p, l, pa, vls = sess.run([loss, predictions, labels, paths, validation_loss_summary],
                                                      feed_dict={is_training: False})
                             """
-                            ls, fl = sess.run([loss,full_labels], feed_dict={is_training: False})
+                            ls, fl = sess.run([val_loss_op,val_full_labels], feed_dict={is_training: False})
                             val_loss += ls
                             val_step += 1
 
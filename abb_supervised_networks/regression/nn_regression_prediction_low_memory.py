@@ -221,7 +221,7 @@ tf.app.flags.DEFINE_integer(
     'capacity_batches_in_test_output_queue', 10,
     'capacity of the test output queue that contains raw images and label batches')
 
-tf.app.flags.DEFINE_integer('test_batch_size', 1, """Images in batch validation""")
+tf.app.flags.DEFINE_integer('test_batch_size', 64, """Images in batch validation, losses are computed per sample""")
 #######################
 # Model Flags #
 #######################
@@ -391,6 +391,27 @@ def custom_abs_max_loss(labels, predictions, weights=1.0,max_loss_weight=0.5):
         tf.add_to_collection(tf.GraphKeys.LOSSES, loss)
         return loss
 
+
+def per_sample_loss(labels, predictions, loss_function='abs', max_loss_weight=0.5):
+    """
+    Loss of each sample, only reduced over the predictions of a sample (not over the batch).
+    The batch mean equals the scalar loss of the corresponding loss function.
+    :param loss_function: abs, abs_max or mse
+    :return: tensor of shape batchsize
+    """
+    with tf.variable_scope("per_sample_loss"):
+        residuals = tf.subtract(labels, predictions, name="loss_subtraction")  # batchsize x 11
+        if loss_function == 'abs':
+            return tf.reduce_mean(tf.abs(residuals), axis=1)
+        elif loss_function == 'abs_max':
+            abs_residuals = tf.abs(residuals)
+            return (max_loss_weight) * tf.reduce_max(abs_residuals, axis=1) + \
+                   (1 - max_loss_weight) * tf.reduce_mean(abs_residuals, axis=1)
+        elif loss_function == 'mse':
+            return tf.reduce_mean(tf.square(residuals), axis=1)
+        else:
+            raise ValueError("Illegal loss function")
+
 ######################################################################################
 ##NETWORK
 ######################################################################################
@@ -609,7 +630,7 @@ def _get_train_val_test_sets(day_list, train_size=0.6, validation_size=0.1, test
     # this allows training/prediction on ordered data if needed (see flags)
 
 
-def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op, summary_op, path_op,eval_example_num):
+def eval_once(saver, summary_writer, loss_op, sample_loss_op, pred_op, label_op, full_label_op, summary_op, path_op,eval_example_num):
     #device_count = {'GPU': 0},
     gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.2)
     config = tf.ConfigProto(
@@ -635,7 +656,9 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
         threads = tf.train.start_queue_runners(coord=coord, daemon=True, start=True)
         try:
 
-            num_iter = int(eval_example_num) // int(FLAGS.test_batch_size)
+            # last batch may be partially filled with samples of the next epoch, they are cut off below
+            num_iter = int(math.ceil(int(eval_example_num) / float(FLAGS.test_batch_size)))
+            remaining_samples = int(eval_example_num)
 
             losses = list()
             step = 1
@@ -651,8 +674,13 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
             val_change_step_list = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 
             while step <= num_iter and not coord.should_stop():
-                l, la,fla, pre, pa = sess.run([loss_op, label_op, full_label_op,pred_op, path_op])
-                losses.append(l)
+                l, sl, la,fla, pre, pa = sess.run([loss_op, sample_loss_op, label_op, full_label_op,pred_op, path_op])
+
+                valid = min(remaining_samples, len(sl))
+                remaining_samples -= valid
+                sl, la, fla, pre, pa = sl[:valid], la[:valid], fla[:valid], pre[:valid], pa[:valid]
+
+                losses.extend(sl)
                 print("Eval iteration: " + str(step) + "/"+str(num_iter)+ ", step loss: ", l)
                 #print("label: " + str(la))
                 #print("pred: " + str(pre))
@@ -663,15 +691,12 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
                 data = np.concatenate((pre,la),axis= 1)
                 data_list.extend(data)
 
-                loss_batch = np.repeat(l,len(image_keys))
-                loss_list.extend(loss_batch)
+                loss_list.extend(sl)
 
-                if FLAGS.test_batch_size == 1:
-
-                    vc_change = int(fla[-1][-1])  # get C label
+                for vc_change, sample_loss in zip(fla[:, -1].astype(int), sl):  # get C label of each sample
 
                     if vc_change < 11 and vc_change >= 0:  # should always be the case given the labels above
-                        val_change_loss_list[vc_change] += l
+                        val_change_loss_list[vc_change] += sample_loss
                         val_change_step_list[vc_change] += 1
 
                 summary = tf.Summary()
@@ -681,11 +706,13 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
                 summary_writer.add_summary(summary, step)
 
                 if FLAGS.print_outlier:
-                    if FLAGS.print_outlier <= l:
-                        print(image_keys)
-                        print(data)
-                        bad_index_list.extend(image_keys)
-                        bad_data_list.extend(data)
+                    outlier = sl >= FLAGS.print_outlier
+                    if np.any(outlier):
+                        bad_keys = [key for key, is_outlier in zip(image_keys, outlier) if is_outlier]
+                        print(bad_keys)
+                        print(data[outlier])
+                        bad_index_list.extend(bad_keys)
+                        bad_data_list.extend(data[outlier])
 
 
                 step += 1
@@ -696,7 +723,7 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
                     mean_change_val_losses[i] = mean_vl
 
 
-            avg_loss = sum(losses) / step
+            avg_loss = np.mean(losses)
             med_loss = np.median(losses)
             std_loss = np.std(losses)
 
@@ -864,6 +891,9 @@ def main(_):
     else:
         raise ValueError("Illegal loss function")
 
+    sample_losses = per_sample_loss(labels, predictions, loss_function=FLAGS.loss_function,
+                                    max_loss_weight=FLAGS.abs_max_weight)
+
     #tf.add_to_collection(tf.GraphKeys.LOSSES, loss)
 
     #############################
@@ -886,7 +916,7 @@ def main(_):
     summary_writer = tf.summary.FileWriter(FLAGS.eval_dir)
 
     while True:
-        eval_once(saver, summary_writer, loss, predictions, labels,full_labels, summary_op, paths,eval_example_num)
+        eval_once(saver, summary_writer, loss, sample_losses, predictions, labels,full_labels, summary_op, paths,eval_example_num)
         if FLAGS.run_once:
             break
         time.sleep(FLAGS.eval_interval_secs)
@@ -26,6 +26,7 @@ from abb_deeplearning.abb_neuralnet_helpers import custom_preprocessing
 from net_input_layers import input_layer_factory
 from net_output_layers import output_layer_factory
 from net_network_layers import network_factory
+import net_checkpoints
 from abb_deeplearning.abb_data_pipeline.abb_clouddrl_read_pipeline import image_key_creator
 from shutil import copyfile
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_constants as ac
@@ -87,6 +88,19 @@ tf.app.flags.DEFINE_string(
     'Directory where event logs are written to.')
 
 
+tf.app.flags.DEFINE_string(
+    'frozen_graph_path', None,
+    'Use frozen inference graph (see export_frozen_graph) instead of building the network and restoring cpk_dir')
+
+tf.app.flags.DEFINE_string(
+    'export_frozen_graph', None,
+    'Export the weights of cpk_dir as frozen inference graph to this path and exit. Uses the moving averages if'
+    'moving_average_decay is set')
+
+tf.app.flags.DEFINE_integer(
+    'average_last_k_checkpoints', None,
+    'export_frozen_graph: average the weights of the k newest checkpoints in the directory of cpk_dir')
+
 tf.app.flags.DEFINE_bool(
     'run_once', True,
     'Only run once, can be useful to run several times if the training is done in parallel')
@@ -233,7 +247,7 @@ tf.app.flags.DEFINE_integer(
     'capacity_batches_in_test_output_queue', 20,
     'capacity of the test output queue that contains raw images and label batches')
 
-tf.app.flags.DEFINE_integer('test_batch_size', 1, """Images in batch validation""")
+tf.app.flags.DEFINE_integer('test_batch_size', 64, """Images in batch validation, losses are computed per sample""")
 #######################
 # Model Flags #
 #######################
@@ -425,6 +439,27 @@ def custom_abs_max_loss(labels, predictions, weights=1.0,max_loss_weight=0.5):
         tf.add_to_collection(tf.GraphKeys.LOSSES, loss)
         return loss
 
+
+def per_sample_loss(labels, predictions, loss_function='abs', max_loss_weight=0.5):
+    """
+    Loss of each sample, only reduced over the predictions of a sample (not over the batch).
+    The batch mean equals the scalar loss of the corresponding loss function.
+    :param loss_function: abs, abs_max or mse
+    :return: tensor of shape batchsize
+    """
+    with tf.variable_scope("per_sample_loss"):
+        residuals = tf.subtract(labels, predictions, name="loss_subtraction")  # batchsize x 11
+        if loss_function == 'abs':
+            return tf.reduce_mean(tf.abs(residuals), axis=1)
+        elif loss_function == 'abs_max':
+            abs_residuals = tf.abs(residuals)
+            return (max_loss_weight) * tf.reduce_max(abs_residuals, axis=1) + \
+                   (1 - max_loss_weight) * tf.reduce_mean(abs_residuals, axis=1)
+        elif loss_function == 'mse':
+            return tf.reduce_mean(tf.square(residuals), axis=1)
+        else:
+            raise ValueError("Illegal loss function")
+
 ######################################################################################
 ##NETWORK
 ######################################################################################
@@ -678,7 +713,7 @@ def _get_train_val_test_sets(day_list, train_size=0.6, validation_size=0.1, test
     # this allows training/prediction on ordered data if needed (see flags)
 
 
-def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op, summary_op, path_op,eval_example_num):
+def eval_once(saver, summary_writer, loss_op, sample_loss_op, pred_op, label_op, full_label_op, summary_op, path_op,eval_example_num):
     #device_count = {'GPU': 0},
     gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.2)
     config = tf.ConfigProto(
@@ -690,7 +725,9 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
         # SETUP
         print("Checkpoint folder:",FLAGS.cpk_dir)
 
-        if FLAGS.cpk_dir:
+        if saver is None:
+            print("Frozen graph:", FLAGS.frozen_graph_path)
+        elif FLAGS.cpk_dir:
             cpk_path = FLAGS.cpk_dir
             print("Checkpoint file:", cpk_path)
             saver.restore(sess, cpk_path)
@@ -704,7 +741,9 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
         threads = tf.train.start_queue_runners(coord=coord, daemon=True, start=True)
         try:
 
-            num_iter = int(eval_example_num) // int(FLAGS.test_batch_size)
+            # last batch may be partially filled with samples of the next epoch, they are cut off below
+            num_iter = int(math.ceil(int(eval_example_num) / float(FLAGS.test_batch_size)))
+            remaining_samples = int(eval_example_num)
 
             losses = list()
             step = 1
@@ -717,8 +756,13 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
 
 
             while step <= num_iter and not coord.should_stop():
-                l, la,fla, pre, pa = sess.run([loss_op, label_op, full_label_op,pred_op, path_op])
-                losses.append(l)
+                l, sl, la,fla, pre, pa = sess.run([loss_op, sample_loss_op, label_op, full_label_op,pred_op, path_op])
+
+                valid = min(remaining_samples, len(sl))
+                remaining_samples -= valid
+                sl, la, fla, pre, pa = sl[:valid], la[:valid], fla[:valid], pre[:valid], pa[:valid]
+
+                losses.extend(sl)
                 print("Eval iteration: " + str(step) + "/"+str(num_iter)+ ", step loss: ", l)
 
 
@@ -727,8 +771,7 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
                 data = np.concatenate((pre,la),axis= 1)
                 data_list.extend(data)
 
-                loss_batch = np.repeat(l,len(image_keys))
-                loss_list.extend(loss_batch)
+                loss_list.extend(sl)
 
 
 
@@ -739,18 +782,20 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
                 summary_writer.add_summary(summary, step)
 
                 if FLAGS.print_outlier:
-                    if FLAGS.print_outlier <= l:
-                        print(image_keys)
-                        print(data)
-                        bad_index_list.extend(image_keys)
-                        bad_data_list.extend(data)
+                    outlier = sl >= FLAGS.print_outlier
+                    if np.any(outlier):
+                        bad_keys = [key for key, is_outlier in zip(image_keys, outlier) if is_outlier]
+                        print(bad_keys)
+                        print(data[outlier])
+                        bad_index_list.extend(bad_keys)
+                        bad_data_list.extend(data[outlier])
 
 
                 step += 1
 
 
 
-            avg_loss = sum(losses) / step
+            avg_loss = np.mean(losses)
             med_loss = np.median(losses)
             std_loss = np.std(losses)
 
@@ -816,6 +861,36 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
         coord.join(threads, stop_grace_period_secs=10)
 
 
+def export_inference_graph():
+    # network with placeholder inputs, variables are replaced by the (averaged) checkpoint weights
+    image_num = FLAGS.image_num_per_sample - 1 if FLAGS.difference_images else FLAGS.image_num_per_sample
+    images = tf.placeholder(tf.float32, shape=(None, FLAGS.image_height_resize, FLAGS.image_width_resize,
+                                               FLAGS.image_channels * image_num),
+                            name=net_checkpoints.FROZEN_INPUT_IMAGES)
+    labels = tf.placeholder(tf.float32, shape=(None, len(label_key_list)), name=net_checkpoints.FROZEN_INPUT_LABELS)
+
+    predictions, _, _ = _configure_network(images, labels, tf.constant(False))
+
+    name_map = {var.op.name: var.op.name for var in tf.global_variables()}
+    if FLAGS.moving_average_decay:
+        variable_averages = tf.train.ExponentialMovingAverage(FLAGS.moving_average_decay)
+        for var in slim.get_model_variables():
+            name_map[var.op.name] = variable_averages.average_name(var)
+
+    if FLAGS.average_last_k_checkpoints:
+        checkpoint_paths = net_checkpoints.last_checkpoint_paths(os.path.dirname(FLAGS.cpk_dir),
+                                                                 FLAGS.average_last_k_checkpoints)
+    else:
+        checkpoint_paths = [FLAGS.cpk_dir]
+    print("Export weights of checkpoints:", checkpoint_paths)
+
+    weights = net_checkpoints.averaged_checkpoint_weights(checkpoint_paths, name_map)
+
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+        net_checkpoints.export_frozen_graph(sess, FLAGS.export_frozen_graph, predictions, weights)
+
+
 ######################################################################################
 ##MAIN
 ######################################################################################
@@ -823,6 +898,10 @@ def eval_once(saver, summary_writer, loss_op, pred_op, label_op, full_label_op,
 
 
 def main(_):
+    if FLAGS.export_frozen_graph:
+        export_inference_graph()
+        return
+
     print(get_available_cpus())
     print(get_available_gpus())
 
@@ -903,7 +982,10 @@ def main(_):
     ####################
     # Define the network #
     ####################
-    predictions, end_points, first_layer_weights = _configure_network(images,labels, tf.constant(False))
+    if FLAGS.frozen_graph_path:
+        predictions = net_checkpoints.import_frozen_predictions(FLAGS.frozen_graph_path, images, labels)
+    else:
+        predictions, end_points, first_layer_weights = _configure_network(images,labels, tf.constant(False))
 
     full_labels = labels
 
@@ -928,28 +1010,34 @@ def main(_):
     else:
         raise ValueError("Illegal loss function")
 
+    sample_losses = per_sample_loss(labels, predictions, loss_function=FLAGS.loss_function,
+                                    max_loss_weight=FLAGS.abs_max_weight)
+
 
     #############################
     # Initial TensorBoard summaries #
     #############################
 
-    if FLAGS.moving_average_decay:
-        variable_averages = tf.train.ExponentialMovingAverage(
-            FLAGS.moving_average_decay, tf_global_step)
-        variables_to_restore = variable_averages.variables_to_restore(
-            slim.get_model_variables())
-        variables_to_restore[tf_global_step.op.name] = tf_global_step
+    if FLAGS.frozen_graph_path:
+        saver = None  # weights are constants in the frozen graph
     else:
-        variables_to_restore = slim.get_variables_to_restore()
+        if FLAGS.moving_average_decay:
+            variable_averages = tf.train.ExponentialMovingAverage(
+                FLAGS.moving_average_decay, tf_global_step)
+            variables_to_restore = variable_averages.variables_to_restore(
+                slim.get_model_variables())
+            variables_to_restore[tf_global_step.op.name] = tf_global_step
+        else:
+            variables_to_restore = slim.get_variables_to_restore()
 
-    saver = tf.train.Saver(variables_to_restore)
+        saver = tf.train.Saver(variables_to_restore)
 
     summary_op = tf.summary.merge_all()
 
     summary_writer = tf.summary.FileWriter(FLAGS.eval_dir)
 
     while True:
-        eval_once(saver, summary_writer, loss, predictions, labels,full_labels, summary_op, paths,eval_example_num)
+        eval_once(saver, summary_writer, loss, sample_losses, predictions, labels,full_labels, summary_op, paths,eval_example_num)
         if FLAGS.run_once:
             break
         time.sleep(FLAGS.eval_interval_secs)
@@ -14,6 +14,7 @@ image_h=84
 image_w=84
 val_steps=12000
 epochs=25
+num_towers=1 # data parallel towers (gpus), train batch size is split between them
 
 
 for img_num in 2
@@ -37,7 +38,7 @@ do
 for optimizer in adam
 do
 python ${path}nn_regression_low_memory_train_validation_fine.py   --num_epochs=${epochs} --train_dir=${output_path}${network_architecture}_${output_layer}_in-${img_num}_ih-${image_h}_bs-${batch_size}_kp-${keep_prob}_bal-${bal}_is-${img_std}_lf-${loss_function}_maxw-${abs_max_weight}/ --optimizer=${optimizer} --validation_every_n_steps=${val_steps} --balance_training_data=${bal}  --loss_function=${loss_function} --abs_max_weight=${abs_max_weight} \
---image_num_per_sample=${img_num} --network_architecture=${network_architecture}  --output_layer=${output_layer} --train_batch_size=${batch_size}  --image_height_resize=${image_h} --image_width_resize=${image_w} --image_standardization=${img_std}  --per_process_gpu_memory_fraction${gpu_memory_usage}
+--image_num_per_sample=${img_num} --network_architecture=${network_architecture}  --output_layer=${output_layer} --train_batch_size=${batch_size}  --image_height_resize=${image_h} --image_width_resize=${image_w} --image_standardization=${img_std} --num_towers=${num_towers}  --per_process_gpu_memory_fraction${gpu_memory_usage}
 done
 done
 done
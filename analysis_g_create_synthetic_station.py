@@ -0,0 +1,24 @@
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_synthetic as abb_syn
+import argparse
+import json
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("output_path", help="root of the synthetic station tree")
+parser.add_argument("--first_day", default="2015-07-16", help="first day YYYY-MM-DD")
+parser.add_argument("--days", type=int, default=10, help="number of days")
+parser.add_argument("--image_size", type=int, default=256, help="image resolution in pixels")
+parser.add_argument("--image_interval", type=int, default=7, help="seconds between images")
+parser.add_argument("--cloud_field", default=None, help='json cloud settings, f.e. {"nr_clouds": 20}')
+parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+parser.add_argument("--seed", type=int, default=0)
+args = parser.parse_args()
+
+
+cloud_field = json.loads(args.cloud_field) if args.cloud_field else None
+
+rl_pd = abb_syn.create_synthetic_station(args.output_path, first_day=args.first_day, nr_days=args.days,
+                                         processes=args.processes, seed=args.seed, image_size=args.image_size,
+                                         image_interval_s=args.image_interval, cloud_field=cloud_field)
+
+print("Images:", len(rl_pd.index))
@@ -31,6 +31,7 @@ for (img_dict, data_path) in abbr.read_cld_img_time_range_paths(img_d_tup_l=[(d_
 
 
 from abb_deeplearning.abb_mpc_controller import abb_mpc
+import abb_deeplearning.abb_data_pipeline.abb_clouddrl_data_store as abb_ds
 
 
 day_list = [t[1] for t in abbr.read_cld_img_day_range_paths(img_d_tup_l=[
@@ -44,4 +45,5 @@ print("Calculating "+str(len(day_list))+ " days")
 
 
 abb_mpc.perform_default_mpc(
-    day_path_list=day_list, resolution_s=1, time_range=None,interpolate_to_s=True,write_file=True,change_constraint_wh_min=40)
+    day_path_list=day_list, resolution_s=1, time_range=None,interpolate_to_s=True,write_file=True,change_constraint_wh_min=40,
+    store=abb_ds.StationDataStore())
@@ -1,6 +1,8 @@
 from abb_deeplearning.abb_data_pipeline.abb_clouddrl_transformation_pipeline import naive_battery_throughput_calculation
+import abb_deeplearning.abb_data_pipeline.abb_clouddrl_constants as ac
 
 
 
-
-naive_battery_throughput_calculation()
\ No newline at end of file
+# all ramp constraints in one pass per day, written as columns naive@100, naive@40, naive@16 of the station data store
+naive_battery_throughput_calculation(change_constraints_wh_min=[ac.solar_irradiance / 10, ac.solar_irradiance / 25,
+                                                                ac.solar_irradiance / 62.5])
@@ -1,5 +1,4 @@
-from abb_deeplearning.abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
-from abb_deeplearning.abb_data_pipeline import abb_clouddrl_constants as abb_c
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_data_store as abb_ds
 import matplotlib.pyplot as plt
 import pandas as pd
 import os
@@ -9,16 +8,14 @@ import datetime as dt
 d_from = dt.datetime.strptime('2015-09-28', '%Y-%m-%d')
 d_to = dt.datetime.strptime('2015-09-28', '%Y-%m-%d')
 
-day_list = abb_rp.read_cld_img_day_range_paths(suffix='all',img_d_tup_l=[(d_from,d_to)])
+store = abb_ds.StationDataStore()
 
 
 
 
-for day in day_list:
+for day, df in store.iter_days(['mpc@100', abb_ds.IRR], start=d_from, end=d_to):
 
-    df = pd.DataFrame.from_csv(day[1])
-
-    df[['mpc100','int']].plot()
+    df.plot()
     plt.show()
 
 
@@ -31,4 +28,4 @@ for day in day_list:
 
 
 
-print(day_list)
\ No newline at end of file
+print(store.days(abb_ds.IRR))
\ No newline at end of file
@@ -12,11 +12,11 @@ path = os.path.join(abb_c.c_int_data_path,"C-throughput.csv")
 
 diff_df = pd.DataFrame.from_csv(path)
 
-diff_t_df = diff_df[['mpc100','naive100','mpc40','naive40']]
+diff_t_df = diff_df[['mpc@100','naive@100','mpc@40','naive@40']]
 
-diff100 = diff_df[['mpc100','naive100']]
+diff100 = diff_df[['mpc@100','naive@100']]
 
-diff40 = diff_df[['mpc40','naive40']]
+diff40 = diff_df[['mpc@40','naive@40']]
 
 
 sum_diff = diff_t_df.sum()
@@ -1,46 +1,34 @@
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_energy_evaluation as abb_ee
 import argparse
 import os
 import pandas as pd
+
+"""
+Evaluates the MPC predictions of all model directories of pred_path in a process pool and compares the models
+(the energy_throughput.csv etc. of the models are not rewritten).
+"""
+
 parser = argparse.ArgumentParser()
-parser.add_argument("pred_path", help="date to show")
-parser.add_argument("change_constraint", help="date to show") #100
-parser.add_argument("skip_pred", help="date to show") #1
+parser.add_argument("pred_path", help="directory of the model directories")
+parser.add_argument("change_constraint", help="change constraint of the mpc") #100
+parser.add_argument("skip_pred", help="skipped predictions of the mpc") #1
+parser.add_argument("loss_t", type=float, help="errors below or equal are not counted as throughput") #11
+parser.add_argument("--processes", type=int, default=None, help="worker processes, default: number of cpus")
 
 args = parser.parse_args()
 p_path = str(args.pred_path)
-c_const = str(args.change_constraint)
-skip_pred = str(args.skip_pred)
-
-f_name = os.path.join("MPC"+str(c_const)+"-"+str(skip_pred),"energy_throughput.csv")
-
-
-paths = [os.path.join(p_path,dI,f_name) for dI in os.listdir(p_path) if os.path.isdir(os.path.join(p_path,dI))]
-
-
-df_list = list()
-
-for path in paths:
-
-    df = pd.DataFrame.from_csv(path,index_col=0,parse_dates=True)['mpc_pred100']
-
-    parts = path.split('/')
 
+paths = sorted(os.path.join(p_path,dI) for dI in os.listdir(p_path) if os.path.isdir(os.path.join(p_path,dI)))
 
-    df = pd.DataFrame({parts[-3]: df.values})
-
-
-    df_list.append(df)
-
-
-
-full_df = pd.concat(df_list,axis=1)
+full_df, overall_df = abb_ee.evaluate_model_paths(paths, kind='mpc', processes=args.processes,
+                                                  change_constraint=int(args.change_constraint),
+                                                  skip_preds=int(args.skip_pred), loss_threshold=args.loss_t,
+                                                  write=False)
 sum_df = full_df.sum(axis=0)
 
 full_df.to_csv(os.path.join(p_path,"energy_throughput_comparison.csv"))
 sum_df.to_csv(os.path.join(p_path,"energy_throughput_sum.csv"))
+overall_df.to_csv(os.path.join(p_path,"energy_throughput_overall.csv"))
 
-
-
-
-
-
+with pd.option_context('display.max_columns', None, 'display.width', 200):
+    print(overall_df)
@@ -2,6 +2,7 @@ import pandas as pd
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
 
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_constants as abb_c
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_data_store as abb_ds
 import datetime as dt
 
 import os
@@ -12,6 +13,11 @@ df_master = pd.read_hdf('/media/data/Daten/data_C_int/master_index_cav.h5')
 
 file_filter={"_sp_256", ".jpeg"}
 
+store = abb_ds.StationDataStore()
+# master index column -> store column
+signal_columns = {'irradiation_hs': abb_ds.IRR, 'mpc100': 'mpc@100', 'mpc40': 'mpc@40', 'naive100': 'naive@100_old',
+                  'naive100_new': 'naive@100', 'naive40_new': 'naive@40', 'ghi': abb_ds.CLEAR_SKY}
+
 df_data_files=[]
 df_label_files=[]
 #(dt.datetime.strptime('2015-09-28', '%Y-%m-%d'),dt.datetime.strptime('2015-09-30', '%Y-%m-%d'))
@@ -31,64 +37,12 @@ for day in abb_rp.read_cld_img_time_range_paths(img_d_tup_l=None,automatic_dayti
 
 
 
-    #IRR
-    irr = pd.read_csv(day[1] , index_col=0, parse_dates=True,
-                      header=None)
-    irr_data = irr.loc[pd.to_datetime(image_keys)]
-    irr_data.columns = [['irradiation_hs']]
-
-
-    #MPC100
-    mpc= pd.read_csv(day[2].rsplit('.',1)[0]+"100.csv", index_col=0, parse_dates=True,
-                               header=None)
-    mpc_data = mpc.loc[pd.to_datetime(image_keys)]
-    mpc_data.columns = [['mpc100']]
-
-    mpc40 = pd.read_csv(day[2].rsplit('.', 1)[0] + "40.csv", index_col=0, parse_dates=True,
-                      header=None)
-    mpc_data_40 = mpc40.loc[pd.to_datetime(image_keys)]
-    mpc_data_40.columns = [['mpc40']]
-
-    #Naive100
-
-    naive = pd.read_csv(day[2].rsplit('-', 1)[0] + "-naive100.csv", index_col=0, parse_dates=True,
-                      header=None)
-    naive_data = naive.loc[pd.to_datetime(image_keys)]
-    naive_data.columns = [['naive100']]
-
-    naive_new = pd.read_csv(day[2].rsplit('-', 1)[0] + "-naive100_new.csv", index_col=0, parse_dates=True,
-                        header=None)
-    naive_data_new = naive_new.loc[pd.to_datetime(image_keys)]
-    naive_data_new.columns = [['naive100_new']]
-
-    naive_new_40 = pd.read_csv(day[2].rsplit('-', 1)[0] + "-naive40_new.csv", index_col=0, parse_dates=True,
-                            header=None)
-    naive_data_new_40 = naive_new_40.loc[pd.to_datetime(image_keys)]
-    naive_data_new_40.columns = [['naive40_new']]
-
-
-
-
-
-    df_master = df_master[~df_master.index.duplicated(keep='last')]
-    df_temp = df_master.loc[pd.to_datetime(image_keys)]['T1']
-
-
-
-    print(len(df_temp),len(image_keys))
-
-
-
-    df_t1 = pd.DataFrame(data={'T1':df_temp.values},index=image_keys)
-
-
-
-    # Clearsky
-    cs= pd.read_csv(day[3], index_col=0, parse_dates=True,
-                               header=None)  # read sp file data with sunspot coordinates
-    cs_data = cs.loc[pd.to_datetime(image_keys)]
-    cs_data.columns = [['ghi']]
-
+    #IRR, MPC, naive control and clear sky from the station data store
+    image_times = pd.to_datetime(image_keys)
+    signals = store.read(list(signal_columns.values()), start=image_times.min(), end=image_times.max(),
+                         join='outer').reindex(image_times)
+    signals.columns = list(signal_columns.keys())
+    signals.index = image_keys
 
 
 
@@ -99,7 +53,7 @@ for day in abb_rp.read_cld_img_time_range_paths(img_d_tup_l=None,automatic_dayti
     sunspot_coords.columns=[['sun_x','sun_y']]
 
 
-    day_data_df = pd.concat([img_df,irr_data,mpc_data,mpc_data_40,naive_data,naive_data_new,naive_data_new_40,df_t1,cs_data,sunspot_coords],axis=1)
+    day_data_df = pd.concat([img_df,signals,sunspot_coords],axis=1)
 
     print(day_data_df.head(1))
     df_data_files.append(day_data_df)
@@ -133,6 +87,10 @@ for day in abb_rp.read_cld_img_time_range_paths(img_d_tup_l=None,automatic_dayti
 df_data_master = pd.concat(df_data_files,axis=0).sort_index()
 df_data_master.index = pd.to_datetime(df_data_master.index)
 
+#T1 of all images in one join (the master index is deduplicated once, image and log timestamps are aligned)
+df_master = df_master[~df_master.index.duplicated(keep='last')].sort_index()
+df_data_master['T1'] = df_master['T1'].reindex(df_data_master.index).values
+
 df_label_master = pd.concat(df_label_files,axis=0).sort_index()
 df_label_master.index = pd.to_datetime(df_label_master.index)
 
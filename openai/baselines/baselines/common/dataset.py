@@ -1,23 +1,35 @@
 import numpy as np
 
+
+def _gather(array, inds, buffers, key):
+    """Copies the rows inds of array into the buffer buffers[key] (reused if large enough), returns a view"""
+    buf = buffers.get(key)
+    if buf is None or buf.shape[0] < len(inds):
+        buf = buffers[key] = np.empty((len(inds),) + array.shape[1:], array.dtype)
+    # mode='clip' avoids the internal copy of mode='raise', the indices are always valid
+    return np.take(array, inds, axis=0, out=buf[:len(inds)], mode='clip')
+
+
 class Dataset(object):
     def __init__(self, data_map, deterministic=False, shuffle=True):
+        """
+        The arrays of data_map are not copied: shuffle only permutes an index and the minibatches are gathered into
+        preallocated buffers which are reused by the next call of next_batch. Consume (or copy) a batch before
+        requesting the next one. If deterministic the batches are views of the arrays of data_map.
+        """
         self.data_map = data_map
         self.deterministic = deterministic
         self.enable_shuffle = shuffle
         self.n = next(iter(data_map.values())).shape[0]
+        self._perm = np.arange(self.n)
+        self._buffers = {}
         self._next_id = 0
         self.shuffle()
 
     def shuffle(self):
         if self.deterministic:
             return
-        perm = np.arange(self.n)
-        np.random.shuffle(perm)
-
-        for key in self.data_map:
-            self.data_map[key] = self.data_map[key][perm]
-
+        np.random.shuffle(self._perm)
         self._next_id = 0
 
     def next_batch(self, batch_size):
@@ -29,8 +41,14 @@ class Dataset(object):
         self._next_id += cur_batch_size
 
         data_map = dict()
+        if self.deterministic:
+            for key in self.data_map:
+                data_map[key] = self.data_map[key][cur_id:cur_id+cur_batch_size]
+            return data_map
+
+        inds = self._perm[cur_id:cur_id+cur_batch_size]
         for key in self.data_map:
-            data_map[key] = self.data_map[key][cur_id:cur_id+cur_batch_size]
+            data_map[key] = _gather(self.data_map[key], inds, self._buffers, key)
         return data_map
 
     def iterate_once(self, batch_size):
@@ -42,19 +60,33 @@ class Dataset(object):
 
     def subset(self, num_elements, deterministic=True):
         data_map = dict()
+        inds = self._perm[:num_elements]
         for key in self.data_map:
-            data_map[key] = self.data_map[key][:num_elements]
+            data_map[key] = self.data_map[key][inds]
         return Dataset(data_map, deterministic)
 
 
 def iterbatches(arrays, *, num_batches=None, batch_size=None, shuffle=True, include_final_partial_batch=True):
+    """
+    Yields tuples of minibatches. With shuffle the rows are gathered into buffers which are reused for the next
+    batch, without shuffle the batches are views of the arrays.
+    """
     assert (num_batches is None) != (batch_size is None), 'Provide num_batches or batch_size, but not both'
     arrays = tuple(map(np.asarray, arrays))
     n = arrays[0].shape[0]
     assert all(a.shape[0] == n for a in arrays[1:])
+    if num_batches is None:
+        bounds = list(range(0, n, batch_size)) + [n]
+    else:
+        # same sections as np.array_split
+        q, r = divmod(n, num_batches)
+        bounds = [i * q + min(i, r) for i in range(num_batches + 1)]
     inds = np.arange(n)
     if shuffle: np.random.shuffle(inds)
-    sections = np.arange(0, n, batch_size)[1:] if num_batches is None else num_batches
-    for batch_inds in np.array_split(inds, sections):
-        if include_final_partial_batch or len(batch_inds) == batch_size:
-            yield tuple(a[batch_inds] for a in arrays)
+    buffers = {}
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if include_final_partial_batch or end - start == batch_size:
+            if shuffle:
+                yield tuple(_gather(a, inds[start:end], buffers, i) for i, a in enumerate(arrays))
+            else:
+                yield tuple(a[start:end] for a in arrays)
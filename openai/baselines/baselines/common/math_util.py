@@ -72,6 +72,37 @@ def discount_with_boundaries(X, New, gamma):
         Y[t] = X[t] + gamma * Y[t+1] * (1 - New[t+1])
     return Y
 
+def gae_with_boundaries(rew, vpred, new, nextvpred, gamma, lam):
+    """
+    GAE(lambda) advantages of a segment as vectorised reverse scan (no python loop over time)
+
+    rew, vpred: arrays of floats, time x envs (or time)
+    new: array of bools, new[t] indicates that step t is the first step of an episode
+    nextvpred: value of the observation after the segment, zero if it starts a new episode
+
+    The discounted sums of the TD residuals are computed over the whole segment with lfilter, at every episode
+    boundary b the part of the sum which leaks over the boundary (gamma*lam)^(b-t) * D[b] is removed again.
+    """
+    rew = np.asarray(rew, 'float64')
+    vpred = np.asarray(vpred, 'float64')
+    new = np.asarray(new, bool)
+    T = rew.shape[0]
+    nonterminal = 1.0 - np.concatenate([new[1:], np.zeros_like(new[:1])], axis=0)
+    vnext = np.concatenate([vpred[1:], np.asarray(nextvpred, 'float64').reshape((1,) + vpred.shape[1:])], axis=0)
+    delta = rew + gamma * vnext * nonterminal - vpred
+
+    c = gamma * lam
+    D = discount(delta, c)
+
+    # index of the first episode start after t (T if there is none)
+    t_idx = np.arange(T).reshape((T,) + (1,) * (rew.ndim - 1))
+    starts = np.where(new, t_idx, T)
+    next_start = np.minimum.accumulate(starts[::-1], axis=0)[::-1]
+    next_start = np.concatenate([next_start[1:], np.full_like(next_start[:1], T)], axis=0)
+    D_ext = np.concatenate([D, np.zeros_like(D[:1])], axis=0)
+    leak = np.take_along_axis(D_ext, next_start, axis=0) if rew.ndim > 1 else D_ext[next_start]
+    return (D - c ** (next_start - t_idx) * leak).astype('float32')
+
 def test_discount_with_boundaries():
     gamma=0.9
     x = np.array([1.0, 2.0, 3.0, 4.0], 'float32')
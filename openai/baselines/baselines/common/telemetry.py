@@ -0,0 +1,208 @@
+import json
+import queue
+import threading
+
+import numpy as np
+
+from baselines import logger
+
+
+class RingBuffer(object):
+    def __init__(self, size):
+        """Fixed size window of the last `size` values with O(1) append and mean.
+
+        Parameters
+        ----------
+        size: int
+            number of values in the window. Older values are dropped.
+        """
+        self._data = np.zeros(size, dtype=np.float64)
+        self._size = size
+        self._next_idx = 0
+        self._len = 0
+        self._sum = 0.0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, value):
+        if self._len == self._size:
+            self._sum -= self._data[self._next_idx]
+        else:
+            self._len += 1
+        self._data[self._next_idx] = value
+        self._sum += value
+        self._next_idx = (self._next_idx + 1) % self._size
+        if self._next_idx == 0:
+            # recompute once per wrap around, the running sum would accumulate rounding errors
+            self._sum = float(np.sum(self._data[:self._len]))
+
+    def mean(self):
+        """Mean of the window, nan if it is empty (same as np.mean of an empty list)"""
+        if self._len == 0:
+            return np.nan
+        return self._sum / self._len
+
+
+class EventLog(object):
+    def __init__(self, path, fields, buffer_size=256):
+        """Buffered binary log of numeric events, written by a background thread.
+
+        Events are stored as float64 records (numpy structured array) in `path`,
+        the field names in `path`.json. Use `read_event_log` to load it.
+
+        Parameters
+        ----------
+        path: str
+            output file, events are appended
+        fields: [str]
+            names of the event fields
+        buffer_size: int
+            number of events that are collected before they are handed to the writer thread
+        """
+        self.path = path
+        self.fields = list(fields)
+        self.dtype = np.dtype([(f, np.float64) for f in self.fields])
+        with open(path + '.json', 'w') as f:
+            json.dump({'fields': self.fields}, f)
+
+        self._buffer_size = buffer_size
+        self._buffer = np.zeros(buffer_size, dtype=self.dtype)
+        self._buffer_idx = 0
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_blocks)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def write(self, values):
+        """Adds an event, values is a dict field -> number, missing fields are nan"""
+        event = self._buffer[self._buffer_idx]
+        for field in self.fields:
+            event[field] = values.get(field, np.nan)
+        self._buffer_idx += 1
+        if self._buffer_idx == self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer_idx > 0:
+            self._queue.put(self._buffer[:self._buffer_idx])
+            self._buffer = np.zeros(self._buffer_size, dtype=self.dtype)
+            self._buffer_idx = 0
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_blocks(self):
+        with open(self.path, 'ab') as f:
+            while True:
+                block = self._queue.get()
+                if block is None:
+                    break
+                block.tofile(f)
+                f.flush()
+
+
+def read_event_log(path):
+    """Loads an EventLog file as numpy structured array"""
+    with open(path + '.json') as f:
+        fields = json.load(f)['fields']
+    return np.fromfile(path, dtype=np.dtype([(f, np.float64) for f in fields]))
+
+
+class Telemetry(object):
+    """Hooks called by deepq.learn, subclasses override the events they need.
+
+    on_step is called every environment step and should stay cheap, aggregation
+    belongs into on_episode_end.
+    """
+
+    def on_step(self, t, action, reward, done):
+        pass
+
+    def on_train(self, t, td_errors, q_t_selected, q_t_targets, errors, gradients, lr):
+        pass
+
+    def on_episode_end(self, t, num_episodes, episode_reward, mean_rewards):
+        """mean_rewards: dict window size -> mean reward of the last completed episodes"""
+        pass
+
+    def close(self):
+        pass
+
+
+class EpisodeTelemetry(Telemetry):
+    def __init__(self, path, num_actions, grad_ratio_freq=10, log_tabular=True):
+        """Per episode training statistics (rewards, Q values, TD errors, action counts and
+        update/weight norm ratios) written to an EventLog.
+
+        Parameters
+        ----------
+        path: str
+            event log file
+        num_actions: int
+            number of actions of the environment
+        grad_ratio_freq: int
+            compute the update/weight norm ratios every `grad_ratio_freq` train steps,
+            they need a norm of every variable
+        log_tabular: bool
+            also print the episode statistics with logger.record_tabular
+        """
+        self.num_actions = num_actions
+        self.grad_ratio_freq = grad_ratio_freq
+        self.log_tabular = log_tabular
+        self.fields = ['episode', 'steps', 'reward', 'reward100', 'reward50', 'reward10', 'mean_s_q', 'mean_t_q',
+                       'mean_td_error', 'mean_h_error'] + \
+                      ['action_count{}'.format(i) for i in range(num_actions)] + \
+                      ['mean_wg', 'median_wg', 'max_wg', 'min_wg']
+        self.event_log = EventLog(path, self.fields)
+        self._train_steps = 0
+        self._reset_episode()
+
+    def _reset_episode(self):
+        self._action_counts = np.zeros(self.num_actions, dtype=np.int64)
+        self._train_sums = np.zeros(4, dtype=np.float64)  # selected Q, target Q, TD error, Huber error
+        self._episode_train_steps = 0
+        self._grad_ratios = []
+
+    def on_step(self, t, action, reward, done):
+        self._action_counts[action] += 1
+
+    def on_train(self, t, td_errors, q_t_selected, q_t_targets, errors, gradients, lr):
+        self._train_sums += [np.mean(q_t_selected), np.mean(q_t_targets), np.mean(td_errors), np.mean(errors)]
+        self._episode_train_steps += 1
+        self._train_steps += 1
+
+        if self.grad_ratio_freq and self._train_steps % self.grad_ratio_freq == 0:
+            for grad, var in gradients:
+                var_norm = np.linalg.norm(var)
+                if var_norm > 0:
+                    self._grad_ratios.append(np.linalg.norm(grad * -lr) / var_norm)
+
+    def on_episode_end(self, t, num_episodes, episode_reward, mean_rewards):
+        if self._episode_train_steps > 0:
+            train_means = self._train_sums / self._episode_train_steps
+        else:
+            train_means = np.full(4, np.nan)
+
+        values = {'episode': num_episodes, 'steps': t, 'reward': episode_reward,
+                  'reward100': mean_rewards[100], 'reward50': mean_rewards[50], 'reward10': mean_rewards[10],
+                  'mean_s_q': train_means[0], 'mean_t_q': train_means[1],
+                  'mean_td_error': train_means[2], 'mean_h_error': train_means[3]}
+        for i, count in enumerate(self._action_counts):
+            values['action_count{}'.format(i)] = count
+        if self._grad_ratios:
+            values.update({'mean_wg': np.mean(self._grad_ratios), 'median_wg': np.median(self._grad_ratios),
+                           'max_wg': np.max(self._grad_ratios), 'min_wg': np.min(self._grad_ratios)})
+        self.event_log.write(values)
+
+        if self.log_tabular:
+            for field in self.fields:
+                logger.record_tabular(field, values.get(field, np.nan))
+            logger.dump_tabular()
+
+        self._reset_episode()
+
+    def close(self):
+        self.event_log.close()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from baselines.common.dataset import Dataset, iterbatches
+
+
+def test_dataset_shuffle_does_not_copy():
+    ob = np.arange(100 * 3, dtype='float32').reshape(100, 3)
+    ac = np.arange(100)
+    d = Dataset(dict(ob=ob, ac=ac))
+    assert d.data_map['ob'] is ob
+
+    seen = []
+    for batch in d.iterate_once(32):
+        assert np.array_equal(batch['ob'][:, 0], batch['ac'] * 3)
+        seen.extend(batch['ac'].tolist())
+    assert len(seen) == 96 and len(set(seen)) == 96
+    assert np.array_equal(ob[:, 0], np.arange(100) * 3)
+
+
+def test_dataset_deterministic_views():
+    ob = np.arange(10, dtype='float32')
+    d = Dataset(dict(ob=ob), deterministic=True)
+    batch = d.next_batch(4)
+    assert np.array_equal(batch['ob'], [0, 1, 2, 3])
+    assert np.shares_memory(batch['ob'], ob)
+
+
+def test_iterbatches():
+    x = np.arange(10)
+    y = np.arange(10) * 2
+    sizes = [len(bx) for bx, by in iterbatches((x, y), num_batches=3, shuffle=False)]
+    assert sizes == [len(s) for s in np.array_split(x, 3)]
+
+    seen = []
+    for bx, by in iterbatches((x, y), batch_size=4):
+        assert np.array_equal(by, bx * 2)
+        seen.extend(bx.tolist())
+    assert sorted(seen) == list(range(10))
+    assert len(list(iterbatches((x, y), batch_size=4, include_final_partial_batch=False))) == 2
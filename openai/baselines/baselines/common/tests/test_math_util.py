@@ -0,0 +1,35 @@
+import numpy as np
+
+from baselines.common.math_util import gae_with_boundaries
+
+
+def _gae_loop(rew, vpred, new, nextvpred, gamma, lam):
+    # reverse loop of ppo1/pposgd_simple.add_vtarg_and_adv
+    new = np.append(new, 0)
+    vpred = np.append(vpred, nextvpred)
+    T = len(rew)
+    gaelam = np.empty(T, 'float32')
+    lastgaelam = 0
+    for t in reversed(range(T)):
+        nonterminal = 1 - new[t + 1]
+        delta = rew[t] + gamma * vpred[t + 1] * nonterminal - vpred[t]
+        gaelam[t] = lastgaelam = delta + gamma * lam * nonterminal * lastgaelam
+    return gaelam
+
+
+def test_gae_with_boundaries():
+    rng = np.random.RandomState(0)
+    T, nenvs = 200, 4
+    rew = rng.randn(T, nenvs).astype('float32')
+    vpred = rng.randn(T, nenvs).astype('float32')
+    new = rng.rand(T, nenvs) < 0.05
+    new[0, 0] = new[-1, 1] = True
+    nextvpred = rng.randn(nenvs).astype('float32') * (1 - new[-1])
+
+    adv = gae_with_boundaries(rew, vpred, new, nextvpred, 0.99, 0.95)
+    assert adv.shape == (T, nenvs) and adv.dtype == np.float32
+    for k in range(nenvs):
+        expected = _gae_loop(rew[:, k], vpred[:, k], new[:, k], nextvpred[k], 0.99, 0.95)
+        assert np.allclose(adv[:, k], expected, atol=1e-4)
+        assert np.allclose(gae_with_boundaries(rew[:, k], vpred[:, k], new[:, k], nextvpred[k], 0.99, 0.95),
+                           expected, atol=1e-4)
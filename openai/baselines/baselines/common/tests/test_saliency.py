@@ -0,0 +1,88 @@
+# tests for the numpy parts of deepq.saliency (no tensorflow graph is built)
+import tracemalloc
+
+import numpy as np
+
+from baselines.deepq.saliency import SaliencyEngine, saliency_maps
+
+
+def test_saliency_maps():
+    grads = np.zeros((2, 4, 4, 3), dtype=np.float32)
+    grads[0, 1, 2] = [1.0, -2.0, 0.0]
+    grads[1, 3, 3] = 5.0
+    grads[1, 0, 0] = -100.0
+    mask = np.zeros((4, 4), dtype=bool)
+    mask[0, 0] = True
+
+    maps = saliency_maps(grads, mask=mask, lower=0, upper=100)
+    assert maps.shape == (2, 4, 4)
+    assert maps[0, 1, 2] == 1.0 and maps[1, 3, 3] == 1.0
+    # masked pixels are ignored, everything else is 0
+    assert maps[1, 0, 0] == 0.0
+    assert np.count_nonzero(maps) == 2
+
+    # percentile clipping per sample, constant samples are all 0
+    grads = np.arange(1, 17, dtype=np.float32).reshape(1, 4, 4, 1)
+    maps = saliency_maps(np.concatenate([grads, np.ones_like(grads)]), lower=25, upper=75)
+    assert maps.min() == 0.0 and maps.max() == 1.0
+    assert np.allclose(maps[0].ravel(), np.clip((np.arange(1, 17) - 4.75) / 7.5, 0, 1))
+    assert not maps[1].any()
+
+
+class _PatchEngine(SaliencyEngine):
+    """Engine without network: the q values and the state score are the sum of the pixels of one square"""
+
+    def __init__(self, img_size=16, channels=3, seq_length=2, square=(4, 8)):
+        self.img_size = img_size
+        self.channels = channels
+        self.seq_length = seq_length
+        self.mask = None
+        self.img_len = img_size * img_size * channels * seq_length
+        self.square = square
+        self._values = None
+        self.batch_sizes = []
+
+    def _run(self, f, observations):
+        self.batch_sizes.append(len(observations))
+        img = observations[:, :self.img_len].reshape(len(observations), self.img_size, self.img_size, -1)
+        s = img[:, self.square[0]:self.square[0] + 4, self.square[1]:self.square[1] + 4].sum(axis=(1, 2, 3))
+        return np.stack([s, -s], axis=1), s[:, None]
+
+
+def test_occlusion_maps():
+    engine = _PatchEngine()
+    observations = np.random.RandomState(0).uniform(1, 2, size=(3, engine.img_len + 5))
+
+    result = engine.occlusion_maps(observations, patch_size=4, stride=4, max_batch=1)
+    for key in ['action_saliency', 'state_saliency']:
+        maps = result[key].copy()
+        assert maps.shape == (3, 16, 16)
+        assert np.all(maps[:, 4:8, 8:12] == 1.0)
+        maps[:, 4:8, 8:12] = 0
+        assert not maps.any()
+    assert np.all(result['action'] == 0)
+    # one call for the batch, one per (observation, patch) pair
+    assert engine.batch_sizes == [3] + [1] * 3 * 16
+
+    engine.batch_sizes = []
+    chunked = engine.occlusion_maps(observations, patch_size=4, stride=4, max_batch=5)
+    assert max(engine.batch_sizes[1:]) == 5
+    full = engine.occlusion_maps(observations, patch_size=4, stride=4, max_batch=10000)
+    for key in ['action_saliency', 'state_saliency', 'q_values', 'state_score']:
+        assert np.array_equal(result[key], chunked[key])
+        assert np.array_equal(result[key], full[key])
+
+
+def test_occlusion_maps_memory():
+    engine = _PatchEngine()
+    observations = np.random.RandomState(0).uniform(1, 2, size=(8, engine.img_len))
+    engine.occlusion_maps(observations, patch_size=4, stride=4, max_batch=1)
+
+    # 8 x 16 occluded copies exist, only max_batch of them may be in memory at once
+    tracemalloc.start()
+    try:
+        engine.occlusion_maps(observations, patch_size=4, stride=4, max_batch=1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 16 * observations[0].nbytes
@@ -0,0 +1,51 @@
+import numpy as np
+
+from baselines.common.vec_env.shmem_vec_env import ShmemVecEnv
+
+
+class _Space(object):
+    def __init__(self, shape=None, n=None):
+        self.shape = shape
+        self.n = n
+
+
+class _CountingEnv(object):
+    """Flat float16 observations like the cloud environments, episodes end after 3 steps"""
+
+    def __init__(self, k):
+        self.k = k
+        self.t = 0
+        self.observation_space = _Space(shape=(4, 1))
+        self.action_space = _Space(n=2)
+
+    def reset(self):
+        self.t = 0
+        return np.full((4, 1), self.k * 100, dtype=np.float16)
+
+    def step(self, action):
+        self.t += 1
+        return np.full((4, 1), self.k * 100 + self.t + action, dtype=np.float16), float(self.k), self.t == 3, {}
+
+
+def test_shmem_vec_env():
+    env = ShmemVecEnv([lambda k=k: _CountingEnv(k) for k in range(5)], nworkers=2, obs_dtype=np.float16)
+    try:
+        assert env.num_envs == 5
+        obs = env.reset()
+        assert obs.shape == (5, 4, 1)
+        assert np.allclose(obs[:, 0, 0], np.arange(5) * 100)
+
+        actions = np.array([0, 1, 0, 1, 0])
+        for step in range(1, 4):
+            obs, rews, dones, infos = env.step(actions)
+            assert np.allclose(rews, np.arange(5))
+            assert len(infos) == 5
+            if step < 3:
+                assert not dones.any()
+                assert np.allclose(obs[:, :, 0], (np.arange(5) * 100 + step + actions)[:, None])
+            else:
+                # finished environments are reset by the workers
+                assert dones.all()
+                assert np.allclose(obs[:, 0, 0], np.arange(5) * 100)
+    finally:
+        env.close()
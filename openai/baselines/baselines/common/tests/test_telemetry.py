@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+import numpy as np
+
+from baselines.common.telemetry import RingBuffer, EventLog, read_event_log
+
+
+def test_ring_buffer_mean():
+    window = RingBuffer(3)
+    assert np.isnan(window.mean())
+
+    values = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0]
+    for i, value in enumerate(values):
+        window.append(value)
+        assert np.isclose(window.mean(), np.mean(values[max(0, i - 2):i + 1]))
+    assert len(window) == 3
+
+
+def test_event_log():
+    with tempfile.TemporaryDirectory() as td:
+        path = os.path.join(td, "events.bin")
+        log = EventLog(path, ['episode', 'reward'], buffer_size=4)
+        for i in range(10):
+            log.write({'episode': i, 'reward': -i * 0.5})
+        log.write({'episode': 10})
+        log.close()
+
+        events = read_event_log(path)
+        assert len(events) == 11
+        assert np.allclose(events['episode'], np.arange(11))
+        assert np.allclose(events['reward'][:10], -np.arange(10) * 0.5)
+        assert np.isnan(events['reward'][10])
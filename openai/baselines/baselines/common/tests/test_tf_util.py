@@ -1,8 +1,11 @@
 # tests for tf_util
+import numpy as np
 import tensorflow as tf
 from baselines.common.tf_util import (
+    ImageVectorInput,
     function,
     initialize,
+    observation_batch_size,
     set_value,
     single_threaded_session
 )
@@ -63,7 +66,29 @@ def test_multikwargs():
         assert expt_caught
 
 
+def test_image_vector_input():
+    tf.reset_default_graph()
+    obs = ImageVectorInput((2, 2, 2), 3, name="obs")
+    img, vec = obs.get()
+    f = function([obs], [tf.reduce_sum(img, axis=[1, 2, 3]), tf.reduce_sum(vec, axis=1),
+                         observation_batch_size(obs.get())])
+
+    # flat float16 observations of the cloud environments: 8 pixels, irradiance sequence and control input
+    flat = np.concatenate([np.full((4, 8), 255), np.tile([[0.5, 0.25, 1.0]], (4, 1))], axis=1)
+    flat = flat.astype(np.float16)[:, :, None]
+    with single_threaded_session():
+        initialize()
+        img_sum, vec_sum, batch_size = f(flat)
+        assert np.allclose(img_sum, 8.0)
+        assert np.allclose(vec_sum, 1.75)
+        assert batch_size == 4
+
+        img_sum, vec_sum, _ = f((np.zeros((1, 2, 2, 2), dtype=np.uint8), np.ones((1, 3))))
+        assert np.allclose(img_sum, 0.0) and np.allclose(vec_sum, 3.0)
+
+
 if __name__ == '__main__':
     test_set_value()
     test_function()
     test_multikwargs()
+    test_image_vector_input()
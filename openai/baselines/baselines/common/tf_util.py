@@ -172,6 +172,55 @@ class Uint8Input(PlacholderTfInput):
         return self._output
 
 
+class ImageVectorInput(TfInput):
+    def __init__(self, img_shape, vec_size, name=None):
+        """Observation split into an uint8 image and a float vector (e.g. irradiance
+        sequence and control input of the cloud environments).
+
+        get() returns the tuple (image cast to float32 and divided by 255, vector).
+        The cast and scaling happen once per forward pass, all networks that take
+        the input (Q network, target network, double Q) share the same tensors.
+
+        Parameters
+        ----------
+        img_shape: [int]
+            shape of the image of a single observation, e.g. (84, 84, 6)
+        vec_size: int
+            size of the vector of a single observation
+        name: str
+            name of the underlying placeholders (name_img and name_vec)
+        """
+        super().__init__(name)
+        self._img_shape = list(img_shape)
+        self._img_size = int(np.prod(img_shape))
+        self._img_ph = tf.placeholder(tf.uint8, [None] + self._img_shape, name=name + "_img")
+        self._vec_ph = tf.placeholder(tf.float32, [None, vec_size], name=name + "_vec")
+        self._output = (tf.cast(self._img_ph, tf.float32) / 255.0, self._vec_ph)
+
+    def get(self):
+        return self._output
+
+    def make_feed_dict(self, data):
+        """data is either a tuple (images, vectors) or a batch of flat observations
+        (image pixels followed by the vector, with or without trailing axis of size 1)
+        as returned by the cloud environments"""
+        if isinstance(data, tuple):
+            img, vec = data
+        else:
+            data = np.asarray(data)
+            data = data.reshape(data.shape[0], -1)
+            img = data[:, :self._img_size].reshape([-1] + self._img_shape)
+            vec = data[:, self._img_size:]
+        return {self._img_ph: np.asarray(img, dtype=np.uint8), self._vec_ph: vec}
+
+
+def observation_batch_size(observations):
+    """Batch size tensor of the output of a TfInput (single tensor or tuple of tensors)"""
+    if isinstance(observations, tuple):
+        observations = observations[0]
+    return tf.shape(observations)[0]
+
+
 def ensure_tf_input(thing):
     """Takes either tf.placeholder of TfInput and outputs equivalent TfInput"""
     if isinstance(thing, TfInput):
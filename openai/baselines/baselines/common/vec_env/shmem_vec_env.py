@@ -0,0 +1,125 @@
+import os
+import tempfile
+
+import numpy as np
+from multiprocessing import Process, Pipe
+from baselines.common.vec_env import VecEnv
+from baselines.common.vec_env.subproc_vec_env import CloudpickleWrapper
+
+
+def _shm_dir():
+    # tmpfs backed files are plain shared memory, fall back to the normal temp dir
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def worker(remote, env_fn_wrappers):
+    """
+    Runs several environments. Observations are written into the shared observation
+    file, only actions, rewards, dones and infos are sent through the pipe.
+    """
+    envs = [env_fn_wrapper.x() for env_fn_wrapper in env_fn_wrappers]
+    obs_buf = None
+    while True:
+        cmd, data = remote.recv()
+        if cmd == 'step':
+            rewards, dones, infos = [], [], []
+            for i, (env, action) in enumerate(zip(envs, data)):
+                ob, reward, done, info = env.step(action)
+                if done:
+                    ob = env.reset()
+                obs_buf[i] = np.reshape(ob, obs_buf.shape[1:])
+                rewards.append(reward)
+                dones.append(done)
+                infos.append(info)
+            remote.send((rewards, dones, infos))
+        elif cmd == 'reset':
+            for i, env in enumerate(envs):
+                obs_buf[i] = np.reshape(env.reset(), obs_buf.shape[1:])
+            remote.send(None)
+        elif cmd == 'attach':
+            path, offset, shape, dtype = data
+            obs_buf = np.memmap(path, dtype=dtype, mode='r+', offset=offset, shape=shape)
+            remote.send(None)
+        elif cmd == 'close':
+            del obs_buf
+            remote.close()
+            break
+        elif cmd == 'get_spaces':
+            remote.send((envs[0].action_space, envs[0].observation_space))
+        else:
+            raise NotImplementedError
+
+
+class ShmemVecEnv(VecEnv):
+    def __init__(self, env_fns, nworkers=None, obs_dtype=None):
+        """
+        Like SubprocVecEnv, but observations are exchanged through a shared memory mapped
+        array instead of being pickled through the pipes.
+
+        env_fns: list of functions that create the environments
+        nworkers: number of subprocesses, the environments are split evenly among them.
+            One subprocess per environment if None.
+        obs_dtype: dtype of the observations (e.g. np.float16 for the cloud environments),
+            observation_space.dtype or float32 if None
+        """
+        nenvs = len(env_fns)
+        nworkers = nenvs if nworkers is None else min(nworkers, nenvs)
+        self.env_slices = [slice(s[0], s[-1] + 1) for s in np.array_split(np.arange(nenvs), nworkers)]
+
+        self.remotes, self.work_remotes = zip(*[Pipe() for _ in range(nworkers)])
+        self.ps = [Process(target=worker,
+                           args=(work_remote, [CloudpickleWrapper(env_fn) for env_fn in env_fns[env_slice]]))
+                   for (work_remote, env_slice) in zip(self.work_remotes, self.env_slices)]
+        for p in self.ps:
+            p.daemon = True  # if the main process crashes, we should not cause things to hang
+            p.start()
+
+        self.remotes[0].send(('get_spaces', None))
+        self.action_space, self.observation_space = self.remotes[0].recv()
+
+        if obs_dtype is None:
+            obs_dtype = getattr(self.observation_space, 'dtype', np.float32)
+        obs_shape = tuple(self.observation_space.shape)
+        self._nenvs = nenvs
+        self._obs_file = tempfile.NamedTemporaryFile(prefix='shmem_vec_env_', dir=_shm_dir())
+        self._obs = np.memmap(self._obs_file.name, dtype=obs_dtype, mode='w+', shape=(nenvs,) + obs_shape)
+
+        env_bytes = int(np.prod(obs_shape)) * self._obs.dtype.itemsize
+        for remote, env_slice in zip(self.remotes, self.env_slices):
+            shape = (env_slice.stop - env_slice.start,) + obs_shape
+            remote.send(('attach', (self._obs_file.name, env_slice.start * env_bytes, shape, self._obs.dtype)))
+        for remote in self.remotes:
+            remote.recv()
+        self.closed = False
+
+    def step(self, actions):
+        for remote, env_slice in zip(self.remotes, self.env_slices):
+            remote.send(('step', actions[env_slice]))
+        results = [remote.recv() for remote in self.remotes]
+        rews = [r for rewards, _, _ in results for r in rewards]
+        dones = [d for _, dones, _ in results for d in dones]
+        infos = tuple(i for _, _, infos in results for i in infos)
+        # copy, the buffer is overwritten by the next step
+        return np.array(self._obs), np.stack(rews), np.stack(dones), infos
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        for remote in self.remotes:
+            remote.recv()
+        return np.array(self._obs)
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for p in self.ps:
+            p.join()
+        del self._obs
+        self._obs_file.close()
+        self.closed = True
+
+    @property
+    def num_envs(self):
+        return self._nenvs
@@ -1,4 +1,4 @@
-from baselines.deepq import models,models_sal  # noqa
+from baselines.deepq import models,models_sal,saliency  # noqa
 from baselines.deepq.build_graph import build_act, build_train,build_act_sal,build_train_sal  # noqa
 
 from baselines.deepq.simple import learn, load,test,test_sal,learn_sal  # noqa
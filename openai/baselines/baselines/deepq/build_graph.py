@@ -152,7 +152,7 @@ def build_act(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None):
         q_values = q_func(observations_ph.get(), num_actions, scope="q_func")
         deterministic_actions = tf.argmax(q_values, axis=1)
 
-        batch_size = tf.shape(observations_ph.get())[0]
+        batch_size = U.observation_batch_size(observations_ph.get())
         random_actions = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=num_actions, dtype=tf.int64)
         chose_random = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=1, dtype=tf.float32) < eps
         stochastic_actions = tf.where(chose_random, random_actions, deterministic_actions)
@@ -213,7 +213,7 @@ def build_act_sal(make_obs_ph, q_func, num_actions, scope="deepq", reuse=None):
 
         deterministic_actions = tf.argmax(q_values, axis=1)
 
-        batch_size = tf.shape(observations_ph.get())[0]
+        batch_size = U.observation_batch_size(observations_ph.get())
         random_actions = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=num_actions, dtype=tf.int64)
         chose_random = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=1, dtype=tf.float32) < eps
         stochastic_actions = tf.where(chose_random, random_actions, deterministic_actions)
@@ -322,7 +322,7 @@ def build_act_with_param_noise(make_obs_ph, q_func, num_actions, scope="deepq",
 
         # Put everything together.
         deterministic_actions = tf.argmax(q_values_perturbed, axis=1)
-        batch_size = tf.shape(observations_ph.get())[0]
+        batch_size = U.observation_batch_size(observations_ph.get())
         random_actions = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=num_actions, dtype=tf.int64)
         chose_random = tf.random_uniform(tf.stack([batch_size]), minval=0, maxval=1, dtype=tf.float32) < eps
         stochastic_actions = tf.where(chose_random, random_actions, deterministic_actions)
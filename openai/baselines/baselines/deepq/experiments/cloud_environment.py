@@ -13,7 +13,7 @@ class CloudEnvironment():
 
 
 
-    def __init__(self,img_size=84,radius=[8,16],speed=1,sequence_stride=1,channels=3,sequence_length=2,ramp_step=0.1,action_type=0,action_nr=2,stochastic_irradiance=False,save_images=False):
+    def __init__(self,img_size=84,radius=[8,16],speed=1,sequence_stride=1,channels=3,sequence_length=2,ramp_step=0.1,action_type=0,action_nr=2,stochastic_irradiance=False,save_images=False,render=False):
 
 
 
@@ -28,6 +28,7 @@ class CloudEnvironment():
         self.channels=channels
         self.stochastic_irradiance= stochastic_irradiance
         self.save_images = save_images
+        self.render = render # show the frames of every step with cv2.imshow (blocks 100ms per frame)
 
         self.observation_space=self.ObservationSpace((img_size*img_size*sequence_length*channels+sequence_length+1,1))
 
@@ -111,10 +112,11 @@ class CloudEnvironment():
         next_images = [img[0] for img in next_episode_step]
 
 
-        for i in  range(len(next_images)):
-            cv2.imshow('Rotation', next_images[i])
-            cv2.waitKey(100)
-            print(next_irr[-1],self.episode_ci[-1])
+        if self.render:
+            for i in  range(len(next_images)):
+                cv2.imshow('Rotation', next_images[i])
+                cv2.waitKey(100)
+                print(next_irr[-1],self.episode_ci[-1])
 
 
         next_image_tensor = np.uint8(np.concatenate(next_images, axis=2))
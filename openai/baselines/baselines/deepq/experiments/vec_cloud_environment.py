@@ -0,0 +1,170 @@
+import numpy as np
+
+
+"""
+Headless, batched version of the toy CloudEnvironment (cloud_environment.py) for pretraining on synthetic transitions.
+
+A disc (cloud) moves from the top to the bottom of the image, the sun is the dot in the image center. All frames of
+an episode are rendered at reset with numpy broadcasting over the pixel grid, the irradiance follows from the disc
+geometry (0 while the cloud covers the sun). step takes one action per environment and returns batched observations
+in the same layout as CloudEnvironment (images, irradiance sequence, control input as float16 column). Finished
+environments are reset automatically like in the vec_env environments.
+"""
+
+
+class VecCloudEnvironment():
+
+    def __init__(self, num_envs, img_size=84, radius=[8, 16], speed=1, sequence_stride=1, channels=3,
+                 sequence_length=2, ramp_step=0.1, action_type=0, action_nr=2, stochastic_irradiance=False,
+                 random_geometry=True, seed=None):
+        """
+        num_envs: number of environments stepped together
+        random_geometry: sample start/end column, radius and rotation (0,90,180,270) per episode. If False the
+            geometry of CloudEnvironment is used (x1=31, x2=61, radius=12, rotation 180)
+        other parameters: see CloudEnvironment
+        """
+        self.num_envs = num_envs
+        self.img_size = img_size
+        self.radius = radius
+        self.speed = speed
+        self.sequence_stride = sequence_stride
+        self.sequence_length = sequence_length
+        self.channels = channels
+        self.ramp_step = ramp_step
+        self.stochastic_irradiance = stochastic_irradiance
+        self.random_geometry = random_geometry
+        self.rng = np.random.RandomState(seed)
+
+        self.observation_space = self.ObservationSpace(
+            (img_size * img_size * sequence_length * channels + sequence_length + 1, 1))
+        self.action_space = self.ActionSpace(action_type, action_nr, ramp_step)
+
+        # longest episode: the cloud moves speed pixels per frame in y direction
+        self.max_frames = int(np.ceil(img_size / float(speed)))
+        rows, cols = np.mgrid[0:img_size, 0:img_size]
+        self._rows = rows[None, None]
+        self._cols = cols[None, None]
+        center = img_size // 2 - 1
+        self._center = center
+        self._sun = ((rows - center) ** 2 + (cols - center) ** 2 <= 1)[None, None]
+
+        self.frames = np.zeros((num_envs, self.max_frames, img_size, img_size), dtype=np.uint8)
+        self.irr = np.zeros((num_envs, self.max_frames), dtype=np.float64)
+        self.nr_samples = np.zeros(num_envs, dtype=np.int64)  # number of sequence samples per episode
+        self.pointer = np.zeros(num_envs, dtype=np.int64)
+        self.ci = np.zeros(num_envs, dtype=np.float64)
+        self.episode_nr = np.zeros(num_envs, dtype=np.int64)
+        self._offsets = np.arange(sequence_length) * sequence_stride
+
+    def _geometry(self, n):
+        if self.random_geometry:
+            x1 = self.rng.randint(0, self.img_size, size=n)
+            x2 = self.rng.randint(0, self.img_size, size=n)
+            radius = self.rng.randint(self.radius[0], self.radius[1], size=n)
+            rot = self.rng.choice([0, 1, 2, 3], size=n)
+        else:
+            x1, x2 = np.full(n, 31), np.full(n, 61)
+            radius, rot = np.full(n, 12), np.full(n, 2)
+        return x1, x2, radius, rot
+
+    def _reset_envs(self, envs):
+        """Renders new episodes for the environments envs (index array)"""
+        n = len(envs)
+        x1, x2, radius, rot = self._geometry(n)
+        y1, y2 = 0, self.img_size - 1
+
+        t = np.arange(self.max_frames)[None, :]
+        y = np.trunc(t * (1.0 * self.speed)).astype(np.int64)
+        x = np.trunc(x1[:, None] + t * ((x2 - x1)[:, None] / float(y2 - y1)) * self.speed).astype(np.int64)
+        valid = np.cumprod((y < self.img_size) & (x >= 0) & (x < self.img_size), axis=1).astype(bool)
+        nr_frames = valid.sum(axis=1)
+
+        disc = (self._cols - x[:, :, None, None]) ** 2 + (self._rows - y[:, :, None, None]) ** 2 <= \
+               (radius ** 2)[:, None, None, None]
+        frames = np.where(disc, 255, np.where(self._sun, 100, 0)).astype(np.uint8)
+        frames *= valid[:, :, None, None]
+        for k in range(1, 4):
+            # rotation around the image center
+            sel = rot == k
+            if sel.any():
+                frames[sel] = np.rot90(frames[sel], k, axes=(2, 3))
+
+        covered = (np.abs(x - self._center) < radius[:, None]) & (np.abs(y - self._center) < radius[:, None])
+        if self.stochastic_irradiance:
+            clear = self.rng.uniform(1.0 - self.ramp_step, 1.0, size=covered.shape)
+        else:
+            clear = np.ones(covered.shape)
+        self.frames[envs] = frames
+        self.irr[envs] = np.where(covered, 0.0, clear) * valid
+        self.nr_samples[envs] = nr_frames - (self.sequence_length - 1) * self.sequence_stride
+        assert np.all(self.nr_samples[envs] > 1), "episodes are too short for sequence_length/sequence_stride"
+
+        self.pointer[envs] = 0
+        self.episode_nr[envs] += 1
+        self.ci[envs] = self.irr[envs, (self.sequence_length - 1) * self.sequence_stride]
+
+    def _observations(self):
+        idx = self.pointer[:, None] + self._offsets[None, :]
+        envs = np.arange(self.num_envs)[:, None]
+        images = self.frames[envs, idx]  # (N, seq, H, W)
+        # channels of the first image first, the newest image last (same as CloudEnvironment)
+        images = np.repeat(np.transpose(images, (0, 2, 3, 1)), self.channels, axis=3)
+        obs = np.concatenate([images.reshape(self.num_envs, -1), self.irr[envs, idx], self.ci[:, None]], axis=1)
+        return obs.astype(np.float16)[:, :, None]
+
+    def reset(self):
+        self._reset_envs(np.arange(self.num_envs))
+        return self._observations()
+
+    def step(self, actions):
+        """
+        actions: one action per environment
+        returns: obs (N, obs_size, 1), rewards (N,), dones (N,), infos. The observation of a finished environment
+            is the first observation of its next episode
+        """
+        last = (self.sequence_length - 1) * self.sequence_stride
+        envs = np.arange(self.num_envs)
+        curr_irr = self.irr[envs, self.pointer + last]
+        self.pointer += 1
+        next_irr = self.irr[envs, self.pointer + last]
+
+        self.ci, rewards = self.action_space.calculate_steps(np.asarray(actions), next_irr, curr_irr, self.ci)
+        dones = self.pointer == self.nr_samples - 1
+        infos = [{'episode': int(e)} for e in self.episode_nr]
+
+        if dones.any():
+            self._reset_envs(np.flatnonzero(dones))
+        return self._observations(), rewards, dones, infos
+
+    class ActionSpace():
+        def __init__(self, type=0, action_nr=2, ramp_step=0.1):
+            self.n = action_nr
+            self.type = type
+            self.ramp_step = ramp_step
+
+        def _follow(self, target, current_ci):
+            diff = target - current_ci
+            return np.where(np.abs(diff) > self.ramp_step, current_ci + np.sign(diff) * self.ramp_step, target)
+
+        def calculate_steps(self, actions, next_irr, curr_irr, current_ci):
+            """Batched CloudEnvironment.ActionSpace.calculate_step, returns next control inputs and rewards"""
+            up = np.minimum(1.0, current_ci + self.ramp_step)
+            down = np.maximum(0.0, current_ci - self.ramp_step)
+
+            if self.type == 0:
+                next_ci = np.where(actions == 0, up, down)
+            elif self.type == -1:
+                next_ci = self._follow(next_irr, current_ci)
+            elif self.type == -2:
+                next_ci = self._follow(curr_irr, current_ci)
+            elif self.type == 1:
+                next_ci = np.where(actions == 0, self._follow(curr_irr, current_ci),
+                                   np.where(actions == 1, up, down))
+            else:
+                raise ValueError('Illegal Action Set')
+
+            return next_ci, -np.abs(next_ci - next_irr)
+
+    class ObservationSpace():
+        def __init__(self, shape):
+            self.shape = shape
@@ -0,0 +1,48 @@
+from baselines.deepq import saliency
+from cloud_environment_real import RealCloudEnvironment
+from scipy import misc
+import argparse
+
+
+"""
+Offline saliency maps of the test set (replaces the per step computation of test_real_cloud_sal.py).
+The test episodes are played once with the greedy policy, the recorded observations are then processed in batches.
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load_cpk", default="cloud_model.pkl")
+    parser.add_argument("--method", default="gradient", help="gradient or occlusion")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--recording_path", default="saliency/observations")
+    parser.add_argument("--output_path", default="saliency/maps")
+    parser.add_argument("--skip_recording", action="store_true", help="reuse the observations of recording_path")
+    args = parser.parse_args()
+
+    data_path="/media/nox/OS/Linux/Documents/Masterarbeit/data/Daten/data_C_int/"
+    mask_path="/media/nox/OS/Linux/Documents/Masterarbeit/data/Daten/img_C/cavriglia_skymask256.png"
+    img_path="/media/nox/OS/Linux/Documents/Masterarbeit/data/Daten/img_C/"
+    test_set_path ="test_list.out"
+
+    channels=3
+    seq_length=3
+    img_size=84
+    seq_stride=9
+
+    mask = misc.imresize(misc.imread(mask_path) == 0, [img_size, img_size]) > 0
+
+    engine = saliency.SaliencyEngine(args.load_cpk, img_size=img_size, channels=channels, seq_length=seq_length,
+                                     mask=mask)
+
+    if not args.skip_recording:
+        env = RealCloudEnvironment(data_path,img_path,test_set_path, image_size=img_size,
+                 sequence_length=seq_length, sequence_stride=seq_stride, action_nr=3, action_type=1, ramp_step=0.1, episode_length_train=200,
+                file="rl_data_sp.csv",load_train_episodes='ep600_200.pkl',mask_path=mask_path,exploration_follow="IRR",start_exploration_deviation=0.0,clip_irradiance=False)
+        saliency.record_episodes(engine, env, env.episode_n, args.recording_path)
+
+    engine.process(args.recording_path, args.output_path, method=args.method, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
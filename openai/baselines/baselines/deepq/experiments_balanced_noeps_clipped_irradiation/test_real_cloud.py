@@ -1,3 +1,5 @@
+import sys
+sys.path.append("/media/nox/OS/Linux/Documents/Masterarbeit/shared/dlabb/")
 import gym
 
 from baselines import deepq
@@ -9,6 +11,7 @@ import os
 import csv
 import pandas as pd
 import dill as pickle
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_episode_index as aei
 
 
 #Logging
@@ -42,21 +45,6 @@ def logger_callback(locals,globals):
 
             env = locals['env']
 
-            if reward_sum <= -60.0:
-                locals['ep_600'].append(env.current_train_episode)
-            if reward_sum <= -50.0:
-                locals['ep_500'].append(env.current_train_episode)
-            if reward_sum <= -40.0:
-                locals['ep_400'].append(env.current_train_episode)
-            if reward_sum <= -30.0:
-                locals['ep_300'].append(env.current_train_episode)
-            if reward_sum <= -20.0:
-                locals['ep_200'].append(env.current_train_episode)
-            if reward_sum <= -10.0:
-                locals['ep_100'].append(env.current_train_episode)
-            if reward_sum <= -1.7:
-                locals['ep_17'].append(env.current_train_episode)
-
             with open(path, 'a') as f:
 
 
@@ -168,6 +156,9 @@ def main():
                  sequence_length=seq_length, sequence_stride=seq_stride, action_nr=1, action_type=-1, ramp_step=0.1, episode_length_train=200,
                 file="rl_data_sp.csv",mask_path=mask_path,exploration_follow="IRR",start_exploration_deviation=0.0,clip_irradiance=False)
 
+    # hard episodes (reward, error quantiles per episode), replaces the pickled ep*_200_test.pkl lists
+    episode_index = aei.EpisodeIndexWriter("hard_episodes_200_test.csv")
+
     model = deepq.models.cnn_to_mlp(
         convs=[(32, 8, 4), (64, 4, 2), (64, 3, 1)],
         hiddens=[256],
@@ -181,8 +172,10 @@ def main():
         env=env,
         q_func=model,
         log_callback=logger_callback,
-        episode_n = env.episode_n
+        episode_n = env.episode_n,
+        episode_index=episode_index
     )
+    episode_index.close()
 
 
 if __name__ == '__main__':
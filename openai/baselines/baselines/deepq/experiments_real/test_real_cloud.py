@@ -42,21 +42,6 @@ def logger_callback(locals,globals):
 
             env = locals['env']
 
-            if reward_sum <= -60.0:
-                locals['ep_600'].append(env.current_train_episode)
-            if reward_sum <= -50.0:
-                locals['ep_500'].append(env.current_train_episode)
-            if reward_sum <= -40.0:
-                locals['ep_400'].append(env.current_train_episode)
-            if reward_sum <= -30.0:
-                locals['ep_300'].append(env.current_train_episode)
-            if reward_sum <= -20.0:
-                locals['ep_200'].append(env.current_train_episode)
-            if reward_sum <= -10.0:
-                locals['ep_100'].append(env.current_train_episode)
-            if reward_sum <= -1.7:
-                locals['ep_17'].append(env.current_train_episode)
-
             with open(path, 'a') as f:
 
 
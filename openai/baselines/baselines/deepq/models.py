@@ -32,16 +32,22 @@ def mlp(hiddens=[], layer_norm=False):
 
 def _cnn_to_mlp(convs, hiddens, dueling, channels,seq_length, img_size, inpt, num_actions, scope, reuse=False, layer_norm=False):
     with tf.variable_scope(scope, reuse=reuse):
-        out_img = inpt[:, :-(seq_length+1)]
+        if isinstance(inpt, tuple):
+            # U.ImageVectorInput: scaled image and [irradiance sequence, control input]
+            out_img, out_vec = inpt
+            out_irr = out_vec[:, :-1]
+            out_ci = out_vec[:, -1:]
+        else:
+            out_img = inpt[:, :-(seq_length+1)]
 
-        out_img = tf.reshape(out_img,shape=(-1,img_size,img_size,channels*seq_length))
+            out_img = tf.reshape(out_img,shape=(-1,img_size,img_size,channels*seq_length))
 
-        out_img = tf.cast(tf.multiply(out_img,(1.0/255.0)), tf.float32)
-        out_irr = inpt[:, -(seq_length+1):-1]
-        out_irr = tf.cast(tf.reshape(out_irr, shape=(-1, seq_length)),tf.float32)
+            out_img = tf.cast(tf.multiply(out_img,(1.0/255.0)), tf.float32)
+            out_irr = inpt[:, -(seq_length+1):-1]
+            out_irr = tf.cast(tf.reshape(out_irr, shape=(-1, seq_length)),tf.float32)
 
-        out_ci = inpt[:, -1]
-        out_ci = tf.cast(tf.reshape(out_ci, shape=(-1, 1)),tf.float32)
+            out_ci = inpt[:, -1]
+            out_ci = tf.cast(tf.reshape(out_ci, shape=(-1, 1)),tf.float32)
 
 
         with tf.variable_scope("convnet"):
@@ -0,0 +1,266 @@
+import numpy as np
+import os
+import dill
+import glob
+import tempfile
+import tensorflow as tf
+import zipfile
+
+import baselines.common.tf_util as U
+
+
+"""
+Offline saliency maps for trained (dueling) models_sal.cnn_to_mlp networks.
+
+test_sal computes the saliency of one observation per env step. Here the checkpoint is loaded once, the policy is
+played greedily and the observations are recorded per episode (record_episodes). The recordings are then streamed
+in batches through the network: gradient maps need one graph call per batch, occlusion maps one call per chunk of
+occluded copies. The result of every episode is written as compressed npz archive, np.load only decompresses the
+arrays which are accessed (load_episode).
+
+Files of an output directory:
+    episode_0000.npz, episode_0001.npz, ...
+        observations: (T,) + observation shape, float16 (recordings only)
+        image: (T, H, W, channels) uint8, newest image of every observation
+        action: (T,) greedy action
+        q_values: (T, num_actions)
+        state_score: (T,)
+        action_saliency, state_saliency: (T, H, W) float16 in [0, 1]
+"""
+
+
+def saliency_maps(grads, mask=None, lower=70, upper=99):
+    """Batched version of simple.saliency
+
+    grads: (N, H, W, C) gradients or occlusion differences
+    mask: bool (H, W) or (H, W, C), True for pixels to ignore (outside of the sky)
+    returns: (N, H, W), sum of absolute values over the channels clipped to the lower and upper percentile of every
+        sample and scaled to [0, 1]
+    """
+    grads = np.abs(np.asarray(grads, dtype=np.float32))
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.ndim == 2:
+            mask = mask[:, :, None]
+        grads = np.where(mask[None], 0.0, grads)
+
+    image_2d = np.sum(grads, axis=3)
+    vmin, vmax = np.percentile(image_2d.reshape(len(image_2d), -1), [lower, upper], axis=1)
+    scale = np.where(vmax > vmin, vmax - vmin, 1.0)
+    return np.clip((image_2d - vmin[:, None, None]) / scale[:, None, None], 0, 1)
+
+
+def overlay(images, maps, alpha=0.9, channel=2):
+    """Adds the saliency maps (N, H, W) to one channel (default: red in BGR) of the uint8 images (N, H, W, 3)"""
+    out = np.asarray(images, dtype=np.float32) / 255.0
+    out[..., channel] += alpha * maps
+    return np.uint8(255 * np.clip(out, 0, 1))
+
+
+def episode_paths(path):
+    return sorted(glob.glob(os.path.join(path, "episode_*.npz")))
+
+
+def load_episode(path):
+    """Lazy access to the arrays of an episode file (arrays are decompressed on first access)"""
+    return np.load(path)
+
+
+def iterate_batches(path, batch_size=64):
+    """Streams the observations of an episode file in batches"""
+    with np.load(path) as data:
+        observations = data['observations']
+    for i in range(0, len(observations), batch_size):
+        yield observations[i:i + batch_size]
+
+
+class SaliencyEngine(object):
+    def __init__(self, load_cpk, q_func=None, observation_shape=None, num_actions=None, img_size=84, channels=3,
+                 seq_length=2, mask=None, num_cpu=16):
+        """Builds the network once and restores the weights of load_cpk
+
+        load_cpk: ActWrapper_sal pickle (*.pkl, q_func/observation shape/num_actions are taken from the pickle) or
+            tensorflow checkpoint of the "deepq" scope
+        q_func: models_sal.cnn_to_mlp(dueling=True, ...) (checkpoints only)
+        observation_shape: shape of one (flat) observation (checkpoints only)
+        num_actions: (checkpoints only)
+        img_size, channels, seq_length: image layout of the observations (same as cnn_to_mlp)
+        mask: bool (img_size, img_size), True for pixels ignored in the saliency maps (f.e. resized skymask == 0)
+        """
+        self.img_size = img_size
+        self.channels = channels
+        self.seq_length = seq_length
+        self.mask = mask
+        self.img_len = img_size * img_size * channels * seq_length
+
+        model_data = None
+        if load_cpk.endswith('.pkl'):
+            with open(load_cpk, "rb") as f:
+                model_data, act_params = dill.load(f)
+            q_func = act_params['q_func']
+            num_actions = act_params['num_actions']
+            make_obs_ph = act_params['make_obs_ph']
+        else:
+            def make_obs_ph(name):
+                return U.BatchInput(observation_shape, name=name)
+        self.num_actions = num_actions
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            # same scopes as build_act_sal, only the q_func variables are restored
+            with tf.variable_scope("deepq"):
+                observations_ph = U.ensure_tf_input(make_obs_ph("observation"))
+                q_values, state_score, action_scores, action_salience, state_salience, _ = \
+                    q_func(observations_ph.get(), num_actions, scope="q_func")
+            self.sess = U.make_session(num_cpu=num_cpu)
+            with self.sess.as_default():
+                if model_data is None:
+                    U.load_state(load_cpk)
+                else:
+                    with tempfile.TemporaryDirectory() as td:
+                        arc_path = os.path.join(td, "packed.zip")
+                        with open(arc_path, "wb") as f:
+                            f.write(model_data)
+                        zipfile.ZipFile(arc_path, 'r', zipfile.ZIP_DEFLATED).extractall(td)
+                        U.load_state(os.path.join(td, "model"))
+
+                self._values = U.function([observations_ph], [q_values, state_score])
+                self._gradients = U.function([observations_ph],
+                                             [q_values, state_score, action_salience, state_salience])
+
+    def _run(self, f, observations):
+        with self.sess.as_default():
+            return f(observations)
+
+    def images(self, observations):
+        """Newest image (uint8, H x W x channels) of every observation"""
+        img = np.asarray(observations)[:, :self.img_len].reshape(
+            -1, self.img_size, self.img_size, self.channels * self.seq_length)
+        return img[:, :, :, -self.channels:].astype(np.uint8)
+
+    def act(self, observations):
+        """Greedy actions and q values of a batch of observations"""
+        q_values, _ = self._run(self._values, observations)
+        return np.argmax(q_values, axis=1), q_values
+
+    def gradient_maps(self, observations):
+        """Gradient saliency of a batch of observations in one graph call
+
+        returns: dict with action, q_values, state_score, action_saliency, state_saliency
+        """
+        q_values, state_score, action_grads, state_grads = self._run(self._gradients, observations)
+        return dict(action=np.argmax(q_values, axis=1), q_values=q_values, state_score=state_score[:, 0],
+                    action_saliency=saliency_maps(action_grads, self.mask),
+                    state_saliency=saliency_maps(state_grads, self.mask))
+
+    def occlusion_maps(self, observations, patch_size=8, stride=4, fill=0, max_batch=1024):
+        """Occlusion saliency: change of the q value of the greedy action (action_saliency) and of the state score
+        (state_saliency) when a patch_size x patch_size square of all images of the observation is set to fill.
+        The occluded copies are built and evaluated in chunks of max_batch (observation, patch) pairs, at most
+        max_batch copies are in memory at once.
+
+        returns: dict with action, q_values, state_score, action_saliency, state_saliency
+        """
+        observations = np.asarray(observations)
+        n = len(observations)
+        q_values, state_score = self._run(self._values, observations)
+        action = np.argmax(q_values, axis=1)
+
+        starts = np.arange(0, self.img_size - patch_size + stride, stride)
+        starts = np.minimum(starts, self.img_size - patch_size)
+        patches = [(y, x) for y in np.unique(starts) for x in np.unique(starts)]
+
+        flat = observations.reshape(n, -1)
+        occ_q, occ_v = [], []
+        for i in range(0, n * len(patches), max_batch):
+            pairs = np.arange(i, min(i + max_batch, n * len(patches)))
+            obs_index, patch_index = np.divmod(pairs, len(patches))
+            occluded = flat[obs_index]  # (chunk, D) copy
+            # splitting the observation axis gives a view, the patches are written into the copies directly
+            images = occluded[:, :self.img_len].reshape(len(pairs), self.img_size, self.img_size, -1)
+            for p in np.unique(patch_index):
+                y, x = patches[p]
+                images[patch_index == p, y:y + patch_size, x:x + patch_size] = fill
+            q, v = self._run(self._values, occluded.reshape((len(pairs),) + observations.shape[1:]))
+            occ_q.append(q)
+            occ_v.append(v)
+        occ_q = np.concatenate(occ_q).reshape(n, len(patches), -1)
+        occ_v = np.concatenate(occ_v).reshape(n, len(patches))
+
+        action_diff = np.abs(occ_q[np.arange(n), :, action] - q_values[np.arange(n), action][:, None])
+        state_diff = np.abs(occ_v - state_score)
+
+        action_map = np.zeros((n, self.img_size, self.img_size, 1), dtype=np.float32)
+        state_map = np.zeros_like(action_map)
+        coverage = np.zeros((1, self.img_size, self.img_size, 1), dtype=np.float32)
+        for p, (y, x) in enumerate(patches):
+            action_map[:, y:y + patch_size, x:x + patch_size] += action_diff[:, p, None, None, None]
+            state_map[:, y:y + patch_size, x:x + patch_size] += state_diff[:, p, None, None, None]
+            coverage[:, y:y + patch_size, x:x + patch_size] += 1
+        coverage = np.maximum(coverage, 1)
+
+        return dict(action=action, q_values=q_values, state_score=state_score[:, 0],
+                    action_saliency=saliency_maps(action_map / coverage, self.mask),
+                    state_saliency=saliency_maps(state_map / coverage, self.mask))
+
+    def process_episode(self, path, output_path, method="gradient", batch_size=64, **method_kwargs):
+        """Computes the saliency of all recorded observations of the episode file path and writes them compressed
+        to output_path
+
+        method: "gradient" or "occlusion" (method_kwargs are passed to occlusion_maps)
+        """
+        if method == "gradient":
+            maps = self.gradient_maps
+        elif method == "occlusion":
+            maps = lambda obs: self.occlusion_maps(obs, **method_kwargs)
+        else:
+            raise ValueError("Unknown saliency method: {}".format(method))
+
+        results = {}
+        for obs in iterate_batches(path, batch_size):
+            batch = maps(obs)
+            batch['image'] = self.images(obs)
+            for k, v in batch.items():
+                results.setdefault(k, []).append(v)
+
+        results = {k: np.concatenate(v) for k, v in results.items()}
+        for k in ['action_saliency', 'state_saliency']:
+            results[k] = results[k].astype(np.float16)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        np.savez_compressed(output_path, **results)
+
+    def process(self, recording_path, output_path, method="gradient", batch_size=64, **method_kwargs):
+        """process_episode for all episode files of recording_path, returns the written file paths"""
+        written = []
+        for path in episode_paths(recording_path):
+            out = os.path.join(output_path, os.path.basename(path))
+            print("Saliency", path, "->", out)
+            self.process_episode(path, out, method=method, batch_size=batch_size, **method_kwargs)
+            written.append(out)
+        return written
+
+
+def record_episodes(engine, env, episode_n, output_path, start_index=0):
+    """Plays episode_n episodes of env with the greedy policy of engine (no gradients are computed) and writes the
+    observations, actions and q values of every episode to output_path/episode_XXXX.npz
+
+    returns: list of (episode_id, episode_end_id) if the environment provides them
+    """
+    os.makedirs(output_path, exist_ok=True)
+    episode_ids = []
+    for e in range(start_index, start_index + episode_n):
+        obs = env.reset()
+        done = False
+        observations, actions, q_values = [], [], []
+        while not done:
+            action, q = engine.act(np.array(obs)[None])
+            observations.append(np.array(obs, dtype=np.float16))
+            actions.append(action[0])
+            q_values.append(q[0])
+            obs, rew, done, _ = env.step(action[0])
+
+        np.savez_compressed(os.path.join(output_path, "episode_{:04d}.npz".format(e)),
+                            observations=np.stack(observations), action=np.array(actions),
+                            q_values=np.stack(q_values))
+        episode_ids.append((getattr(env, 'episode_id', None), getattr(env, 'episode_end_id', None)))
+    return episode_ids
@@ -9,8 +9,10 @@ import baselines.common.tf_util as U
 
 from baselines import logger
 from baselines.common.schedules import LinearSchedule
+from baselines.common.telemetry import RingBuffer
 from baselines import deepq
 from baselines.deepq.replay_buffer import ReplayBuffer, PrioritizedReplayBuffer
+from baselines.deepq.saliency import saliency_maps
 import pandas as pd
 import signal
 import sys
@@ -111,7 +113,9 @@ def learn(train_file_path,
           param_noise=False,
           callback=None,
           load_cpk=None,
-          neutral_action_limit=None):
+          neutral_action_limit=None,
+          telemetry=None,
+          split_observation=None):
     """Train a deepq model.
 
     Parameters
@@ -172,6 +176,12 @@ def learn(train_file_path,
     callback: (locals, globals) -> None
         function called at every steps with state of the algorithm.
         If callback returns true training stops.
+    telemetry: baselines.common.telemetry.Telemetry
+        hooks called on every step, train step and episode end (e.g. EpisodeTelemetry).
+        Cheaper than callback for logging, closed at the end of training.
+    split_observation: (img_shape, vec_size) or None
+        feed the flat observations as uint8 image of shape img_shape and float vector of
+        size vec_size (U.ImageVectorInput) instead of one float placeholder.
 
     Returns
     -------
@@ -185,6 +195,8 @@ def learn(train_file_path,
     sess.__enter__()
 
     def make_obs_ph(name):
+        if split_observation is not None:
+            return U.ImageVectorInput(*split_observation, name=name)
         return U.BatchInput(env.observation_space.shape, name=name)
 
 
@@ -247,6 +259,9 @@ def learn(train_file_path,
     update_target()
 
     episode_rewards = [0.0]
+    # mean rewards of the last completed episodes, only change at the end of an episode
+    reward_windows = {500: RingBuffer(500), 100: RingBuffer(100), 50: RingBuffer(50), 10: RingBuffer(10)}
+    mean_500ep_reward = mean_100ep_reward = mean_50ep_reward = mean_10ep_reward = np.nan
     saved_mean_reward = None
     obs = env.reset()
     reset = True
@@ -318,7 +333,15 @@ def learn(train_file_path,
             obs = new_obs
 
             episode_rewards[-1] += rew
+            if telemetry is not None:
+                telemetry.on_step(t, action, rew, done)
             if done:
+                for window in reward_windows.values():
+                    window.append(episode_rewards[-1])
+                mean_500ep_reward = round(reward_windows[500].mean(), 1)
+                mean_100ep_reward = round(reward_windows[100].mean(), 1)
+                mean_50ep_reward = round(reward_windows[50].mean(), 1)
+                mean_10ep_reward = round(reward_windows[10].mean(), 1)
                 obs = env.reset()
                 episode_rewards.append(0.0)
                 reset = True
@@ -341,6 +364,8 @@ def learn(train_file_path,
                 log_td_errors = td_errors
                 log_gradients = gradients
 
+                if telemetry is not None:
+                    telemetry.on_train(t, td_errors, log_q_t_selected, log_q_t_targets, log_errors, gradients, lr)
 
 
                 if prioritized_replay:
@@ -354,12 +379,11 @@ def learn(train_file_path,
                 # Update target network periodically.
                 update_target()
 
-            mean_500ep_reward = round(np.mean(episode_rewards[-501:-1]), 1)
-            mean_100ep_reward = round(np.mean(episode_rewards[-101:-1]), 1)
-            mean_50ep_reward = round(np.mean(episode_rewards[-51:-1]), 1)
-            mean_10ep_reward = round(np.mean(episode_rewards[-11:-1]), 1)
-
             num_episodes = len(episode_rewards)
+            if done and telemetry is not None:
+                telemetry.on_episode_end(t, num_episodes, episode_rewards[-2],
+                                         {size: window.mean() for size, window in reward_windows.items()})
+
             if done and print_freq is not None and len(episode_rewards) % print_freq == 0:
                 logger.record_tabular("steps", t)
                 logger.record_tabular("episodes", num_episodes)
@@ -389,6 +413,9 @@ def learn(train_file_path,
                 log_q_t_selected_l, log_q_t_targets_l_l, log_q_t_l, log_action_l, log_td_errors_l, log_errors_l, log_grad_ratio_l = [], [], [], [], [], [], []
 
 
+        if telemetry is not None:
+            telemetry.close()
+
         if model_saved:
             if print_freq is not None:
                 logger.log("Restored model with mean reward: {}".format(saved_mean_reward))
@@ -407,7 +434,8 @@ def test(load_cpk,
           test_file_path='test_log.csv',
           print_freq=1,
           num_cpu=16,
-          log_callback=None):
+          log_callback=None,
+          episode_index=None):
 
 
 
@@ -445,8 +473,6 @@ def test(load_cpk,
     ep_list =[]
 
 
-    ep_17,ep_100,ep_200,ep_300,ep_400,ep_500,ep_600 = [],[],[],[],[],[],[]
-
 
 
     for e in range(episode_n):
@@ -468,6 +494,10 @@ def test(load_cpk,
 
             if done:
                 cumulative_episode_rewards.extend(episode_rewards)
+                if episode_index is not None:
+                    # hard episode index (e.g. abb_clouddrl_episode_index.EpisodeIndexWriter), one row per episode
+                    episode_index.add_episode(env.current_train_episode, env.current_train_control_inputs,
+                                              episode_rewards)
 
 
             if done and print_freq is not None and len(episode_rewards) % print_freq == 0:
@@ -587,7 +617,8 @@ def learn_sal(train_file_path,
           param_noise=False,
           callback=None,
           load_cpk=None,
-          neutral_action_limit=None):
+          neutral_action_limit=None,
+          split_observation=None):
     """Train a deepq model.
 
     Parameters
@@ -648,6 +679,9 @@ def learn_sal(train_file_path,
     callback: (locals, globals) -> None
         function called at every steps with state of the algorithm.
         If callback returns true training stops.
+    split_observation: (img_shape, vec_size) or None
+        feed the flat observations as uint8 image of shape img_shape and float vector of
+        size vec_size (U.ImageVectorInput) instead of one float placeholder.
 
     Returns
     -------
@@ -661,6 +695,8 @@ def learn_sal(train_file_path,
     sess.__enter__()
 
     def make_obs_ph(name):
+        if split_observation is not None:
+            return U.ImageVectorInput(*split_observation, name=name)
         return U.BatchInput(env.observation_space.shape, name=name)
 
 
@@ -877,19 +913,8 @@ def learn_sal(train_file_path,
 
 
 def saliency(grads,mask):
-
-
-    grads[mask] = 0.0
-
-    image_2d = np.sum(np.abs(grads), axis=2)
-    #image_2d = np.abs(grads)
-    #image_2d = np.abs(grads[:,:,1])
-
-    vmax = np.percentile(image_2d, 99)
-    vmin = np.percentile(image_2d,70)
-
-    print(vmax,vmin)
-    return np.clip((image_2d - vmin) / (vmax - vmin), 0, 1)
+    # single observation version of saliency.saliency_maps (see there for offline batches)
+    return saliency_maps(np.asarray(grads)[None], mask)[0]
 
 
 
@@ -902,7 +927,8 @@ def test_sal(load_cpk,
           test_file_path='test_log.csv',
           print_freq=1,
           num_cpu=16,
-          log_callback=None):
+          log_callback=None,
+          episode_index=None):
 
 
 
@@ -941,8 +967,6 @@ def test_sal(load_cpk,
     ep_list =[]
 
 
-    ep_17,ep_100,ep_200,ep_300,ep_400,ep_500,ep_600 = [],[],[],[],[],[],[]
-
     mask = misc.imread("/media/nox/OS/Linux/Documents/Masterarbeit/data/Daten/img_C/cavriglia_skymask256.png")==0
     mask = misc.imresize(mask, [84,84, 3])
     mask = np.repeat(mask,3,axis=2)>0
@@ -1010,6 +1034,10 @@ def test_sal(load_cpk,
 
             if done:
                 cumulative_episode_rewards.extend(episode_rewards)
+                if episode_index is not None:
+                    # hard episode index (e.g. abb_clouddrl_episode_index.EpisodeIndexWriter), one row per episode
+                    episode_index.add_episode(env.current_train_episode, env.current_train_control_inputs,
+                                              episode_rewards)
 
 
             if done and print_freq is not None and len(episode_rewards) % print_freq == 0:
@@ -1,4 +1,4 @@
-from baselines.common import Dataset, explained_variance, fmt_row, zipsame
+from baselines.common import Dataset, explained_variance, fmt_row, zipsame, gae_with_boundaries
 from baselines import logger
 import baselines.common.tf_util as U
 import tensorflow as tf, numpy as np
@@ -61,21 +61,76 @@ def traj_segment_generator(pi, env, horizon, stochastic):
             ob = env.reset()
         t += 1
 
+def traj_segment_generator_vec(pi, env, horizon, stochastic):
+    """
+    traj_segment_generator for a vectorized environment (env.num_envs environments stepped together, f.e.
+    ShmemVecEnv, finished environments are reset by the VecEnv). pi.act_batch is called once per step for all
+    environments. The per step arrays have shape (horizon, num_envs, ...), add_vtarg_and_adv flattens them.
+    """
+    nenvs = env.num_envs
+    t = 0
+    ac = env.action_space.sample() # not used, just so we have the datatype
+    new = np.ones(nenvs, 'int32') # marks if we're on first timestep of an episode
+    ob = env.reset()
+
+    cur_ep_ret = np.zeros(nenvs, 'float64') # returns in current episodes
+    cur_ep_len = np.zeros(nenvs, 'int64') # lens of current episodes
+    ep_rets = [] # returns of completed episodes in this segment
+    ep_lens = [] # lengths of ...
+
+    # Initialize history arrays
+    obs = np.zeros((horizon,) + ob.shape, ob.dtype)
+    rews = np.zeros((horizon, nenvs), 'float32')
+    vpreds = np.zeros((horizon, nenvs), 'float32')
+    news = np.zeros((horizon, nenvs), 'int32')
+    acs = np.zeros((horizon, nenvs) + np.shape(ac), np.asarray(ac).dtype)
+    prevacs = acs.copy()
+    ac = acs[0].copy()
+
+    while True:
+        prevac = ac
+        ac, vpred = pi.act_batch(stochastic, ob)
+        if t > 0 and t % horizon == 0:
+            yield {"ob" : obs, "rew" : rews, "vpred" : vpreds, "new" : news,
+                    "ac" : acs, "prevac" : prevacs, "nextvpred": vpred * (1 - new),
+                    "ep_rets" : ep_rets, "ep_lens" : ep_lens}
+            ep_rets = []
+            ep_lens = []
+        i = t % horizon
+        obs[i] = ob
+        vpreds[i] = vpred
+        news[i] = new
+        acs[i] = ac
+        prevacs[i] = prevac
+
+        ob, rew, new, _ = env.step(ac)
+        new = np.asarray(new, 'int32')
+        rews[i] = rew
+
+        cur_ep_ret += rew
+        cur_ep_len += 1
+        for k in np.flatnonzero(new):
+            ep_rets.append(cur_ep_ret[k])
+            ep_lens.append(cur_ep_len[k])
+        cur_ep_ret[new > 0] = 0
+        cur_ep_len[new > 0] = 0
+        t += 1
+
+def flatten_segment(seg):
+    """(horizon, num_envs, ...) -> (num_envs * horizon, ...), the steps of every environment stay consecutive"""
+    for key in ["ob", "rew", "vpred", "new", "ac", "prevac", "adv", "tdlamret"]:
+        arr = seg[key]
+        seg[key] = arr.swapaxes(0, 1).reshape((arr.shape[0] * arr.shape[1],) + arr.shape[2:])
+
 def add_vtarg_and_adv(seg, gamma, lam):
     """
     Compute target value using TD(lambda) estimator, and advantage with GAE(lambda)
+    (vectorised reverse scan, segments of traj_segment_generator_vec are flattened afterwards)
     """
-    new = np.append(seg["new"], 0) # last element is only used for last vtarg, but we already zeroed it if last new = 1
-    vpred = np.append(seg["vpred"], seg["nextvpred"])
-    T = len(seg["rew"])
-    seg["adv"] = gaelam = np.empty(T, 'float32')
-    rew = seg["rew"]
-    lastgaelam = 0
-    for t in reversed(range(T)):
-        nonterminal = 1-new[t+1]
-        delta = rew[t] + gamma * vpred[t+1] * nonterminal - vpred[t]
-        gaelam[t] = lastgaelam = delta + gamma * lam * nonterminal * lastgaelam
+    seg["adv"] = gae_with_boundaries(seg["rew"], seg["vpred"], seg["new"], seg["nextvpred"], gamma, lam)
     seg["tdlamret"] = seg["adv"] + seg["vpred"]
+    if seg["rew"].ndim == 2:
+        flatten_segment(seg)
 
 def learn(env, policy_func, *,
         timesteps_per_batch, # timesteps per actor per update
@@ -130,7 +185,11 @@ def learn(env, policy_func, *,
 
     # Prepare for rollouts
     # ----------------------------------------
-    seg_gen = traj_segment_generator(pi, env, timesteps_per_batch, stochastic=True)
+    if hasattr(env, "num_envs"):
+        # vectorized environment, timesteps_per_batch are split over the environments
+        seg_gen = traj_segment_generator_vec(pi, env, timesteps_per_batch // env.num_envs, stochastic=True)
+    else:
+        seg_gen = traj_segment_generator(pi, env, timesteps_per_batch, stochastic=True)
 
     episodes_so_far = 0
     timesteps_so_far = 0
@@ -1,10 +1,12 @@
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_read_pipeline as abb_rp
+from abb_deeplearning.abb_data_pipeline import abb_clouddrl_data_store as abb_ds
 from abb_deeplearning.abb_data_pipeline import abb_clouddrl_constants as abb_c
 import matplotlib as plt
 import pandas as pd
 import os
 import argparse
 import numpy as np
+from collections import OrderedDict
 
 from abb_deeplearning.abb_mpc_controller import abb_mpc
 from abb_deeplearning.abb_data_pipeline.abb_clouddrl_read_pipeline import read_full_int_irr_data
@@ -22,10 +24,9 @@ args = parser.parse_args()
 pred_path = args.pred_path
 
 
-#reference data in the in data path TODO: change for MS
-data_path=abb_ac.c_int_data_path
-prefix="C-"
-suffix="-all.csv"
+#reference data in the station data store TODO: change for MS
+store = abb_ds.StationDataStore()
+columns = OrderedDict((c, abb_ds.ALL_CSV_COLUMNS[c]) for c in ['int', 'mpc100', 'naive100'])
 #OUTPUT path of testing of RL
 full_path = pred_path
 full_pred_path = os.path.join(pred_path,"eval_predictions.csv")
@@ -49,14 +50,10 @@ for day in day_list:
     print(day)
     df_pred = df_pred_full.loc[day]
 
-    #Get file with optimal mpc etc..
-    date = str(df_pred.index[0].normalize()).split(" ")[0] # get current date
-    data_file_name = prefix+date+suffix
-    data_file_path = os.path.join(data_path,data_file_name)
+    #Get optimal mpc etc. at the time steps of the predictions
+    df_optimal = store.read(columns, start=df_pred.index[0], end=df_pred.index[-1], join='outer')
 
-    df_optimal = pd.DataFrame.from_csv(data_file_path)
-
-    df_optimal = df_optimal.loc[df_pred.index]
+    df_optimal = df_optimal.reindex(df_pred.index)
 
     #print(df_optimal)
     #print(df_pred)
@@ -0,0 +1,42 @@
+from abb_deeplearning.abb_benchmarks import abb_benchmark_suite as abb_bench
+import argparse
+import os
+import sys
+import tempfile
+
+
+parser = argparse.ArgumentParser(description="Offline benchmarks on synthetic data")
+parser.add_argument("--output", default="benchmark_results.json", help="results file (json)")
+parser.add_argument("--baseline", default="benchmark_baseline.json", help="stored baseline results")
+parser.add_argument("--update_baseline", action="store_true", help="store the results as new baseline")
+parser.add_argument("--tolerance", type=float, default=0.2, help="allowed rate drop before a regression is flagged")
+parser.add_argument("--benchmarks", nargs="*", default=None, help="subset of: " + " ".join(abb_bench.list_benchmarks()))
+parser.add_argument("--repeat", type=int, default=3, help="runs of the fast benchmarks, the fastest run counts")
+parser.add_argument("--days", type=int, default=2, help="synthetic days")
+parser.add_argument("--day_seconds", type=int, default=3600, help="length of a synthetic day in seconds")
+args = parser.parse_args()
+
+
+settings = {'days': args.days, 'day_seconds': args.day_seconds, 'repeat': args.repeat}
+
+with tempfile.TemporaryDirectory() as td:
+    station = abb_bench.create_synthetic_station(td, nr_days=args.days, day_seconds=args.day_seconds)
+    results = abb_bench.run_benchmarks(station, names=args.benchmarks, repeat=args.repeat)
+
+regressions = []
+if os.path.isfile(args.baseline):
+    regressions = abb_bench.compare_to_baseline(results, abb_bench.read_results(args.baseline), tolerance=args.tolerance)
+    for name in regressions:
+        print("REGRESSION", name, "{:.2f} {} (baseline {:.2f})".format(
+            results[name]['rate'], results[name]['unit'], results[name]['baseline_rate']))
+else:
+    print("No baseline found at", args.baseline)
+
+abb_bench.write_results(args.output, results, settings)
+print("Results written to", args.output)
+
+if args.update_baseline:
+    abb_bench.write_results(args.baseline, results, settings)
+    print("Baseline updated:", args.baseline)
+
+sys.exit(1 if regressions else 0)